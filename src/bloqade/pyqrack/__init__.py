@@ -9,10 +9,12 @@ from .reg import (
 from .base import (
     StackMemory as StackMemory,
     DynamicMemory as DynamicMemory,
+    SimulatorPool as SimulatorPool,
     PyQrackInterpreter as PyQrackInterpreter,
 )
 from .noise import native as native
 
 # NOTE: The following import is for registering the method tables
-from .qasm2 import uop as uop, core as core, parallel as parallel
+from .qasm2 import uop as uop, core as core, expr as expr, parallel as parallel
 from .target import PyQrack as PyQrack
+from .results import LOST as LOST, MeasurementArray as MeasurementArray
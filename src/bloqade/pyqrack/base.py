@@ -1,14 +1,19 @@
 import abc
 import typing
+import threading
 from dataclasses import field, dataclass
 from unittest.mock import Mock
 
 import numpy as np
+from kirin import ir
 from pyqrack import QrackSimulator
 from kirin.interp import Interpreter
+from kirin.dialects import ilist
 from typing_extensions import Self
-from bloqade.pyqrack.reg import Measurement
+from bloqade.pyqrack.reg import PyQrackReg, Measurement, PyQrackQubit
+from kirin.interp.result import Ok, Result
 from kirin.interp.exceptions import InterpreterError
+from bloqade.pyqrack.clusters import ClusterSimulator
 
 
 class PyQrackOptions(typing.TypedDict):
@@ -37,6 +42,60 @@ def _default_pyqrack_args() -> PyQrackOptions:
     )
 
 
+@dataclass
+class SimulatorPool:
+    """Pool of idle `QrackSimulator` objects that are reset in place and reused
+    instead of constructing a new simulator for every shot.
+
+    Simulators are grouped by their options, which include the qubit count. The
+    pool is thread-safe, and pickling it gives an empty pool.
+    """
+
+    max_size: int = 8
+    """Maximum number of idle simulators kept for each set of options."""
+    _idle: dict[tuple, list[QrackSimulator]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __reduce__(self):
+        return type(self), (self.max_size,)
+
+    def checkout(self, options: PyQrackOptions) -> QrackSimulator:
+        """Take a simulator in the |0...0> state with the given options, constructing
+        one if the pool has none.
+        """
+        with self._lock:
+            idle = self._idle.get(_options_key(options))
+            sim_reg = idle.pop() if idle else None
+
+        if sim_reg is None:
+            return QrackSimulator(**options)
+
+        sim_reg.reset_all()
+        return sim_reg
+
+    def checkin(self, options: PyQrackOptions, sim_reg: QrackSimulator):
+        """Return a simulator to the pool. The caller must make sure nothing else
+        refers to it, since it will be reset and handed out again.
+        """
+        with self._lock:
+            idle = self._idle.setdefault(_options_key(options), [])
+            if len(idle) < self.max_size:
+                idle.append(sim_reg)
+
+    def clear(self):
+        """Drop all idle simulators."""
+        with self._lock:
+            self._idle.clear()
+
+
+def _options_key(options: PyQrackOptions) -> tuple:
+    return tuple(sorted(options.items()))
+
+
 @dataclass
 class MemoryABC(abc.ABC):
     pyqrack_options: PyQrackOptions = field(default_factory=_default_pyqrack_args)
@@ -53,6 +112,22 @@ class MemoryABC(abc.ABC):
         # results of the simulation
         self.sim_reg = QrackSimulator(**self.pyqrack_options)
 
+    def detach(self):
+        """Called when a result of the simulation still refers to the current
+        simulator, so that it is never reset in place.
+        """
+        pass
+
+    def configure(self, options: PyQrackOptions):
+        """Construct the simulators of subsequent resets with `options`."""
+        self.pyqrack_options = options
+
+    def __getstate__(self):
+        # simulators cannot be pickled, memory is reset before it is used anyway
+        state = self.__dict__.copy()
+        state.pop("sim_reg", None)
+        return state
+
 
 @dataclass
 class MockMemory(MemoryABC):
@@ -75,6 +150,18 @@ class MockMemory(MemoryABC):
 class StackMemory(MemoryABC):
     total: int = field(kw_only=True)
     allocated: int = field(init=False, default=0)
+    pool: SimulatorPool | None = field(default=None, kw_only=True)
+    """Pool to take simulators from on `reset`. Without a pool, every reset
+    constructs a new simulator."""
+    owns_sim_reg: bool = field(init=False, default=False)
+    """Whether the current simulator goes back to the pool on the next reset."""
+    clusters: tuple[tuple[int, ...], ...] | None = field(default=None, kw_only=True)
+    """Groups of qubits that never interact, each simulated by its own simulator
+    behind a `ClusterSimulator`, see `split`. None to simulate all qubits with a
+    single simulator."""
+    cluster_rng: np.random.Generator | None = field(default=None, kw_only=True)
+    """Random number generator of the `ClusterSimulator`, which shuffles the
+    measurement draws of each cluster before combining them."""
 
     def allocate(self, n_qubits: int):
         curr_allocated = self.allocated
@@ -90,8 +177,81 @@ class StackMemory(MemoryABC):
         return tuple(range(curr_allocated, self.allocated))
 
     def reset(self):
-        super().reset()
         self.allocated = 0
+        if self.owns_sim_reg:
+            self._checkin()
+
+        if self.clusters is None:
+            self.sim_reg = self._checkout(self.pyqrack_options)
+        else:
+            sims = [self._checkout(self._cluster_options(c)) for c in self.clusters]
+            self.sim_reg = typing.cast(
+                QrackSimulator, ClusterSimulator(self.clusters, sims, self.cluster_rng)
+            )
+        self.owns_sim_reg = self.pool is not None
+
+    def _checkout(self, options: PyQrackOptions) -> QrackSimulator:
+        if self.pool is None:
+            return QrackSimulator(**options)
+        return self.pool.checkout(options)
+
+    def _checkin(self):
+        # returns the current simulator, or those of its clusters, to the pool
+        assert self.pool is not None
+        if isinstance(self.sim_reg, ClusterSimulator):
+            for cluster, sim_reg in zip(self.sim_reg.clusters, self.sim_reg.sims):
+                self.pool.checkin(self._cluster_options(cluster), sim_reg)
+        else:
+            self.pool.checkin(self.pyqrack_options, self.sim_reg)
+
+    def _cluster_options(self, cluster: tuple[int, ...]) -> PyQrackOptions:
+        options = self.pyqrack_options.copy()
+        options["qubitCount"] = len(cluster)
+        return options
+
+    def split(
+        self,
+        clusters: tuple[tuple[int, ...], ...] | None,
+        rng_state: np.random.Generator | None = None,
+    ):
+        """Simulate each of `clusters` with its own simulator from the next reset
+        on, or all qubits with a single simulator if None. `rng_state` pairs the
+        measurement draws of different clusters, see `cluster_rng`."""
+        self.cluster_rng = rng_state
+        if clusters == self.clusters:
+            return
+
+        if self.owns_sim_reg:
+            self._checkin()
+            self.owns_sim_reg = False
+        self.clusters = clusters
+
+    def detach(self):
+        self.owns_sim_reg = False
+
+    def configure(self, options: PyQrackOptions):
+        if options == self.pyqrack_options:
+            return
+
+        # pooled simulators are keyed by the options they were constructed with
+        if self.owns_sim_reg:
+            self._checkin()
+            self.owns_sim_reg = False
+        super().configure(options)
+
+    def restore(self, snapshot: QrackSimulator):
+        """Reset the memory onto a clone of `snapshot` instead of |0...0>."""
+        self.allocated = 0
+        if self.owns_sim_reg:
+            self._checkin()
+
+        self.sim_reg = snapshot.clone()
+        self.owns_sim_reg = self.pool is not None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["owns_sim_reg"] = False
+        return state
 
 
 @dataclass
@@ -124,3 +284,25 @@ class PyQrackInterpreter(Interpreter):
         super().initialize()
         self.memory.reset()  # reset allocated qubits
         return self
+
+    def run(
+        self,
+        mt: ir.Method,
+        args: tuple,
+        kwargs: dict | None = None,
+    ) -> Result:
+        result = super().run(mt, args, kwargs)
+        # NOTE: failed runs keep their frames, which may refer to the simulator
+        if not isinstance(result, Ok) or _holds_qubits(result.value):
+            self.memory.detach()
+        return result
+
+
+def _holds_qubits(value) -> bool:
+    if isinstance(value, (PyQrackReg, PyQrackQubit)):
+        return True
+    elif isinstance(value, ilist.IList):
+        return any(map(_holds_qubits, value.data))
+    elif isinstance(value, (tuple, list)):
+        return any(map(_holds_qubits, value))
+    return False
@@ -0,0 +1,156 @@
+import typing
+from dataclasses import dataclass
+
+from kirin import ir
+from bloqade.pyqrack.reg import Measurement
+from bloqade.pyqrack.base import PyQrackInterpreter
+from bloqade.pyqrack.tape import (
+    MAX_SHOT_QUBITS,
+    Tape,
+    Measure,
+    TraceError,
+    TapeRecorder,
+    FeedbackError,
+    _fill,
+)
+
+if typing.TYPE_CHECKING:
+    from pyqrack import QrackSimulator
+
+
+class Branch(typing.NamedTuple):
+    """The shots of a `BranchSampler` whose first measurements gave `outcomes`."""
+
+    outcomes: tuple[int, ...]
+    tape: Tape | None
+    """The kernel recorded with `outcomes`, None until it is recorded."""
+    complete: bool
+    """Whether `tape` holds the whole kernel, or stops where its control flow
+    depends on a measurement after `outcomes`."""
+    sim_reg: "QrackSimulator"
+    applied: int
+    """Number of operations of `tape` already applied to `sim_reg`."""
+    shots: int
+
+
+@dataclass(frozen=True)
+class BranchSampler:
+    """Samples a noise-free kernel whose control flow depends on measurement
+    results as a tree of branches instead of shot by shot.
+
+    Every measurement followed by more operations is a branch point: the
+    probability of its outcomes is computed once, the shots reaching it are split
+    between the outcomes binomially, and each outcome drawn by at least one shot
+    continues on a clone of the simulator with that outcome forced. The kernel is
+    recorded again for every branch, see `TapeRecorder.outcomes`, until its
+    control flow no longer depends on unknown results. Measurements after the
+    last operation are drawn for all shots of a branch at once.
+    """
+
+    mt: ir.Method
+    args: tuple
+    kwargs: dict
+
+    def record(self, outcomes: tuple[int, ...]) -> tuple[Tape, bool]:
+        """Record the kernel with the first measurements resolved to `outcomes`.
+
+        Returns
+            The recorded tape, and whether it holds the whole kernel rather than
+            the operations up to a dependence on a later measurement.
+
+        """
+        recorder = TapeRecorder(self.mt.dialects, outcomes=outcomes)
+        try:
+            return recorder.record(self.mt, self.args, self.kwargs), True
+        except FeedbackError:
+            partial = Tape(
+                ops=tuple(recorder.recorder.ops),
+                qregs=tuple(recorder.memory.allocations),
+                cregs=tuple(recorder.cregs),
+                result=None,
+            )
+            return partial, False
+
+    def sample(self, interp: PyQrackInterpreter, shots: int) -> list:
+        """Draw `shots` shots, using the memory and random state of `interp`.
+
+        Returns
+            The return value of the kernel for each shot, in random order.
+
+        Raises
+            TraceError: if the kernel cannot be recorded, applies noise or
+                returns quantum registers.
+
+        """
+        interp.memory.reset()
+        rng = interp.rng_state
+        results: list = []
+        stack = [Branch((), None, False, interp.memory.sim_reg, 0, shots)]
+        while stack:
+            outcomes, tape, complete, sim_reg, applied, count = stack.pop()
+            if tape is None:
+                tape, complete = self.record(outcomes)
+
+            index = tape._apply_gates(sim_reg, set(), applied)
+            ops = tape.ops
+            if index < len(ops) and type(ops[index]) is not Measure:
+                raise TraceError("branch sampling needs a noise-free kernel")
+            if complete and all(type(op) is Measure for op in ops[index:]):
+                results.extend(_leaf(tape, sim_reg, outcomes, index, count))
+                continue
+
+            addr = typing.cast(Measure, ops[index]).addr
+            ones = int(rng.binomial(count, min(max(sim_reg.prob(addr), 0.0), 1.0)))
+            children = [(r, n) for r, n in ((0, count - ones), (1, ones)) if n]
+            for i, (outcome, n) in enumerate(children):
+                # the last branch takes over the simulator of its parent
+                child = sim_reg if i == len(children) - 1 else sim_reg.clone()
+                child.force_m(addr, outcome)
+                stack.append(
+                    Branch(
+                        outcomes + (outcome,),
+                        tape if complete else None,
+                        complete,
+                        child,
+                        index + 1,
+                        n,
+                    )
+                )
+
+        return [results[i] for i in rng.permutation(len(results))]
+
+
+def _leaf(
+    tape: Tape,
+    sim_reg: "QrackSimulator",
+    outcomes: tuple[int, ...],
+    start: int,
+    shots: int,
+) -> list:
+    # the results of a branch whose remaining operations are final measurements
+    if tape.returns_qubits():
+        raise TraceError("branch sampling cannot return quantum registers")
+
+    final = typing.cast(tuple[Measure, ...], tape.ops[start:])
+    addrs = sorted({op.addr for op in final})
+    if not addrs:
+        draws = [0] * shots
+    elif len(addrs) <= MAX_SHOT_QUBITS:
+        draws = sim_reg.measure_shots(addrs, shots)
+    else:
+        draws = []
+        for _ in range(shots):
+            clone = sim_reg.clone()
+            draws.append(sum(clone.m(addr) << i for i, addr in enumerate(addrs)))
+
+    position = {addr: i for i, addr in enumerate(addrs)}
+    branched = [op for op in tape.ops[:start] if type(op) is Measure]
+    results = []
+    for draw in draws:
+        cregs = tape._new_cregs()
+        for op, outcome in zip(branched, outcomes):
+            cregs[op.creg][op.pos] = Measurement(outcome)
+        for op in final:
+            cregs[op.creg][op.pos] = Measurement(draw >> position[op.addr] & 1)
+        results.append(_fill(tape.result, [], cregs))
+    return results
@@ -0,0 +1,105 @@
+import math
+import cmath
+import typing
+
+from pyqrack import QrackCircuit
+
+if typing.TYPE_CHECKING:
+    from bloqade.pyqrack.tape import Gate
+
+MIN_SEGMENT_GATES = 4
+"""Fewest gates lowered to a `QrackCircuit`, running a circuit costs about as much
+as calling a few gates from Python."""
+
+Matrix = list[complex]
+"""A 2x2 matrix as a row-major list."""
+
+_SQRT_HALF = math.sqrt(0.5)
+
+FIXED_MATRICES: dict[str, Matrix] = {
+    "x": [0, 1, 1, 0],
+    "y": [0, -1j, 1j, 0],
+    "z": [1, 0, 0, -1],
+    "h": [_SQRT_HALF, _SQRT_HALF, _SQRT_HALF, -_SQRT_HALF],
+    "s": [1, 0, 0, 1j],
+    "adjs": [1, 0, 0, -1j],
+    "t": [1, 0, 0, cmath.exp(1j * math.pi / 4)],
+    "adjt": [1, 0, 0, cmath.exp(-1j * math.pi / 4)],
+}
+"""Matrices of the fixed single-qubit gates of `QrackSimulator`."""
+
+
+def u_matrix(theta: float, phi: float, lam: float) -> Matrix:
+    """The matrix `QrackSimulator.u` applies."""
+    cos, sin = math.cos(theta / 2), math.sin(theta / 2)
+    return [
+        cos,
+        -cmath.exp(1j * lam) * sin,
+        cmath.exp(1j * phi) * sin,
+        cmath.exp(1j * (phi + lam)) * cos,
+    ]
+
+
+def r_matrix(axis: int, angle: float) -> Matrix:
+    """The matrix `QrackSimulator.r` applies, exp(-i angle P / 2) for the Pauli P
+    with value `axis` in `pyqrack.Pauli`."""
+    cos, sin = math.cos(angle / 2), math.sin(angle / 2)
+    if axis == 1:
+        return [cos, -1j * sin, -1j * sin, cos]
+    elif axis == 3:
+        return [cos, -sin, sin, cos]
+    elif axis == 2:
+        return [cmath.exp(-0.5j * angle), 0, 0, cmath.exp(0.5j * angle)]
+    return [cmath.exp(-0.5j * angle), 0, 0, cmath.exp(-0.5j * angle)]
+
+
+def _controlled(
+    circuit: QrackCircuit, controls: typing.Sequence[int], m: Matrix, target: int
+):
+    if controls:
+        circuit.ucmtrx(list(controls), m, target, (1 << len(controls)) - 1)
+    else:
+        circuit.mtrx(m, target)
+
+
+def append_gate(circuit: QrackCircuit, gate: "Gate"):
+    """Append the simulator call recorded as `gate` to `circuit`.
+
+    Raises
+        ValueError: if the call is not a gate, e.g. `force_m`.
+
+    """
+    name, args = gate.name, gate.args
+    if name in FIXED_MATRICES:
+        circuit.mtrx(FIXED_MATRICES[name], args[0])
+    elif name == "u":
+        circuit.mtrx(u_matrix(*args[1:]), args[0])
+    elif name == "r":
+        axis, angle, target = args
+        circuit.mtrx(r_matrix(axis, angle), target)
+    elif name in ("mcx", "mcy", "mcz", "mch"):
+        _controlled(circuit, args[0], FIXED_MATRICES[name[2:]], args[1])
+    elif name == "mcu":
+        controls, target, theta, phi, lam = args
+        _controlled(circuit, controls, u_matrix(theta, phi, lam), target)
+    elif name == "mcr":
+        axis, angle, controls, target = args
+        _controlled(circuit, controls, r_matrix(axis, angle), target)
+    elif name == "swap":
+        circuit.swap(*args)
+    elif name == "cswap":
+        controls, a, b = args
+        x = FIXED_MATRICES["x"]
+        circuit.ucmtrx([b], x, a, 1)
+        _controlled(circuit, [*controls, a], x, b)
+        circuit.ucmtrx([b], x, a, 1)
+    else:
+        raise ValueError(f"cannot lower simulator method {name!r} to a circuit")
+
+
+def lower(gates: typing.Iterable["Gate"]) -> QrackCircuit:
+    """Lower a sequence of recorded gates to a `QrackCircuit`, ignoring guards."""
+    circuit = QrackCircuit()
+    for gate in gates:
+        append_gate(circuit, gate)
+    return circuit
@@ -0,0 +1,175 @@
+from typing import Sequence
+
+import numpy as np
+from pyqrack import QrackSimulator
+
+MERGE_QUBITS = 10
+"""Most qubits in a cluster of small components packed together by `pack`, a
+simulator of that size is cheap while every extra simulator costs a call per
+reset."""
+
+
+def pack(components: Sequence[tuple[int, ...]]) -> tuple[tuple[int, ...], ...]:
+    """Group the components of an interaction graph into clusters, each simulated
+    by its own simulator. Components larger than `MERGE_QUBITS` get a cluster of
+    their own, smaller ones are packed together up to `MERGE_QUBITS` qubits.
+    """
+    clusters: list[tuple[int, ...]] = []
+    small: list[int] = []
+    for component in components:
+        if len(component) > MERGE_QUBITS:
+            clusters.append(tuple(sorted(component)))
+            continue
+
+        if len(small) + len(component) > MERGE_QUBITS:
+            clusters.append(tuple(sorted(small)))
+            small = []
+        small.extend(component)
+
+    if small:
+        clusters.append(tuple(sorted(small)))
+    return tuple(sorted(clusters))
+
+
+class ClusterSimulator:
+    """Stand-in for a `QrackSimulator` whose qubits are split into clusters that
+    never interact, each simulated by its own `QrackSimulator`.
+
+    Calls take global addresses and are routed to the simulator of the cluster
+    holding their qubits, so independent blocks of qubits cost the sum of their
+    state sizes instead of the product. Gates acting on qubits of different
+    clusters raise a ValueError.
+    """
+
+    def __init__(
+        self,
+        clusters: tuple[tuple[int, ...], ...],
+        sims: list[QrackSimulator],
+        rng: np.random.Generator | None = None,
+    ):
+        self.clusters = clusters
+        self.sims = sims
+        self.rng = np.random.default_rng() if rng is None else rng
+        self._local = {
+            addr: (sim, pos)
+            for cluster, sim in zip(clusters, sims)
+            for pos, addr in enumerate(cluster)
+        }
+
+    def _route(self, addrs: Sequence[int]) -> tuple[QrackSimulator, list[int]]:
+        sim = self._local[addrs[0]][0]
+        local = []
+        for addr in addrs:
+            other, pos = self._local[addr]
+            if other is not sim:
+                raise ValueError(f"qubits {list(addrs)} belong to different clusters")
+            local.append(pos)
+        return sim, local
+
+    def u(self, q: int, th: float, ph: float, la: float):
+        sim, pos = self._local[q]
+        sim.u(pos, th, ph, la)
+
+    def r(self, b: int, ph: float, q: int):
+        sim, pos = self._local[q]
+        sim.r(b, ph, pos)
+
+    def mcu(self, c: list[int], q: int, th: float, ph: float, la: float):
+        sim, (*ctrls, target) = self._route([*c, q])
+        sim.mcu(ctrls, target, th, ph, la)
+
+    def mcr(self, b: int, ph: float, c: list[int], q: int):
+        sim, (*ctrls, target) = self._route([*c, q])
+        sim.mcr(b, ph, ctrls, target)
+
+    def swap(self, qi1: int, qi2: int):
+        sim, (a, b) = self._route([qi1, qi2])
+        sim.swap(a, b)
+
+    def cswap(self, c: list[int], qi1: int, qi2: int):
+        sim, (*ctrls, a, b) = self._route([*c, qi1, qi2])
+        sim.cswap(ctrls, a, b)
+
+    def m(self, q: int) -> int:
+        sim, pos = self._local[q]
+        return sim.m(pos)
+
+    def force_m(self, q: int, r: int) -> int:
+        sim, pos = self._local[q]
+        return sim.force_m(pos, r)
+
+    def prob(self, q: int) -> float:
+        sim, pos = self._local[q]
+        return sim.prob(pos)
+
+    def measure_shots(self, q: list[int], s: int) -> list[int]:
+        """Like `QrackSimulator.measure_shots`, the clusters are drawn
+        independently since their states are independent. Qrack may return the
+        draws of a cluster sorted by outcome, so they are shuffled with `rng`
+        before being combined shot by shot."""
+        groups: dict[int, list[int]] = {}
+        for i, addr in enumerate(q):
+            groups.setdefault(id(self._local[addr][0]), []).append(i)
+        if len(groups) == 1:
+            sim, local = self._route(q)
+            return sim.measure_shots(local, s)
+
+        results = [0] * s
+        for indices in groups.values():
+            sim, local = self._route([q[i] for i in indices])
+            draws = self.rng.permutation(sim.measure_shots(local, s)).tolist()
+            for shot, draw in enumerate(draws):
+                for j, i in enumerate(indices):
+                    results[shot] |= (draw >> j & 1) << i
+        return results
+
+    def m_all(self) -> int:
+        result = 0
+        for cluster, sim in zip(self.clusters, self.sims):
+            bits = sim.m_all()
+            for pos, addr in enumerate(cluster):
+                result |= (bits >> pos & 1) << addr
+        return result
+
+    def clone(self) -> "ClusterSimulator":
+        return ClusterSimulator(
+            self.clusters, [sim.clone() for sim in self.sims], self.rng
+        )
+
+    def num_qubits(self) -> int:
+        return sum(map(len, self.clusters))
+
+    def out_ket(self) -> list[complex]:
+        """The state vector of all qubits, the tensor product of the clusters."""
+        ket = np.ones((), dtype=np.complex128)
+        axes: list[int] = []
+        for cluster, sim in zip(self.clusters, self.sims):
+            # the first axis of a reshaped state vector is its last qubit
+            part = np.array(sim.out_ket()).reshape((2,) * len(cluster))
+            ket = np.tensordot(ket, part, axes=0)
+            axes.extend(reversed(cluster))
+
+        order = [axes.index(addr) for addr in reversed(range(len(axes)))]
+        return ket.transpose(order).reshape(-1).tolist()
+
+
+def _single(name: str):
+    def gate(self: ClusterSimulator, q: int):
+        sim, pos = self._local[q]
+        getattr(sim, name)(pos)
+
+    return gate
+
+
+def _controlled(name: str):
+    def gate(self: ClusterSimulator, c: list[int], q: int):
+        sim, (*ctrls, target) = self._route([*c, q])
+        getattr(sim, name)(ctrls, target)
+
+    return gate
+
+
+for _name in ("x", "y", "z", "h", "s", "t", "adjs", "adjt"):
+    setattr(ClusterSimulator, _name, _single(_name))
+for _name in ("mcx", "mcy", "mcz", "mch"):
+    setattr(ClusterSimulator, _name, _controlled(_name))
@@ -0,0 +1,146 @@
+import math
+import typing
+
+from bloqade.pyqrack.tape import (
+    SHOT_FUNCTION,
+    Gate,
+    Tape,
+    Measure,
+    AtomLoss,
+    PauliError,
+    CZPauliError,
+)
+
+
+def generate(tape: Tape) -> str:
+    """Generate the source of a Python function replaying the operations of `tape`
+    on a simulator, one statement per operation.
+
+    Gates become direct calls of bound simulator methods, guarded by inline checks
+    of the lost addresses, and noise channels draw from `rng` exactly like
+    `Tape.replay`. The gates before `Tape.prefix_length` are skipped when the
+    function is called with a nonzero `start`, i.e. when the shot starts from a
+    snapshot of the deterministic prefix.
+    """
+    names = sorted({op.name for op in tape.ops if type(op) is Gate} | {"m", "force_m"})
+    lines = [
+        f"def {SHOT_FUNCTION}(sim, rng, lost, cregs, loss_m_result, events, start):"
+    ]
+    lines += [f"    sim_{name} = sim.{name}" for name in names]
+
+    prefix = tape.prefix_length
+    if prefix:
+        # nothing is lost before the first noise channel or reset
+        lines.append("    if not start:")
+        _gates(tape, 0, prefix, lines, "        ", guarded=False)
+
+    index = prefix
+    while index < len(tape.ops):
+        op = tape.ops[index]
+        if type(op) is Gate:
+            index = _gates(tape, index, None, lines, "    ")
+            continue
+        elif type(op) is Measure and (run := tape.measure_runs.get(index)):
+            lines.append(
+                f"    measure_run(sim, lost, cregs, ops[{index}:{run.end}], "
+                f"{run.final}, loss_m_result)"
+            )
+            index = run.end
+            continue
+        elif type(op) is Measure:
+            lines.append(
+                f"    cregs[{op.creg}][{op.pos}] = loss_m_result "
+                f"if {op.addr} in lost else Measurement(sim_m({op.addr}))"
+            )
+        elif tape.skip_ahead:
+            lines += [
+                f"    if {index} in events:",
+                f"        apply_events(sim, lost, ops[{index}], events[{index}])",
+            ]
+        elif type(op) is CZPauliError:
+            lines.append(f"    apply_cz_paulis(sim, rng, lost, ops[{index}])")
+        elif type(op) is PauliError:
+            lines += [
+                f"    active = [a for a in {op.addrs!r} if a not in lost]",
+                "    if active:",
+                f"        paulis = ops[{index}].table.sample(rng, len(active))",
+                "        for i in np.flatnonzero(paulis):",
+                "            getattr(sim, PAULIS[paulis[i]])(active[i])",
+            ]
+        elif type(op) is AtomLoss:
+            lines += [
+                f"    active = [a for a in {op.addrs!r} if a not in lost]",
+                "    if active:",
+                "        draws = rng.random(len(active))",
+                f"        for i in np.flatnonzero(draws <= ops[{index}].prob):",
+                "            sim_force_m(active[i], 0)",
+                "            lost.add(active[i])",
+            ]
+        index += 1
+
+    return "\n".join(lines) + "\n"
+
+
+def _gates(
+    tape: Tape,
+    start: int,
+    stop: int | None,
+    lines: list[str],
+    indent: str,
+    guarded: bool = True,
+):
+    # emits the gates from `start` on, up to `stop` or the next operation that is
+    # not a gate, and returns the index of the operation after them
+    stop = len(tape.ops) if stop is None else stop
+    index = start
+    while index < stop:
+        segment = tape.segments.get(index)
+        if segment is not None and segment.end <= stop:
+            if not (guarded and segment.guard):
+                lines.append(f"{indent}segments[{index}].circuit.run(sim)")
+            else:
+                lines += [
+                    f"{indent}if not lost or lost.isdisjoint("
+                    f"segments[{index}].guard):",
+                    f"{indent}    segments[{index}].circuit.run(sim)",
+                    f"{indent}else:",
+                ]
+                for pos in range(index, segment.end):
+                    _gate(pos, tape.ops[pos], lines, indent + "    ")
+            index = segment.end
+            continue
+
+        op = tape.ops[index]
+        if type(op) is not Gate:
+            break
+        _gate(index, op, lines, indent, guarded)
+        index += 1
+
+    if index == start:
+        lines.append(f"{indent}pass")
+    return index
+
+
+def _gate(index: int, gate: Gate, lines: list[str], indent: str, guarded: bool = True):
+    args = ", ".join(
+        _literal(arg) or f"ops[{index}].args[{pos}]"
+        for pos, arg in enumerate(gate.args)
+    )
+    call = f"sim_{gate.name}({args})"
+    if not (guarded and gate.guard):
+        lines.append(indent + call)
+        return
+
+    check = " and ".join(f"{addr} not in lost" for addr in dict.fromkeys(gate.guard))
+    lines += [f"{indent}if {check}:", f"{indent}    {call}"]
+
+
+def _literal(value: typing.Any) -> str | None:
+    # the source of a constant argument, None if it must be looked up at runtime
+    if type(value) is int:
+        return repr(value)
+    elif isinstance(value, float) and math.isfinite(value):
+        return repr(float(value))
+    elif type(value) is list and all(type(v) is int for v in value):
+        return repr(value)
+    return None
@@ -0,0 +1,289 @@
+import math
+import typing
+from dataclasses import dataclass
+
+import numpy as np
+from bloqade.pyqrack.base import PyQrackInterpreter
+from bloqade.pyqrack.tape import (
+    Gate,
+    Tape,
+    Measure,
+    AtomLoss,
+    PauliError,
+    CZPauliError,
+    _encode,
+)
+from bloqade.pyqrack.results import measurement_codes
+from bloqade.pyqrack.noise.sampling import PauliTable
+
+Step = tuple
+"""A frame update: `("h", q)` swaps the X and Z parts of qubit `q`, `("s", q)` adds
+its X part to its Z part, `("sx", q)` its Z part to its X part, `("cx", c, t)` and
+`("cz", a, b)` conjugate by a CNOT and a CZ and `("swap", a, b)` swaps two qubits."""
+
+_ROTATION_STEPS = {1: "sx", 2: "s", 3: "h"}
+"""Frame update of a quarter turn about each axis of `pyqrack.Pauli`."""
+
+
+def _quarter_turns(angle: float) -> int | None:
+    turns = angle / (math.pi / 2)
+    k = round(turns)
+    if abs(turns - k) > 1e-9:
+        return None
+    return k % 4
+
+
+def _rotation(axis: int, angle: float, q: int) -> tuple[Step, ...] | None:
+    k = _quarter_turns(angle)
+    if k is None or axis not in _ROTATION_STEPS:
+        return None
+    return ((_ROTATION_STEPS[axis], q),) if k % 2 else ()
+
+
+def gate_steps(gate: Gate) -> tuple[Step, ...] | None:
+    """The frame updates of a Clifford gate, or None if it is not Clifford."""
+    name, args = gate.name, gate.args
+    if name in ("x", "y", "z"):
+        return ()
+    elif name == "h":
+        return (("h", args[0]),)
+    elif name in ("s", "adjs"):
+        return (("s", args[0]),)
+    elif name == "r":
+        return _rotation(*args)
+    elif name == "u":
+        # U(theta, phi, lam) = Rz(phi) Ry(theta) Rz(lam) up to a phase
+        q, theta, phi, lam = args
+        steps = [_rotation(2, lam, q), _rotation(3, theta, q), _rotation(2, phi, q)]
+        if any(s is None for s in steps):
+            return None
+        return tuple(step for s in steps for step in typing.cast(tuple, s))
+    elif name in ("mcx", "mcy", "mcz") and len(args[0]) == 1:
+        ctrl, target = args[0][0], args[1]
+        if name == "mcx":
+            return (("cx", ctrl, target),)
+        elif name == "mcz":
+            return (("cz", ctrl, target),)
+        # CY = S CX S^dagger
+        return (("s", target), ("cx", ctrl, target), ("s", target))
+    elif name == "swap":
+        return (("swap", *args),)
+    return None
+
+
+def _propagate(x: np.ndarray, z: np.ndarray, steps: tuple[Step, ...]):
+    for kind, *qubits in steps:
+        if kind == "h":
+            (q,) = qubits
+            x[q], z[q] = z[q], x[q].copy()
+        elif kind == "s":
+            (q,) = qubits
+            z[q] ^= x[q]
+        elif kind == "sx":
+            (q,) = qubits
+            x[q] ^= z[q]
+        elif kind == "cx":
+            ctrl, target = qubits
+            x[target] ^= x[ctrl]
+            z[ctrl] ^= z[target]
+        elif kind == "cz":
+            a, b = qubits
+            z[b] ^= x[a]
+            z[a] ^= x[b]
+        else:
+            x[qubits] = x[qubits[::-1]]
+            z[qubits] = z[qubits[::-1]]
+
+
+@dataclass(frozen=True)
+class FrameSampler:
+    """Sampler of noisy Clifford kernels propagating Pauli frames.
+
+    The shots of a kernel that only measures at the end, see `Tape.can_group`, are
+    bucketed by their atom loss pattern. Each pattern is simulated once by Qrack,
+    without Pauli errors, and the measurements of its shots are drawn from the
+    resulting state. The Pauli errors of all shots of a bucket are propagated to the
+    measurements at once as X and Z bit arrays, the X bits of a shot flipping its
+    outcomes. Losing or resetting a qubit is not a Clifford operation: shots with
+    an X error on such a qubit are simulated exactly instead.
+    """
+
+    tape: Tape
+    steps: tuple[tuple[Step, ...] | None, ...]
+    """The frame updates of each operation, None for gates applied before any
+    Pauli error, which need none."""
+
+    @classmethod
+    def from_tape(cls, tape: Tape) -> "FrameSampler | None":
+        """Build the sampler of `tape`, or return None if a gate that is not
+        Clifford follows a Pauli error or the tape cannot be grouped."""
+        if not tape.can_group():
+            return None
+
+        noisy = False
+        steps: list[tuple[Step, ...] | None] = []
+        for op in tape.ops:
+            if type(op) in (PauliError, CZPauliError):
+                noisy = True
+            if type(op) is not Gate or op.name == "force_m":
+                steps.append(())
+                continue
+
+            step = gate_steps(op)
+            if step is None and noisy:
+                return None
+            steps.append(step)
+
+        return cls(tape, tuple(steps))
+
+    def sampler(
+        self, interp: PyQrackInterpreter, codes: bool = False
+    ) -> typing.Callable[[int], typing.Any]:
+        """Return a function drawing any number of shots, see `Tape.sampler`."""
+        rng = interp.rng_state
+        ops = self.tape.ops
+        n_qubits = sum(map(len, self.tape.qregs))
+
+        def draw(shots: int):
+            lost_at = np.full((shots, n_qubits), -1, dtype=np.intp)
+            for index, op in enumerate(ops):
+                if type(op) is AtomLoss and op.addrs:
+                    addrs = list(op.addrs)
+                    hit = rng.random((shots, len(addrs))) <= op.prob
+                    hit &= lost_at[:, addrs] < 0
+                    lost_at[:, addrs] = np.where(hit, index, lost_at[:, addrs])
+
+            patterns, inverse = np.unique(lost_at, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            results: list = [None] * shots
+            rows = np.empty((shots, 0), dtype=np.uint8)
+            for i, pattern in enumerate(patterns):
+                members = np.flatnonzero(inverse == i)
+                block = self._draw_pattern(interp, pattern, len(members), codes)
+                if not codes:
+                    for shot, result in zip(members.tolist(), block):
+                        results[shot] = result
+                    continue
+
+                if i == 0:
+                    rows = np.empty((shots, block.shape[1]), dtype=np.uint8)
+                rows[members] = block
+
+            return rows if codes else results
+
+        return draw
+
+    def _draw_pattern(
+        self,
+        interp: PyQrackInterpreter,
+        lost_at: np.ndarray,
+        shots: int,
+        codes: bool,
+    ):
+        # draws `shots` shots losing each qubit at operation `lost_at`, if any
+        rng = interp.rng_state
+        x = np.zeros((len(lost_at), shots), dtype=bool)
+        z = np.zeros_like(x)
+        exact = np.zeros(shots, dtype=bool)
+        errors: list[tuple[int, np.ndarray, np.ndarray, np.ndarray]] = []
+        loss_events: dict[int, list[tuple[int, int]]] = {}
+        lost: set[int] = set()
+        measures: list[Measure] = []
+
+        def discard(addr: int):
+            # the state after a loss or reset is only a frame if there is no X error
+            exact[:] |= x[addr]
+            x[addr] = False
+            z[addr] = False
+
+        for index, op in enumerate(self.tape.ops):
+            if type(op) is Gate:
+                if lost and not lost.isdisjoint(op.guard):
+                    continue
+                elif op.name == "force_m":
+                    discard(op.args[0])
+                elif steps := self.steps[index]:
+                    _propagate(x, z, steps)
+            elif type(op) is Measure:
+                measures.append(op)
+            elif type(op) is AtomLoss:
+                for pos, addr in enumerate(op.addrs):
+                    if lost_at[addr] == index and addr not in lost:
+                        loss_events.setdefault(index, []).append((pos, 0))
+                        lost.add(addr)
+                        discard(addr)
+            elif type(op) is PauliError:
+                sites = [(pos, a) for pos, a in enumerate(op.addrs) if a not in lost]
+                errors += _frame_errors(x, z, rng, index, op.table, sites)
+            else:
+                ctrl_sites, qarg_sites = [], []
+                for pair, (ctrl, qarg) in enumerate(zip(op.ctrls, op.qargs)):
+                    ctrl_active = ctrl not in lost
+                    qarg_active = qarg not in lost
+                    if not (
+                        ctrl_active and qarg_active
+                        if op.paired
+                        else ctrl_active ^ qarg_active
+                    ):
+                        continue
+                    if ctrl_active:
+                        ctrl_sites.append((2 * pair, ctrl))
+                    if qarg_active:
+                        qarg_sites.append((2 * pair + 1, qarg))
+                errors += _frame_errors(x, z, rng, index, op.ctrl_table, ctrl_sites)
+                errors += _frame_errors(x, z, rng, index, op.qarg_table, qarg_sites)
+
+        draw, shot_result = self.tape._prepare_sample(interp, loss_events)
+        addrs = list(dict.fromkeys(op.addr for op in measures if op.addr not in lost))
+        outcomes = np.asarray(draw(shots), dtype=np.int64)
+        for i, addr in enumerate(addrs):
+            outcomes ^= x[addr].astype(np.int64) << i
+
+        exact_shots = np.flatnonzero(exact).tolist()
+        if codes:
+            block = _encode(outcomes.tolist(), shot_result)
+        else:
+            block = [shot_result(outcome) for outcome in outcomes.tolist()]
+
+        # shots simulated exactly are still grouped by their error pattern
+        patterns: dict[tuple, list[int]] = {}
+        for shot in exact_shots:
+            events = {index: list(ev) for index, ev in loss_events.items()}
+            for index, rows, pos, paulis in errors:
+                selected = rows == shot
+                events.setdefault(index, []).extend(
+                    zip(pos[selected].tolist(), paulis[selected].tolist())
+                )
+            key = tuple((index, tuple(ev)) for index, ev in sorted(events.items()))
+            patterns.setdefault(key, []).append(shot)
+
+        for key, members in patterns.items():
+            exact_draw, exact_result = self.tape._prepare_sample(interp, dict(key))
+            for shot, outcome in zip(members, exact_draw(len(members))):
+                result = exact_result(outcome)
+                block[shot] = measurement_codes(result) if codes else result
+
+        return block
+
+
+def _frame_errors(
+    x: np.ndarray,
+    z: np.ndarray,
+    rng: np.random.Generator,
+    index: int,
+    table: PauliTable,
+    sites: list[tuple[int, int]],
+) -> list[tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    # draws a Pauli from `table` at each `(pos, addr)` site for every shot and
+    # returns the errors as `(index, shots, pos, paulis)`
+    if not sites:
+        return []
+
+    paulis = table.lookup(rng.random((x.shape[1], len(sites))))
+    addrs = [addr for _, addr in sites]
+    # paulis index into `PAULIS`, i.e. I, X, Y, Z
+    x[addrs] ^= ((paulis == 1) | (paulis == 2)).T
+    z[addrs] ^= (paulis >= 2).T
+    rows, cols = np.nonzero(paulis)
+    positions = np.array([pos for pos, _ in sites], dtype=np.intp)
+    return [(index, rows, positions[cols], paulis[rows, cols])]
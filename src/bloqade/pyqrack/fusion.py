@@ -0,0 +1,108 @@
+import math
+import cmath
+import typing
+from dataclasses import replace
+
+from bloqade.pyqrack.tape import Op, Gate, Tape, Measure, AtomLoss, PauliError
+from bloqade.pyqrack.circuit import FIXED_MATRICES, Matrix, r_matrix, u_matrix
+
+IDENTITY_TOLERANCE = 1e-12
+"""Largest deviation from a multiple of the identity for which a fused run of
+gates is dropped instead of applied as a `U` gate."""
+
+
+def gate_matrix(gate: Gate) -> Matrix | None:
+    """The matrix of a single-qubit gate, or None if `gate` is not one."""
+    name, args = gate.name, gate.args
+    if name in FIXED_MATRICES:
+        return FIXED_MATRICES[name]
+    elif name == "u":
+        return u_matrix(*args[1:])
+    elif name == "r":
+        return r_matrix(args[0], args[1])
+    return None
+
+
+def u_angles(m: Matrix) -> tuple[float, float, float] | None:
+    """The angles `(theta, phi, lam)` of the `U` gate equal to `m` up to a global
+    phase, or None if `m` is a multiple of the identity."""
+    m00, m01, m10, m11 = m
+    if abs(m01) + abs(m10) < IDENTITY_TOLERANCE and abs(m11 - m00) < (
+        IDENTITY_TOLERANCE
+    ):
+        return None
+
+    theta = 2 * math.atan2(abs(m10), abs(m00))
+    if abs(m00) < IDENTITY_TOLERANCE:
+        # theta = pi, only phi - lam is fixed, put it all in phi
+        return theta, cmath.phase(m10) - cmath.phase(-m01), 0.0
+    phase = cmath.phase(m00)
+    if abs(m10) < IDENTITY_TOLERANCE:
+        return theta, 0.0, cmath.phase(m11) - phase
+    return theta, cmath.phase(m10) - phase, cmath.phase(-m01) - phase
+
+
+def _matmul(a: Matrix, b: Matrix) -> Matrix:
+    return [
+        a[0] * b[0] + a[1] * b[2],
+        a[0] * b[1] + a[1] * b[3],
+        a[2] * b[0] + a[3] * b[2],
+        a[2] * b[1] + a[3] * b[3],
+    ]
+
+
+def fuse(tape: Tape) -> tuple[Tape, int]:
+    """Merge runs of single-qubit gates on the same address into one `U` gate.
+
+    A run ends at the next operation touching the address: a gate on more than
+    one qubit, a reset, a noise channel or a measurement. Only gates guarded by
+    their own address alone are merged, so a lost qubit skips the fused gate
+    exactly when it would have skipped the run. Runs whose product is the identity
+    up to a phase are dropped.
+
+    Returns
+        The fused tape and the number of gates eliminated.
+
+    """
+    ops: list[Op | None] = list(tape.ops)
+    runs: dict[int, list[int]] = {}
+
+    def flush(addr: int):
+        run = runs.pop(addr, None)
+        if not run or len(run) == 1:
+            return
+
+        m: Matrix = [1, 0, 0, 1]
+        guard: tuple[int, ...] = ()
+        for index in run:
+            gate = typing.cast(Gate, tape.ops[index])
+            m = _matmul(typing.cast(Matrix, gate_matrix(gate)), m)
+            guard = guard or gate.guard
+            ops[index] = None
+
+        if (angles := u_angles(m)) is not None:
+            # nothing touches `addr` between the gates of the run
+            ops[run[-1]] = Gate(guard, "u", (addr, *angles))
+
+    for index, op in enumerate(tape.ops):
+        if type(op) is Gate:
+            qubits = op.qubits()
+            if gate_matrix(op) is not None and set(op.guard) <= {qubits[0]}:
+                runs.setdefault(qubits[0], []).append(index)
+            else:
+                for addr in qubits:
+                    flush(addr)
+        elif type(op) is Measure:
+            flush(op.addr)
+        elif type(op) in (PauliError, AtomLoss):
+            for addr in op.addrs:
+                flush(addr)
+        else:
+            for addr in (*op.ctrls, *op.qargs):
+                flush(addr)
+
+    for addr in list(runs):
+        flush(addr)
+
+    fused = tuple(op for op in ops if op is not None)
+    return replace(tape, ops=fused), len(tape.ops) - len(fused)
@@ -0,0 +1,118 @@
+import math
+from typing import Callable, Sequence
+from dataclasses import replace
+
+import numpy as np
+from bloqade.pyqrack.tape import Gate, Tape
+from bloqade.pyqrack.sweep import FUNCTIONS, Expr, Slot, bind
+
+TWO_TERM = ((0.5, math.pi / 2), (-0.5, -math.pi / 2))
+"""Parameter-shift rule of the angles of uncontrolled gates, as `(coefficient,
+shift)` pairs: the expectation value is a sinusoid of the angle, so its derivative
+is half the difference of the values shifted by a quarter turn."""
+
+_NEAR = (math.sqrt(2) + 1) / (4 * math.sqrt(2))
+_FAR = (math.sqrt(2) - 1) / (4 * math.sqrt(2))
+
+FOUR_TERM = (
+    (_NEAR, math.pi / 2),
+    (-_NEAR, -math.pi / 2),
+    (-_FAR, 3 * math.pi / 2),
+    (_FAR, -3 * math.pi / 2),
+)
+"""Parameter-shift rule of the angles of controlled gates, whose generators have
+eigenvalues 0 and ±1/2, so the expectation value mixes two frequencies."""
+
+
+DERIVATIVES: dict[str, Callable[[float], float]] = {
+    "sin": math.cos,
+    "cos": lambda x: -math.sin(x),
+    "tan": lambda x: 1 / math.cos(x) ** 2,
+    "exp": math.exp,
+    "log": lambda x: 1 / x,
+    "sqrt": lambda x: 0.5 / math.sqrt(x),
+}
+"""Derivative of each function of `sweep.FUNCTIONS`."""
+
+
+def shift_rule(gate: Gate) -> tuple[tuple[float, float], ...]:
+    """The parameter-shift rule of the angles of a recorded gate."""
+    return FOUR_TERM if gate.name in ("mcu", "mcr") else TWO_TERM
+
+
+def dual(expr: Expr, point: Sequence[float]) -> tuple[float, np.ndarray]:
+    """The value of a slot expression at `point` and its derivative with respect
+    to each parameter, by forward-mode differentiation."""
+    if not isinstance(expr, tuple):
+        return expr, np.zeros(len(point))
+    elif expr[0] == "arg":
+        slope = np.zeros(len(point))
+        slope[expr[1]] = 1.0
+        return point[expr[1]], slope
+
+    name, *operands = expr
+    (a, da), *rest = (dual(operand, point) for operand in operands)
+    if name == "neg":
+        return -a, -da
+    elif name in DERIVATIVES:
+        return FUNCTIONS[name](a), DERIVATIVES[name](a) * da
+
+    ((b, db),) = rest
+    if name == "add":
+        return a + b, da + db
+    elif name == "sub":
+        return a - b, da - db
+    elif name == "mul":
+        return a * b, da * b + a * db
+    elif name == "truediv":
+        return a / b, (da * b - a * db) / b**2
+    # pow, the exponent only contributes where it depends on a parameter
+    value = a**b
+    slope = b * a ** (b - 1) * da if b else np.zeros(len(point))
+    if db.any():
+        slope = slope + value * math.log(a) * db
+    return value, slope
+
+
+def parameter_shifts(
+    tape: Tape, point: Sequence[float]
+) -> tuple[list[Tape], np.ndarray]:
+    """The shifted evaluations giving the gradient of an expectation value with
+    respect to the parameters of a tape recorded by a `sweep.SlotRecorder`.
+
+    Every angle of a gate that is a slot is shifted by the rule of its gate, see
+    `shift_rule`, and weighted by the derivative of the angle with respect to each
+    parameter.
+
+    Returns
+        The tapes bound to `point` with one shifted angle each, and the
+        `(parameters, tapes)` matrix mapping their expectation values to the
+        gradient.
+
+    """
+    bound = bind(tape, point)
+    tapes: list[Tape] = []
+    columns: list[np.ndarray] = []
+    for index, op in enumerate(tape.ops):
+        if type(op) is not Gate:
+            continue
+
+        for position, arg in enumerate(op.args):
+            if not isinstance(arg, Slot):
+                continue
+            _, slope = dual(arg.expr, point)
+            if not slope.any():
+                continue
+
+            gate = bound.ops[index]
+            for coefficient, shift in shift_rule(op):
+                args = list(gate.args)
+                args[position] += shift
+                ops = list(bound.ops)
+                ops[index] = gate._replace(args=tuple(args))
+                tapes.append(replace(bound, ops=tuple(ops)))
+                columns.append(coefficient * slope)
+
+    if not columns:
+        return tapes, np.zeros((len(point), 0))
+    return tapes, np.array(columns).T
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+
+from bloqade.pyqrack.tape import Gate, Tape, AtomLoss
+from bloqade.pyqrack.frames import gate_steps
+
+STATE_VECTOR_QUBITS = 10
+"""Most qubits simulated as a plain state vector, without any layer."""
+
+SCHMIDT_QUBITS = 28
+"""Most qubits in a group of interacting qubits simulated with Schmidt decomposition
+over a state vector, larger groups need the stabilizer and decision tree layers."""
+
+LAYER_OPTIONS = (
+    "isTensorNetwork",
+    "isSchmidtDecomposeMulti",
+    "isSchmidtDecompose",
+    "isStabilizerHybrid",
+    "isBinaryDecisionTree",
+)
+"""Options of `QrackSimulator` chosen from the circuit, the others depend on the
+hardware and are left as configured."""
+
+_SCHMIDT_LAYERS = ("isSchmidtDecomposeMulti", "isSchmidtDecompose")
+
+
+@dataclass(frozen=True)
+class CircuitProfile:
+    """Summary of a recorded kernel used to choose the simulator layers."""
+
+    num_qubits: int
+    """Number of qubits allocated by the kernel."""
+    gates: int
+    """Number of gates, excluding resets."""
+    entangling_gates: int
+    """Number of gates acting on more than one qubit."""
+    non_clifford: int
+    """Number of gates that are not Clifford, see `frames.gate_steps`."""
+    largest_group: int
+    """Number of qubits in the largest group of qubits connected by gates."""
+    forced_measurements: int
+    """Number of resets and atom loss channels, which force measurement results."""
+
+    @classmethod
+    def from_tape(cls, tape: Tape) -> "CircuitProfile":
+        gates = entangling = non_clifford = forced = 0
+        for op in tape.ops:
+            if type(op) is AtomLoss or type(op) is Gate and op.name == "force_m":
+                forced += 1
+                continue
+            elif type(op) is not Gate:
+                continue
+
+            gates += 1
+            non_clifford += gate_steps(op) is None
+            entangling += len(op.qubits()) > 1
+
+        return cls(
+            sum(map(len, tape.qregs)),
+            gates,
+            entangling,
+            non_clifford,
+            max(map(len, tape.components()), default=0),
+            forced,
+        )
+
+
+@dataclass(frozen=True)
+class LayerChoice:
+    """Simulator layers chosen for a kernel."""
+
+    name: str
+    """`stabilizer`, `state_vector`, `schmidt` or `default`."""
+    options: dict[str, bool]
+    """Value of each option in `LAYER_OPTIONS`."""
+    profile: CircuitProfile | None
+    """The profile the choice is based on, None if the kernel could not be
+    recorded."""
+
+
+def choose_layers(profile: CircuitProfile | None) -> LayerChoice:
+    """Choose the simulator layers of a kernel.
+
+    Clifford circuits run on the stabilizer layer alone. Other circuits run on a
+    state vector, with Schmidt decomposition unless they are small, as long as
+    their largest group of interacting qubits has at most `SCHMIDT_QUBITS` qubits.
+    Only wider circuits and kernels that cannot be recorded use all layers but the
+    tensor network, since the stabilizer layer is very slow to sample from once it
+    holds non-Clifford gates.
+
+    Forcing a measurement result of probability zero, as resets and atom loss do,
+    fails without Schmidt decomposition, so kernels forcing measurements always
+    use it.
+    """
+    if profile is None:
+        name, layers = "default", LAYER_OPTIONS[1:]
+    elif profile.non_clifford == 0:
+        name, layers = "stabilizer", ("isStabilizerHybrid",)
+        if profile.forced_measurements:
+            layers += _SCHMIDT_LAYERS
+    elif profile.largest_group > SCHMIDT_QUBITS:
+        name, layers = "default", LAYER_OPTIONS[1:]
+    elif profile.num_qubits <= STATE_VECTOR_QUBITS and not profile.forced_measurements:
+        name, layers = "state_vector", ()
+    else:
+        name, layers = "schmidt", _SCHMIDT_LAYERS
+
+    return LayerChoice(name, {key: key in layers for key in LAYER_OPTIONS}, profile)
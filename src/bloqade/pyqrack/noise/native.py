@@ -1,33 +1,30 @@
 from typing import TYPE_CHECKING, List
 
+import numpy as np
 from kirin import interp
 from bloqade.noise import native
 from bloqade.pyqrack import PyQrackInterpreter, reg
+from bloqade.pyqrack.tape import (
+    AtomLoss,
+    PauliError,
+    CZPauliError,
+    TapeRecorder,
+)
+from bloqade.pyqrack.noise.sampling import PAULIS, pauli_table
 
 if TYPE_CHECKING:
     from pyqrack import QrackSimulator
 
 
-@native.dialect.register(key="pyqrack")
-class PyQrackMethods(interp.MethodTable):
-    def apply_pauli_error(
-        self,
-        interp: PyQrackInterpreter,
-        qarg: reg.PyQrackQubit,
-        px: float,
-        py: float,
-        pz: float,
-    ):
-        p = [1 - (px + py + pz), px, py, pz]
-
-        assert all(0 <= x <= 1 for x in p), "Invalid Pauli error probabilities"
-
-        which = interp.rng_state.choice(["i", "x", "y", "z"], p=p)
+def apply_paulis(qargs: List[reg.PyQrackQubit], paulis: np.ndarray):
+    """Apply the Paulis drawn from a `PauliTable` to `qargs`, skipping identities."""
+    for i in np.flatnonzero(paulis):
+        qarg = qargs[i]
+        getattr(qarg.sim_reg, PAULIS[paulis[i]])(qarg.addr)
 
-        if which == "i":
-            return
 
-        getattr(qarg.sim_reg, which)(qarg.addr)
+@native.dialect.register(key="pyqrack")
+class PyQrackMethods(interp.MethodTable):
 
     @interp.impl(native.PauliChannel)
     def single_qubit_error_channel(
@@ -38,10 +35,12 @@ class PyQrackMethods(interp.MethodTable):
     ):
         qargs: List[reg.PyQrackQubit] = frame.get(stmt.qargs)
 
-        active_qubits = (qarg for qarg in qargs if qarg.is_active())
+        active_qubits = [qarg for qarg in qargs if qarg.is_active()]
 
-        for qarg in active_qubits:
-            self.apply_pauli_error(interp, qarg, stmt.px, stmt.py, stmt.pz)
+        if active_qubits:
+            table = pauli_table(stmt.px, stmt.py, stmt.pz)
+            paulis = table.sample(interp.rng_state, len(active_qubits))
+            apply_paulis(active_qubits, paulis)
 
         return ()
 
@@ -57,28 +56,36 @@ class PyQrackMethods(interp.MethodTable):
         ctrls: List[reg.PyQrackQubit] = frame.get(stmt.ctrls)
 
         if stmt.paired:
-            valid_pairs = (
+            valid_pairs = [
                 (ctrl, qarg)
                 for ctrl, qarg in zip(ctrls, qargs)
                 if ctrl.is_active() and qarg.is_active()
-            )
+            ]
         else:
-            valid_pairs = (
+            valid_pairs = [
                 (ctrl, qarg)
                 for ctrl, qarg in zip(ctrls, qargs)
                 if ctrl.is_active() ^ qarg.is_active()
-            )
+            ]
+
+        if not valid_pairs:
+            return ()
+
+        # one draw for each side of every pair, whether or not that side is active
+        uniform = interp.rng_state.random((len(valid_pairs), 2))
+        ctrl_table = pauli_table(stmt.px_ctrl, stmt.py_ctrl, stmt.pz_ctrl)
+        qarg_table = pauli_table(stmt.px_qarg, stmt.py_qarg, stmt.pz_qarg)
+        ctrl_paulis = ctrl_table.lookup(uniform[:, 0])
+        qarg_paulis = qarg_table.lookup(uniform[:, 1])
 
-        for ctrl, qarg in valid_pairs:
-            if ctrl.is_active():
-                self.apply_pauli_error(
-                    interp, ctrl, stmt.px_ctrl, stmt.py_ctrl, stmt.pz_ctrl
-                )
+        for (ctrl, qarg), ctrl_pauli, qarg_pauli in zip(
+            valid_pairs, ctrl_paulis, qarg_paulis
+        ):
+            if ctrl_pauli and ctrl.is_active():
+                getattr(ctrl.sim_reg, PAULIS[ctrl_pauli])(ctrl.addr)
 
-            if qarg.is_active():
-                self.apply_pauli_error(
-                    interp, qarg, stmt.px_qarg, stmt.py_qarg, stmt.pz_qarg
-                )
+            if qarg_pauli and qarg.is_active():
+                getattr(qarg.sim_reg, PAULIS[qarg_pauli])(qarg.addr)
 
         return ()
 
@@ -91,12 +98,71 @@ class PyQrackMethods(interp.MethodTable):
     ):
         qargs: List[reg.PyQrackQubit["QrackSimulator"]] = frame.get(stmt.qargs)
 
-        active_qubits = (qarg for qarg in qargs if qarg.is_active())
+        active_qubits = [qarg for qarg in qargs if qarg.is_active()]
 
-        for qarg in active_qubits:
-            if interp.rng_state.uniform() <= stmt.prob:
-                sim_reg = qarg.ref.sim_reg
-                sim_reg.force_m(qarg.addr, 0)
-                qarg.drop()
+        if not active_qubits:
+            return ()
+
+        lost = interp.rng_state.random(len(active_qubits)) <= stmt.prob
+        for i in np.flatnonzero(lost):
+            qarg = active_qubits[i]
+            sim_reg = qarg.ref.sim_reg
+            sim_reg.force_m(qarg.addr, 0)
+            qarg.drop()
+
+        return ()
+
+
+@native.dialect.register(key="pyqrack.tape")
+class PyQrackTapeMethods(interp.MethodTable):
+
+    @interp.impl(native.PauliChannel)
+    def single_qubit_error_channel(
+        self,
+        interp: TapeRecorder,
+        frame: interp.Frame,
+        stmt: native.PauliChannel,
+    ):
+        qargs: List[reg.PyQrackQubit] = frame.get(stmt.qargs)
+        interp.emit(
+            PauliError(
+                tuple(interp.get_addr(qarg) for qarg in qargs),
+                pauli_table(stmt.px, stmt.py, stmt.pz),
+            )
+        )
+
+        return ()
+
+    @interp.impl(native.CZPauliChannel)
+    def cz_pauli_channel(
+        self,
+        interp: TapeRecorder,
+        frame: interp.Frame,
+        stmt: native.CZPauliChannel,
+    ):
+        qargs: List[reg.PyQrackQubit] = frame.get(stmt.qargs)
+        ctrls: List[reg.PyQrackQubit] = frame.get(stmt.ctrls)
+        pairs = list(zip(ctrls, qargs))
+        interp.emit(
+            CZPauliError(
+                tuple(interp.get_addr(ctrl) for ctrl, _ in pairs),
+                tuple(interp.get_addr(qarg) for _, qarg in pairs),
+                stmt.paired,
+                pauli_table(stmt.px_ctrl, stmt.py_ctrl, stmt.pz_ctrl),
+                pauli_table(stmt.px_qarg, stmt.py_qarg, stmt.pz_qarg),
+            )
+        )
+
+        return ()
+
+    @interp.impl(native.AtomLossChannel)
+    def atom_loss_channel(
+        self,
+        interp: TapeRecorder,
+        frame: interp.Frame,
+        stmt: native.AtomLossChannel,
+    ):
+        qargs: List[reg.PyQrackQubit] = frame.get(stmt.qargs)
+        interp.emit(AtomLoss(tuple(interp.get_addr(qarg) for qarg in qargs), stmt.prob))
 
         return ()
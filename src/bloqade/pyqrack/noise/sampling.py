@@ -0,0 +1,118 @@
+import functools
+from dataclasses import field, dataclass
+
+import numpy as np
+
+PAULIS = ("i", "x", "y", "z")
+"""Simulator methods of the Paulis, indexed by the values `PauliTable` draws."""
+
+
+@dataclass(frozen=True)
+class PauliTable:
+    """Cumulative distribution of a Pauli channel, used to draw the errors of all
+    qubits of a noise statement with a single call to the random number generator.
+    """
+
+    p: tuple[float, float, float, float]
+    """Probabilities of I, X, Y and Z."""
+
+    cumulative: np.ndarray = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        assert all(0 <= x <= 1 for x in self.p), "Invalid Pauli error probabilities"
+        object.__setattr__(self, "cumulative", np.cumsum(self.p[:3]))
+
+    def lookup(self, uniform: np.ndarray) -> np.ndarray:
+        """Map uniform samples in [0, 1) to indices into `PAULIS`."""
+        return np.searchsorted(self.cumulative, uniform, side="right")
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """Draw `n` Paulis as indices into `PAULIS`."""
+        return self.lookup(rng.random(n))
+
+
+@functools.lru_cache(maxsize=None)
+def pauli_table(px: float, py: float, pz: float) -> PauliTable:
+    """The table of the channel applying X, Y and Z with the given probabilities,
+    built once for each distinct channel."""
+    return PauliTable((1 - (px + py + pz), px, py, pz))
+
+
+@dataclass(frozen=True)
+class NoiseSites:
+    """All noise sites of a recorded kernel treated as one stream, so that a shot
+    draws only the sites where an error happens instead of every site.
+
+    Each site belongs to an operation of the kernel and has a probability of an
+    error event. Candidate sites are found by drawing the gaps between them from
+    a geometric distribution at the largest site probability, then each candidate
+    is kept with its own probability relative to that rate. Every site therefore
+    has an error independently with its own probability, like the per-site
+    sampler, while the cost grows with the number of errors.
+    """
+
+    op_index: np.ndarray
+    """The operation each site belongs to."""
+    pos: np.ndarray
+    """The position of each site within its operation."""
+    prob: np.ndarray
+    """The probability of an error at each site."""
+    cumulative: np.ndarray
+    """`(sites, 2)` cumulative probabilities of X and X or Y given an error, only
+    meaningful for Pauli sites."""
+
+    @classmethod
+    def build(cls, sites: list[tuple[int, int, float, PauliTable | None]]):
+        """Build the stream from `(op_index, pos, prob, table)` tuples in program
+        order, `table` being None for sites that are not Pauli errors."""
+        cumulative = np.zeros((len(sites), 2))
+        for i, (_, _, prob, table) in enumerate(sites):
+            if table is not None and prob > 0:
+                cumulative[i] = np.cumsum(table.p[1:3]) / prob
+
+        return cls(
+            np.array([site[0] for site in sites], dtype=np.intp),
+            np.array([site[1] for site in sites], dtype=np.intp),
+            np.array([site[2] for site in sites], dtype=float),
+            cumulative,
+        )
+
+    def sample(self, rng: np.random.Generator) -> dict[int, list[tuple[int, int]]]:
+        """Draw the error events of one shot.
+
+        Returns
+            A dictionary from operation index to a list of `(pos, pauli)` pairs in
+            program order, `pauli` indexing into `PAULIS` for Pauli sites.
+
+        """
+        n_sites = len(self.prob)
+        rate = self.prob.max() if n_sites else 0.0
+        if rate <= 0:
+            return {}
+
+        chunks = []
+        last = -1
+        while last < n_sites - 1:
+            size = int(rate * (n_sites - last) * 1.1) + 16
+            candidates = last + np.cumsum(rng.geometric(rate, size=size))
+            chunks.append(candidates)
+            last = candidates[-1]
+
+        candidates = np.concatenate(chunks)
+        candidates = candidates[candidates < n_sites]
+
+        uniform = rng.random(len(candidates)) * rate
+        kept = uniform < self.prob[candidates]
+        sites = candidates[kept]
+        # uniform in [0, 1) given that the site is kept, picks the Pauli
+        scaled = uniform[kept] / self.prob[sites]
+        cumulative = self.cumulative[sites]
+        paulis = 1 + (scaled >= cumulative[:, 0]) + (scaled >= cumulative[:, 1])
+
+        events: dict[int, list[tuple[int, int]]] = {}
+        for op, pos, pauli in zip(
+            self.op_index[sites].tolist(), self.pos[sites].tolist(), paulis.tolist()
+        ):
+            events.setdefault(op, []).append((pos, pauli))
+
+        return events
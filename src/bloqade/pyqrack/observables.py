@@ -0,0 +1,143 @@
+import typing
+
+import numpy as np
+from bloqade.pyqrack.state import prob_all
+
+if typing.TYPE_CHECKING:
+    from pyqrack import QrackSimulator
+
+PAULI_CODES = {"I": 0, "X": 1, "Z": 2, "Y": 3}
+"""Value of each Pauli in `pyqrack.Pauli`."""
+
+BATCH_QUBITS = 16
+"""Most qubits in the support of a group of observables evaluated together from
+the probabilities of its measurement basis, larger groups are evaluated one
+observable at a time with `QrackSimulator.pauli_expectation`."""
+
+
+def parse_pauli(observable: str) -> dict[int, str]:
+    """Parse a Pauli string, character `i` acting on the qubit at address `i`.
+
+    Returns
+        The non-identity Pauli of each address.
+
+    Raises
+        ValueError: if a character is not one of `IXYZ`.
+
+    """
+    paulis: dict[int, str] = {}
+    for addr, pauli in enumerate(observable.upper()):
+        if pauli not in PAULI_CODES:
+            raise ValueError(f"invalid Pauli {pauli!r} in observable {observable!r}")
+        if pauli != "I":
+            paulis[addr] = pauli
+    return paulis
+
+
+def group_commuting(observables: list[dict[int, str]]) -> list[list[int]]:
+    """Greedily group observables that commute qubit by qubit, i.e. that agree on
+    every address where both act, so each group is measured in a single basis.
+
+    Returns
+        The indices of the observables in each group.
+
+    """
+    groups: list[tuple[dict[int, str], list[int]]] = []
+    for index, paulis in enumerate(observables):
+        for basis, members in groups:
+            if all(basis.get(addr, pauli) == pauli for addr, pauli in paulis.items()):
+                basis.update(paulis)
+                members.append(index)
+                break
+        else:
+            groups.append((dict(paulis), [index]))
+
+    return [members for _, members in groups]
+
+
+def expectations(sim_reg: "QrackSimulator", observables: list[str]) -> np.ndarray:
+    """Expectation values of Pauli strings in the state of a simulator.
+
+    Observables are grouped by `group_commuting`. A group of several observables
+    on at most `BATCH_QUBITS` qubits is rotated into the Z basis on a clone of the
+    simulator and all of its observables are evaluated at once from the
+    probabilities of its support, as parities of the outcomes. Other observables
+    are evaluated one at a time, the parity of their rotated qubits gathered on one
+    qubit of a clone by CNOT gates. Only single-qubit observables use
+    `QrackSimulator.pauli_expectation`, which disagrees with the state vector for
+    products of several Paulis.
+
+    Args
+        sim_reg (QrackSimulator):
+            The simulator holding the state, it is not modified.
+        observables (list[str]):
+            Pauli strings, see `parse_pauli`.
+
+    Returns
+        A float array with the expectation value of each observable.
+
+    """
+    parsed = [parse_pauli(observable) for observable in observables]
+    values = np.ones(len(parsed))
+    for members in group_commuting(parsed):
+        support = sorted({addr for index in members for addr in parsed[index]})
+        if len(members) > 1 and 0 < len(support) <= BATCH_QUBITS:
+            values[members] = _batch(sim_reg, [parsed[i] for i in members], support)
+            continue
+
+        for index in members:
+            if parsed[index]:
+                values[index] = _parity(sim_reg, parsed[index])
+
+    return values
+
+
+def _rotated(sim_reg: "QrackSimulator", basis: dict[int, str]) -> "QrackSimulator":
+    # the state rotated so that measuring `basis` becomes measuring Z, cloned
+    # unless it is already the Z basis
+    if all(pauli == "Z" for pauli in basis.values()):
+        return sim_reg
+
+    rotated = sim_reg.clone()
+    for addr, pauli in basis.items():
+        if pauli == "Y":
+            rotated.adjs(addr)
+        if pauli != "Z":
+            rotated.h(addr)
+    return rotated
+
+
+def _parity(sim_reg: "QrackSimulator", paulis: dict[int, str]) -> float:
+    # gathers the parity of the rotated qubits on the first one
+    if len(paulis) == 1:
+        ((addr, pauli),) = paulis.items()
+        return sim_reg.pauli_expectation([addr], [PAULI_CODES[pauli]])
+
+    rotated = _rotated(sim_reg, paulis)
+    if rotated is sim_reg:
+        rotated = sim_reg.clone()
+    target, *others = paulis
+    for addr in others:
+        rotated.mcx([addr], target)
+    return 1 - 2 * rotated.prob(target)
+
+
+def _batch(
+    sim_reg: "QrackSimulator", group: list[dict[int, str]], support: list[int]
+) -> np.ndarray:
+    # evaluates observables measured in the same basis from its probabilities
+    basis: dict[int, str] = {}
+    for paulis in group:
+        basis.update(paulis)
+
+    probs = prob_all(_rotated(sim_reg, basis), support)
+    # eigenvalue of Z on each qubit of the support for every outcome
+    outcomes = np.arange(len(probs))
+    signs = 1.0 - 2.0 * (outcomes >> np.arange(len(support))[:, None] & 1)
+    position = {addr: i for i, addr in enumerate(support)}
+    return np.array(
+        [
+            np.prod(signs[[position[addr] for addr in paulis]], axis=0) @ probs
+            for paulis in group
+        ]
+    )
@@ -8,6 +8,13 @@ from bloqade.pyqrack.reg import (
     PyQrackQubit,
 )
 from bloqade.pyqrack.base import PyQrackInterpreter
+from bloqade.pyqrack.tape import (
+    TraceError,
+    Unresolved,
+    TracedQubit,
+    TapeRecorder,
+    FeedbackError,
+)
 from bloqade.qasm2.dialects import core
 
 
@@ -76,3 +83,33 @@ class PyQrackMethods(interp.MethodTable):
             return (False,)
 
         return (all(left is right for left, right in zip(lhs, rhs)),)
+
+
+@core.dialect.register(key="pyqrack.tape")
+class PyQrackTapeMethods(interp.MethodTable):
+
+    @interp.impl(core.CRegNew)
+    def creg_new(self, interp: TapeRecorder, frame: interp.Frame, stmt: core.CRegNew):
+        return (interp.new_creg(frame.get(stmt.n_bits)),)
+
+    @interp.impl(core.QRegGet)
+    def qreg_get(self, interp: TapeRecorder, frame: interp.Frame, stmt: core.QRegGet):
+        reg: PyQrackReg = frame.get(stmt.reg)
+        if reg.sim_reg is not interp.recorder:
+            raise TraceError("register was not allocated by the kernel")
+        return (TracedQubit(ref=reg, pos=frame.get(stmt.idx)),)
+
+    @interp.impl(core.Measure)
+    def measure(self, interp: TapeRecorder, frame: interp.Frame, stmt: core.Measure):
+        interp.measure(frame.get(stmt.qarg), frame.get(stmt.carg))
+        return ()
+
+    @interp.impl(core.CRegEq)
+    def creg_eq(self, interp: TapeRecorder, frame: interp.Frame, stmt: core.CRegEq):
+        for value in (frame.get(stmt.lhs), frame.get(stmt.rhs)):
+            if isinstance(value, CRegister) and any(
+                isinstance(bit, Unresolved) for bit in value
+            ):
+                raise FeedbackError("control flow depends on a measurement result")
+
+        return PyQrackMethods.creg_eq(self, interp, frame, stmt)
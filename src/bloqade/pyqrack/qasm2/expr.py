@@ -0,0 +1,23 @@
+from kirin import interp
+from bloqade.pyqrack.tape import TapeRecorder
+from bloqade.pyqrack.sweep import apply
+from bloqade.qasm2.dialects import expr
+
+
+@expr.dialect.register(key="pyqrack.tape")
+class PyQrackTapeMethods(interp.MethodTable):
+
+    @interp.impl(expr.Sin)
+    @interp.impl(expr.Cos)
+    @interp.impl(expr.Tan)
+    @interp.impl(expr.Exp)
+    @interp.impl(expr.Log)
+    @interp.impl(expr.Sqrt)
+    def function(
+        self,
+        interp: TapeRecorder,
+        frame: interp.Frame,
+        stmt: expr.Sin | expr.Cos | expr.Tan | expr.Exp | expr.Log | expr.Sqrt,
+    ):
+        # slots keep track of these functions, see `sweep.apply`
+        return (apply(type(stmt).__name__.lower(), frame.get(stmt.value)),)
@@ -1,20 +1,88 @@
+import functools
 from typing import Any
 
 from kirin import interp
+from pyqrack import QrackCircuit, QrackSimulator
 from kirin.dialects import ilist
 from bloqade.pyqrack.reg import PyQrackQubit
 from bloqade.pyqrack.base import PyQrackInterpreter
 from bloqade.qasm2.dialects import parallel
+from bloqade.pyqrack.circuit import (
+    FIXED_MATRICES,
+    MIN_SEGMENT_GATES,
+    r_matrix,
+    u_matrix,
+)
+
+LAYER_CACHE_SIZE = 256
+"""Number of layer circuits kept by `layer_circuit`, the least recently used is
+evicted first."""
+
+
+@functools.lru_cache(maxsize=LAYER_CACHE_SIZE)
+def layer_circuit(kind: str, params: tuple, addrs: tuple) -> QrackCircuit:
+    """The circuit applying a layer of parallel gates, memoized so repeated layers
+    are only built once.
+
+    Args
+        kind (str):
+            `cz`, `u` or `rz`.
+        params (tuple):
+            The angles of the gates.
+        addrs (tuple):
+            The target of each gate, or its `(ctrl, qarg)` pair for `cz`.
+
+    Returns
+        The circuit of the layer.
+
+    """
+    circuit = QrackCircuit()
+    if kind == "cz":
+        for ctrl, qarg in addrs:
+            circuit.ucmtrx([ctrl], FIXED_MATRICES["z"], qarg, 1)
+        return circuit
+
+    m = u_matrix(*params) if kind == "u" else r_matrix(3, *params)
+    for addr in addrs:
+        circuit.mtrx(m, addr)
+    return circuit
+
+
+def _run_layer(sim_reg: QrackSimulator, kind: str, params: tuple, addrs: tuple) -> None:
+    # a layer too small to amortize running a circuit gets one call per gate
+    if len(addrs) >= MIN_SEGMENT_GATES:
+        layer_circuit(kind, params, addrs).run(sim_reg)
+    elif kind == "cz":
+        for ctrl, qarg in addrs:
+            sim_reg.mcz([ctrl], qarg)
+    elif kind == "u":
+        for addr in addrs:
+            sim_reg.u(addr, *params)
+    else:
+        for addr in addrs:
+            sim_reg.r(3, *params, addr)
 
 
 @parallel.dialect.register(key="pyqrack")
 class PyQrackMethods(interp.MethodTable):
+    """Parallel gates on a `QrackSimulator` filter the active qubits once and apply
+    the whole layer as one circuit, see `layer_circuit`. Recorded and mocked
+    simulators get one call per gate."""
 
     @interp.impl(parallel.CZ)
     def cz(self, interp: PyQrackInterpreter, frame: interp.Frame, stmt: parallel.CZ):
 
         qargs: ilist.IList[PyQrackQubit, Any] = frame.get(stmt.qargs)
         ctrls: ilist.IList[PyQrackQubit, Any] = frame.get(stmt.ctrls)
+        if isinstance(sim_reg := interp.memory.sim_reg, QrackSimulator):
+            pairs = tuple(
+                (ctrl.addr, qarg.addr)
+                for qarg, ctrl in zip(qargs, ctrls)
+                if qarg.is_active() and ctrl.is_active()
+            )
+            _run_layer(sim_reg, "cz", (), pairs)
+            return ()
+
         for qarg, ctrl in zip(qargs, ctrls):
             if qarg.is_active() and ctrl.is_active():
                 interp.memory.sim_reg.mcz([ctrl.addr], qarg.addr)
@@ -30,6 +98,11 @@ class PyQrackMethods(interp.MethodTable):
             frame.get(stmt.phi),
             frame.get(stmt.lam),
         )
+        if isinstance(sim_reg := interp.memory.sim_reg, QrackSimulator):
+            addrs = tuple(qarg.addr for qarg in qargs if qarg.is_active())
+            _run_layer(sim_reg, "u", (theta, phi, lam), addrs)
+            return ()
+
         for qarg in qargs:
             if qarg.is_active():
                 interp.memory.sim_reg.u(qarg.addr, theta, phi, lam)
@@ -39,6 +112,11 @@ class PyQrackMethods(interp.MethodTable):
     def rz(self, interp: PyQrackInterpreter, frame: interp.Frame, stmt: parallel.RZ):
         qargs: ilist.IList[PyQrackQubit, Any] = frame.get(stmt.qargs)
         phi = frame.get(stmt.theta)
+        if isinstance(sim_reg := interp.memory.sim_reg, QrackSimulator):
+            addrs = tuple(qarg.addr for qarg in qargs if qarg.is_active())
+            _run_layer(sim_reg, "rz", (phi,), addrs)
+            return ()
+
         for qarg in qargs:
             if qarg.is_active():
                 interp.memory.sim_reg.r(3, phi, qarg.addr)
@@ -0,0 +1,162 @@
+import typing
+from dataclasses import dataclass
+
+import numpy as np
+from kirin.dialects import ilist
+from bloqade.pyqrack.reg import CBitRef, CRegister, Measurement
+
+LOST = np.uint8(Measurement.Lost)
+"""Code of a `Measurement.Lost` result in an unpacked `MeasurementArray`."""
+
+_CHARS = np.frombuffer(b"01L", dtype="S1")
+
+
+def measurement_codes(value) -> list[int]:
+    """Flatten the classical return value of a kernel into a list of
+    measurement codes, in the order the bits appear in the value.
+
+    Args
+        value: a `CRegister`, `CBitRef` or `Measurement`, or a tuple, list
+            or `IList` of them.
+
+    Returns
+        The code of each bit, 0, 1 or `LOST`.
+
+    Raises
+        ValueError: if the value holds anything other than classical bits.
+
+    """
+    if isinstance(value, CRegister):
+        return [int(bit) for bit in value]
+    elif isinstance(value, CBitRef):
+        return [int(value.get_value())]
+    elif isinstance(value, (Measurement, bool)):
+        return [int(value)]
+    elif isinstance(value, ilist.IList):
+        return measurement_codes(value.data)
+    elif isinstance(value, (tuple, list)):
+        return [code for v in value for code in measurement_codes(v)]
+    raise ValueError(f"cannot store a return value of type {type(value)} as bits")
+
+
+def count_outcomes(codes: np.ndarray, counts: dict[int, int]):
+    """Add the shots in a `(shots, nbits)` array of measurement codes to a
+    histogram keyed by integers, bit `i` of a key being bit `i` of the shot.
+    Only distinct outcomes are converted to keys.
+
+    Raises
+        ValueError: if a bit is `LOST`, which has no integer encoding.
+
+    """
+    unique, shots = np.unique(codes, axis=0, return_counts=True)
+    if (unique == LOST).any():
+        raise ValueError("lost measurement results cannot be counted as integers")
+
+    for row, n in zip(np.packbits(unique, axis=1, bitorder="little"), shots.tolist()):
+        key = int.from_bytes(row.tobytes(), "little")
+        counts[key] = counts.get(key, 0) + n
+
+
+@dataclass(frozen=True)
+class MeasurementArray:
+    """Classical results of many shots stored in NumPy arrays instead of one
+    Python object per bit.
+
+    Bits appear in the order of the kernel's return value, the first bit of the
+    first register being the leftmost character of a bitstring.
+    """
+
+    bits: np.ndarray
+    """A `(shots, nbits)` uint8 array of measurement codes, 0, 1 or `LOST`. When
+    packed, the bits of each shot packed with `np.packbits`, lost bits reading 0."""
+
+    nbits: int
+    """Number of bits in each shot."""
+
+    lost: np.ndarray | None = None
+    """When packed, the mask of lost bits packed with `np.packbits`."""
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray) -> "MeasurementArray":
+        return cls(codes, codes.shape[1])
+
+    @classmethod
+    def from_results(
+        cls, results: typing.Iterable[typing.Any], shots: int
+    ) -> "MeasurementArray":
+        """Encode the return values of `shots` shots one at a time into a
+        preallocated array.
+        """
+        codes: np.ndarray | None = None
+        for shot, result in enumerate(results):
+            row = measurement_codes(result)
+            if codes is None:
+                codes = np.empty((shots, len(row)), dtype=np.uint8)
+            codes[shot] = row
+
+        if codes is None:
+            codes = np.empty((shots, 0), dtype=np.uint8)
+        return cls.from_codes(codes)
+
+    @property
+    def packed(self) -> bool:
+        return self.lost is not None
+
+    @property
+    def shots(self) -> int:
+        return self.bits.shape[0]
+
+    def pack(self) -> "MeasurementArray":
+        """Pack the bits of each shot, eight per byte."""
+        if self.packed:
+            return self
+        return MeasurementArray(
+            np.packbits(self.bits == 1, axis=1),
+            self.nbits,
+            np.packbits(self.bits == LOST, axis=1),
+        )
+
+    def unpack(self) -> np.ndarray:
+        """The `(shots, nbits)` uint8 array of measurement codes."""
+        if not self.packed:
+            return self.bits
+        return _unpack(self.bits, self.lost, self.nbits)
+
+    def bitstrings(self) -> np.ndarray:
+        """The result of each shot as a string of `0`, `1` and `L` for lost bits.
+
+        Returns
+            A `(shots,)` unicode array.
+
+        """
+        if self.nbits == 0:
+            return np.full(self.shots, "")
+
+        chars = _CHARS[self.unpack()]
+        return chars.view(f"S{self.nbits}").reshape(-1).astype(f"U{self.nbits}")
+
+    def counts(self) -> dict[str, int]:
+        """Count the shots with each outcome. Only distinct outcomes are decoded.
+
+        Returns
+            A dictionary from bitstring, see `bitstrings`, to number of shots.
+
+        """
+        if self.packed:
+            rows = np.concatenate([self.bits, self.lost], axis=1)
+        else:
+            rows = self.bits
+
+        unique, counts = np.unique(rows, axis=0, return_counts=True)
+        if self.packed:
+            width = self.bits.shape[1]
+            unique = _unpack(unique[:, :width], unique[:, width:], self.nbits)
+
+        keys = MeasurementArray.from_codes(unique).bitstrings()
+        return dict(zip(keys.tolist(), counts.tolist()))
+
+
+def _unpack(bits: np.ndarray, lost: np.ndarray, nbits: int) -> np.ndarray:
+    codes = np.unpackbits(bits, axis=1, count=nbits)
+    codes[np.unpackbits(lost, axis=1, count=nbits).astype(bool)] = LOST
+    return codes
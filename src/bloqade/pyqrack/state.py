@@ -0,0 +1,55 @@
+import ctypes
+from typing import Sequence
+
+import numpy as np
+from pyqrack import QrackSimulator
+from pyqrack.qrack_system import Qrack
+
+REAL1 = np.float32 if Qrack.fppow < 6 else np.float64
+"""Floating point type of the Qrack build, that its buffers are filled with."""
+
+_REAL1_POINTER = ctypes.POINTER(ctypes.c_float if Qrack.fppow < 6 else ctypes.c_double)
+
+
+def out_ket(sim_reg: QrackSimulator) -> np.ndarray:
+    """The state vector of a simulator, read into one buffer by Qrack instead of
+    converting every amplitude to a Python complex like `QrackSimulator.out_ket`.
+
+    Returns
+        A complex128 array of `2 ** num_qubits` amplitudes, qubit 0 being the
+        least significant bit of the index.
+
+    """
+    # amplitudes are stored as consecutive (real, imag) pairs
+    buffer = np.zeros(2 << sim_reg.num_qubits(), dtype=REAL1)
+    Qrack.qrack_lib.OutKet(sim_reg.sid, buffer.ctypes.data_as(_REAL1_POINTER))
+    sim_reg._throw_if_error()
+    return buffer.astype(np.float64).view(np.complex128)
+
+
+def prob_all(sim_reg: QrackSimulator, addrs: Sequence[int] | None = None) -> np.ndarray:
+    """The probabilities of the outcomes of measuring some qubits of a simulator,
+    read into one buffer by Qrack like `out_ket`.
+
+    Args
+        sim_reg (QrackSimulator):
+            The simulator holding the state, it is not modified.
+        addrs (Sequence[int] | None):
+            The addresses of the qubits to marginalise onto, all qubits if None.
+
+    Returns
+        A float64 array of `2 ** len(addrs)` probabilities, `addrs[i]` being bit
+        `i` of the index.
+
+    """
+    if addrs is None:
+        addrs = range(sim_reg.num_qubits())
+    buffer = np.zeros(1 << len(addrs), dtype=REAL1)
+    Qrack.qrack_lib.ProbAll(
+        sim_reg.sid,
+        len(addrs),
+        (ctypes.c_ulonglong * len(addrs))(*addrs),
+        buffer.ctypes.data_as(_REAL1_POINTER),
+    )
+    sim_reg._throw_if_error()
+    return buffer.astype(np.float64)
@@ -0,0 +1,143 @@
+import math
+import operator
+from typing import Callable, Sequence
+from dataclasses import replace
+
+from kirin import ir, interp
+from bloqade.pyqrack.tape import Gate, Tape, Measure, TraceError, TapeRecorder
+
+Expr = tuple | float
+"""How a swept angle is computed from the parameters of a point: `("arg", i)` for
+the i-th parameter, `(name, *operands)` for a function of `operator` or of
+`FUNCTIONS` applied to sub-expressions, or a constant."""
+
+FUNCTIONS: dict[str, Callable[[float], float]] = {
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "exp": math.exp,
+    "log": math.log,
+    "sqrt": math.sqrt,
+}
+"""Functions of the `qasm2.expr` dialect that slots keep track of, see `apply`."""
+
+
+class Slot(float):
+    """A kernel argument swept by `PyQrack.sweep`, or an angle computed from such
+    arguments by arithmetic.
+
+    The kernel is recorded once with slots holding the parameters of its first
+    point. Arithmetic keeps track of how each angle was computed, so gates of the
+    recorded tape taking a slot are bound to the angles of any other point by
+    `bind`. Branching on a slot raises `TraceError`, since the recorded control
+    flow may not hold for other points.
+    """
+
+    expr: Expr
+
+    def __new__(cls, value: float, expr: Expr):
+        slot = super().__new__(cls, value)
+        slot.expr = expr
+        return slot
+
+    def __getnewargs__(self):
+        return float(self), self.expr
+
+    def __neg__(self):
+        return Slot(-float(self), ("neg", self.expr))
+
+    def __pos__(self):
+        return self
+
+    def __bool__(self):
+        raise TraceError("control flow depends on a swept parameter")
+
+    def _compare(self, other):
+        raise TraceError("control flow depends on a swept parameter")
+
+    __lt__ = __le__ = __gt__ = __ge__ = __eq__ = __ne__ = _compare
+    __hash__ = float.__hash__
+
+
+def _binary(name: str, reflected: bool):
+    op = getattr(operator, name)
+
+    def method(self: Slot, other):
+        if not isinstance(other, (int, float)):
+            return NotImplemented
+        rhs = other.expr if isinstance(other, Slot) else float(other)
+        if reflected:
+            return Slot(op(float(other), float(self)), (name, rhs, self.expr))
+        return Slot(op(float(self), float(other)), (name, self.expr, rhs))
+
+    return method
+
+
+for _name in ("add", "sub", "mul", "truediv", "pow"):
+    setattr(Slot, f"__{_name}__", _binary(_name, False))
+    setattr(Slot, f"__r{_name}__", _binary(_name, True))
+
+
+def slots(point: Sequence[float]) -> tuple[Slot, ...]:
+    """The arguments recording a kernel at `point` with late-bound angles."""
+    return tuple(Slot(value, ("arg", i)) for i, value in enumerate(point))
+
+
+def apply(name: str, value: float) -> float:
+    """`FUNCTIONS[name]` applied to `value`, keeping track of it if it is a slot."""
+    result = FUNCTIONS[name](value)
+    if isinstance(value, Slot):
+        return Slot(result, (name, value.expr))
+    return result
+
+
+def evaluate(expr: Expr, point: Sequence[float]) -> float:
+    """The value of a slot expression at `point`."""
+    if not isinstance(expr, tuple):
+        return expr
+    elif expr[0] == "arg":
+        return point[expr[1]]
+
+    name, *operands = expr
+    function = FUNCTIONS.get(name) or getattr(operator, name)
+    return function(*(evaluate(e, point) for e in operands))
+
+
+class SlotRecorder(TapeRecorder):
+    """Recorder of a kernel called with `slots`, whose tape holds a valid
+    template for every point, see `bind`.
+
+    A statement taking a slot raises TraceError if it returns a plain number, as
+    a function slots do not keep track of does, or records anything else than
+    gates and measurements, e.g. a noise channel whose probability is a slot.
+    The recorded value would hold for the recorded point only.
+    """
+
+    def eval_stmt(self, frame: interp.Frame, stmt: ir.Statement):
+        if not any(isinstance(frame.get(arg), Slot) for arg in stmt.args):
+            return super().eval_stmt(frame, stmt)
+
+        start = len(self.recorder.ops)
+        result = super().eval_stmt(frame, stmt)
+        if isinstance(result, tuple) and any(
+            isinstance(value, (int, float, complex)) and not isinstance(value, Slot)
+            for value in result
+        ):
+            raise TraceError("a swept parameter goes through an untracked function")
+        elif any(type(op) not in (Gate, Measure) for op in self.recorder.ops[start:]):
+            raise TraceError("a swept parameter is used elsewhere than in a gate")
+        return result
+
+
+def bind(tape: Tape, point: Sequence[float]) -> Tape:
+    """Replace the slots in the gates of a tape recorded by a `SlotRecorder`
+    with `slots` by their values at `point`."""
+    ops = list(tape.ops)
+    for index, op in enumerate(ops):
+        if type(op) is Gate and any(isinstance(arg, Slot) for arg in op.args):
+            args = tuple(
+                evaluate(arg.expr, point) if isinstance(arg, Slot) else arg
+                for arg in op.args
+            )
+            ops[index] = op._replace(args=args)
+    return replace(tape, ops=tuple(ops))
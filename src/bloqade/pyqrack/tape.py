@@ -0,0 +1,938 @@
+import typing
+import functools
+from dataclasses import field, dataclass
+
+import numpy as np
+from kirin import ir, interp
+from kirin.dialects import ilist
+from bloqade.pyqrack.reg import (
+    CBitRef,
+    CRegister,
+    PyQrackReg,
+    QubitState,
+    Measurement,
+    PyQrackQubit,
+)
+from bloqade.pyqrack.base import MemoryABC, StackMemory, PyQrackInterpreter
+from bloqade.pyqrack.circuit import MIN_SEGMENT_GATES, lower
+from bloqade.pyqrack.results import measurement_codes
+from kirin.interp.exceptions import InterpreterError
+
+if typing.TYPE_CHECKING:
+    from pyqrack import QrackCircuit, QrackSimulator
+from bloqade.pyqrack.noise.sampling import PAULIS, NoiseSites, PauliTable
+
+SIM_CALLS: dict[str, str] = {
+    "x": "q",
+    "y": "q",
+    "z": "q",
+    "h": "q",
+    "s": "q",
+    "t": "q",
+    "adjs": "q",
+    "adjt": "q",
+    "u": "qfff",
+    "r": "ifq",
+    "mcx": "Cq",
+    "mcy": "Cq",
+    "mcz": "Cq",
+    "mch": "Cq",
+    "mcu": "Cqfff",
+    "mcr": "ifCq",
+    "swap": "qq",
+    "cswap": "Cqq",
+    "force_m": "qi",
+}
+"""Simulator methods that can be recorded, with the role of each argument:
+`q` a qubit address, `C` a list of control addresses, `f` an angle and
+`i` an integer constant."""
+
+MAX_SHOT_QUBITS = 32
+"""Most qubits `QrackSimulator.measure_shots` can measure, outcomes are 32-bit."""
+
+MIN_SNAPSHOT_GATES = 4
+"""Shortest deterministic prefix that `Tape.replayer` simulates once and clones,
+cloning a simulator costs about as much as applying a few gates."""
+
+
+SHOT_FUNCTION = "shot"
+"""Name of the function defined by `Tape.source`, called as
+`shot(sim, rng, lost, cregs, loss_m_result, events, start)`."""
+
+
+class TraceError(Exception):
+    """Raised when a kernel cannot be recorded as a tape, e.g. because
+    its control flow depends on a measurement result."""
+
+
+class FeedbackError(TraceError):
+    """Raised when the control flow of a kernel being recorded depends on the
+    result of a measurement."""
+
+
+class Gate(typing.NamedTuple):
+    """A simulator call, applied only if every address in `guard` is active."""
+
+    guard: tuple[int, ...]
+    name: str
+    args: tuple
+
+    def qubits(self) -> list[int]:
+        """The addresses the call acts on, see `SIM_CALLS`."""
+        qubits: list[int] = []
+        for role, arg in zip(SIM_CALLS[self.name], self.args):
+            if role == "q":
+                qubits.append(arg)
+            elif role == "C":
+                qubits.extend(arg)
+        return qubits
+
+
+class Measure(typing.NamedTuple):
+    """Measure `addr` into bit `pos` of classical register `creg`."""
+
+    addr: int
+    creg: int
+    pos: int
+
+
+class PauliError(typing.NamedTuple):
+    """Apply a random Pauli drawn from `table` to each active qubit in `addrs`."""
+
+    addrs: tuple[int, ...]
+    table: PauliTable
+
+
+class CZPauliError(typing.NamedTuple):
+    """Pauli errors on CZ pairs, see `native.CZPauliChannel`."""
+
+    ctrls: tuple[int, ...]
+    qargs: tuple[int, ...]
+    paired: bool
+    ctrl_table: PauliTable
+    qarg_table: PauliTable
+
+
+class AtomLoss(typing.NamedTuple):
+    """Lose each active atom in `addrs` with probability `prob`."""
+
+    addrs: tuple[int, ...]
+    prob: float
+
+
+Op = Gate | Measure | PauliError | CZPauliError | AtomLoss
+
+
+class Segment(typing.NamedTuple):
+    """Consecutive gates of a tape lowered to a single `QrackCircuit`."""
+
+    end: int
+    """Index of the first operation after the segment."""
+    guard: frozenset[int]
+    """Addresses guarding any of the gates, the circuit only runs if none is lost."""
+    circuit: "QrackCircuit"
+
+
+class MeasureRun(typing.NamedTuple):
+    """Consecutive measurements of a tape performed by a single simulator call."""
+
+    end: int
+    """Index of the first operation after the run."""
+    final: bool
+    """Whether nothing uses the simulator after the run, so the outcomes can be
+    sampled without collapsing the state."""
+
+
+@dataclass(frozen=True)
+class _QRegSlot:
+    index: int
+
+
+@dataclass(frozen=True)
+class _QubitSlot:
+    reg: int
+    pos: int
+
+
+@dataclass(frozen=True)
+class _CRegSlot:
+    index: int
+
+
+@dataclass(frozen=True)
+class _CBitSlot:
+    creg: int
+    pos: int
+
+
+class Unresolved:
+    """Placeholder for a measurement result that is only known at replay time."""
+
+    def _fail(self, *args):
+        raise FeedbackError("control flow depends on a measurement result")
+
+    __bool__ = __int__ = __index__ = __float__ = __hash__ = _fail
+    __eq__ = __ne__ = __lt__ = __le__ = __gt__ = __ge__ = _fail  # type: ignore
+
+
+UNRESOLVED = Unresolved()
+
+
+class Recorder:
+    """Stand-in for `QrackSimulator` that records calls instead of simulating."""
+
+    def __init__(self):
+        self.ops: list[Op] = []
+        self._guard: list[int] = []
+        self._emitted = False
+
+    def begin(self):
+        """Start recording a new statement."""
+        self._guard = []
+        self._emitted = False
+
+    def guard(self, addr: int):
+        """Mark `addr` as checked by `is_active` for the next recorded calls."""
+        if self._emitted:
+            self._guard = []
+            self._emitted = False
+        self._guard.append(addr)
+
+    def emit(self, op: Op):
+        self.ops.append(op)
+        self._emitted = True
+
+    def __getattr__(self, name: str):
+        if name not in SIM_CALLS:
+            raise TraceError(f"cannot record simulator method {name!r}")
+
+        def record(*args):
+            self.emit(Gate(tuple(self._guard), name, args))
+
+        return record
+
+
+@dataclass(frozen=True)
+class TracedQubit(PyQrackQubit):
+    """Qubit reference that reports its `is_active` checks to the `Recorder`."""
+
+    def is_active(self) -> bool:
+        self.sim_reg.guard(self.addr)
+        return True
+
+
+@dataclass
+class TapeMemory(MemoryABC):
+    """Memory handing out sequential addresses backed by a `Recorder`."""
+
+    allocations: list[tuple[int, ...]] = field(init=False, default_factory=list)
+
+    def allocate(self, n_qubits: int):
+        start = sum(map(len, self.allocations))
+        addrs = tuple(range(start, start + n_qubits))
+        self.allocations.append(addrs)
+        return addrs
+
+    def reset(self):
+        self.allocations = []
+        self.sim_reg = Recorder()
+
+
+@dataclass
+class TapeRecorder(PyQrackInterpreter):
+    """Interpreter recording a kernel as a `Tape` instead of simulating it.
+
+    Statements that touch the simulator only through `sim_reg` are recorded by
+    running their regular `pyqrack` implementation against a `Recorder`;
+    measurements and noise channels are recorded by the `pyqrack.tape` tables.
+    """
+
+    keys = ["pyqrack.tape", "pyqrack", "main"]
+    memory: TapeMemory = field(default_factory=TapeMemory, kw_only=True)
+    outcomes: tuple[int, ...] = field(default=(), kw_only=True)
+    """Results of the first measurements of the kernel, the results of later
+    measurements are only known at replay time, see `branches.BranchSampler`."""
+    measured: int = field(init=False, default=0)
+    cregs: list[int | CRegister] = field(init=False, default_factory=list)
+    creg_index: dict[int, int] = field(init=False, default_factory=dict)
+    saved: list[tuple[CRegister, list]] = field(init=False, default_factory=list)
+
+    def initialize(self):
+        super().initialize()
+        self.cregs = []
+        self.creg_index = {}
+        self.saved = []
+        self.measured = 0
+        return self
+
+    def eval_stmt(self, frame: interp.Frame, stmt: ir.Statement):
+        self.recorder.begin()
+        return super().eval_stmt(frame, stmt)
+
+    @property
+    def recorder(self) -> Recorder:
+        return self.memory.sim_reg
+
+    def emit(self, op: Op):
+        self.recorder.emit(op)
+
+    def new_creg(self, size: int) -> CRegister:
+        creg = CRegister(size=size)
+        self.creg_index[id(creg)] = len(self.cregs)
+        self.cregs.append(size)
+        return creg
+
+    def get_creg(self, creg: CRegister) -> int:
+        """Index of `creg`, registering it if it was created outside the kernel."""
+        if (index := self.creg_index.get(id(creg))) is None:
+            index = self.creg_index[id(creg)] = len(self.cregs)
+            self.cregs.append(creg)
+            self.saved.append((creg, list(creg)))
+        return index
+
+    def get_addr(self, qarg: PyQrackQubit) -> int:
+        if qarg.sim_reg is not self.recorder:
+            raise TraceError("qubit was not allocated by the kernel")
+        return qarg.addr
+
+    def measure(self, qarg: PyQrackQubit, carg: CBitRef):
+        self.emit(Measure(self.get_addr(qarg), self.get_creg(carg.ref), carg.pos))
+        index, self.measured = self.measured, self.measured + 1
+        if index < len(self.outcomes):
+            carg.set_value(Measurement(self.outcomes[index]))
+        else:
+            carg.set_value(UNRESOLVED)
+
+    def record(
+        self,
+        mt: ir.Method,
+        args: tuple = (),
+        kwargs: dict[str, typing.Any] | None = None,
+    ) -> "Tape":
+        """Record `mt` called with the given arguments.
+
+        Raises
+            TraceError: if the kernel cannot be replayed from a tape.
+
+        """
+        try:
+            result = self.run(mt, args, kwargs).expect()
+            return Tape(
+                ops=tuple(self.recorder.ops),
+                qregs=tuple(self.memory.allocations),
+                cregs=tuple(self.cregs),
+                result=self._template(result),
+            )
+        finally:
+            # registers passed in as arguments must not keep placeholders
+            for creg, values in self.saved:
+                creg[:] = values
+
+    def _template(self, value):
+        if isinstance(value, PyQrackReg):
+            try:
+                return _QRegSlot(self.memory.allocations.index(value.addrs))
+            except ValueError:
+                raise TraceError("returned register was not allocated by the kernel")
+        elif isinstance(value, PyQrackQubit):
+            return _QubitSlot(self._template(value.ref).index, value.pos)
+        elif isinstance(value, CRegister):
+            if (index := self.creg_index.get(id(value))) is None:
+                return value
+            return _CRegSlot(index)
+        elif isinstance(value, CBitRef):
+            if (index := self.creg_index.get(id(value.ref))) is None:
+                return value
+            return _CBitSlot(index, value.pos)
+        elif isinstance(value, ilist.IList):
+            return ilist.IList([self._template(v) for v in value.data])
+        elif isinstance(value, (tuple, list)):
+            return type(value)(self._template(v) for v in value)
+        elif value is None or isinstance(value, (bool, int, float, complex, str)):
+            return value
+        raise TraceError(f"cannot replay a return value of type {type(value)}")
+
+
+@dataclass(frozen=True)
+class Tape:
+    """A kernel recorded as a flat sequence of simulator operations.
+
+    Replaying a tape is equivalent to running the kernel it was recorded from,
+    including the random draws of noise channels, without walking the IR.
+    """
+
+    ops: tuple[Op, ...]
+    """The recorded operations, in program order."""
+
+    qregs: tuple[tuple[int, ...], ...]
+    """The addresses of each quantum register allocated by the kernel."""
+
+    cregs: tuple[int | CRegister, ...]
+    """The size of each classical register created by the kernel, or the
+    register itself if it was passed in as an argument."""
+
+    result: typing.Any
+    """The return value of the kernel with runtime values replaced by slots."""
+
+    skip_ahead: bool = False
+    """Whether `replay` draws noise from `noise_sites`, skipping over the sites
+    where nothing happens, instead of drawing every site like the interpreter."""
+
+    native: bool = False
+    """Whether runs of at least `MIN_SEGMENT_GATES` gates are applied as a single
+    `QrackCircuit`, see `segments`, instead of one simulator call per gate."""
+
+    batch_measure: bool = False
+    """Whether runs of consecutive measurements are performed by a single simulator
+    call, see `measure_runs`, instead of one call per measurement."""
+
+    source: str | None = None
+    """Source of a function replaying the operations, see `codegen.generate`. If
+    set, `replay` calls the function instead of dispatching on every operation."""
+
+    def __getstate__(self):
+        # circuits and functions cannot be pickled, they are rebuilt when needed
+        state = self.__dict__.copy()
+        state.pop("segments", None)
+        state.pop("program", None)
+        return state
+
+    @functools.cached_property
+    def program(self) -> typing.Callable[..., None] | None:
+        """The function defined by `source`, None if it is not set."""
+        if self.source is None:
+            return None
+
+        namespace = {
+            "np": np,
+            "PAULIS": PAULIS,
+            "Measurement": Measurement,
+            "apply_events": _apply_events,
+            "apply_cz_paulis": _apply_cz_paulis,
+            "measure_run": _measure_run,
+            "ops": self.ops,
+            "segments": self.segments,
+        }
+        exec(compile(self.source, "<tape>", "exec"), namespace)
+        return namespace[SHOT_FUNCTION]
+
+    @functools.cached_property
+    def segments(self) -> dict[int, Segment]:
+        """The runs of gates lowered to circuits, keyed by the index of their
+        first gate. Empty unless `native` is set."""
+        segments: dict[int, Segment] = {}
+        if not self.native:
+            return segments
+
+        start = 0
+        for index in range(len(self.ops) + 1):
+            if index < len(self.ops):
+                op = self.ops[index]
+                if type(op) is Gate and op.name != "force_m":
+                    continue
+
+            if index - start >= MIN_SEGMENT_GATES:
+                gates = typing.cast(tuple[Gate, ...], self.ops[start:index])
+                guard = frozenset(addr for gate in gates for addr in gate.guard)
+                segments[start] = Segment(index, guard, lower(gates))
+            start = index + 1
+
+        return segments
+
+    @functools.cached_property
+    def measure_runs(self) -> dict[int, MeasureRun]:
+        """The runs of at least two measurements, keyed by the index of their first
+        measurement. Empty unless `batch_measure` is set."""
+        runs: dict[int, MeasureRun] = {}
+        if not self.batch_measure:
+            return runs
+
+        final = not self.returns_qubits()
+        index = 0
+        while index < len(self.ops):
+            end = index
+            while end < len(self.ops) and type(self.ops[end]) is Measure:
+                end += 1
+
+            if end - index >= 2:
+                runs[index] = MeasureRun(end, final and end == len(self.ops))
+            index = max(end, index + 1)
+
+        return runs
+
+    @functools.cached_property
+    def noise_sites(self) -> NoiseSites:
+        """The noise sites of all noise operations, as one stream."""
+        sites: list[tuple[int, int, float, PauliTable | None]] = []
+        for index, op in enumerate(self.ops):
+            if type(op) is PauliError:
+                prob = sum(op.table.p[1:])
+                for pos in range(len(op.addrs)):
+                    sites.append((index, pos, prob, op.table))
+            elif type(op) is CZPauliError:
+                ctrl_prob = sum(op.ctrl_table.p[1:])
+                qarg_prob = sum(op.qarg_table.p[1:])
+                for pair in range(len(op.ctrls)):
+                    sites.append((index, 2 * pair, ctrl_prob, op.ctrl_table))
+                    sites.append((index, 2 * pair + 1, qarg_prob, op.qarg_table))
+            elif type(op) is AtomLoss:
+                for pos in range(len(op.addrs)):
+                    sites.append((index, pos, op.prob, None))
+
+        return NoiseSites.build(sites)
+
+    @functools.cached_property
+    def prefix_length(self) -> int:
+        """Number of gates at the start of the tape, before any noise,
+        measurement or reset, whose result is the same in every shot."""
+        for index, op in enumerate(self.ops):
+            if type(op) is not Gate or op.name == "force_m":
+                return index
+        return len(self.ops)
+
+    def _allocate(
+        self, memory: MemoryABC, snapshot: "QrackSimulator | None" = None
+    ) -> list[PyQrackReg]:
+        if snapshot is None:
+            memory.reset()
+        else:
+            typing.cast(StackMemory, memory).restore(snapshot)
+
+        qregs: list[PyQrackReg] = []
+        for addrs in self.qregs:
+            if memory.allocate(len(addrs)) != addrs:
+                raise InterpreterError("memory allocated different qubit addresses")
+            qregs.append(
+                PyQrackReg(
+                    size=len(addrs),
+                    sim_reg=memory.sim_reg,
+                    addrs=addrs,
+                    qubit_state=[QubitState.Active] * len(addrs),
+                )
+            )
+        return qregs
+
+    def _new_cregs(self) -> list[CRegister]:
+        return [CRegister(c) if isinstance(c, int) else c for c in self.cregs]
+
+    def replayer(self, interp: PyQrackInterpreter) -> typing.Callable[[], typing.Any]:
+        """Return a function replaying one shot on the memory of `interp` per call.
+
+        If the tape starts with at least `MIN_SNAPSHOT_GATES` deterministic gates,
+        see `prefix_length`, and `interp` uses a `StackMemory`, they are simulated
+        once and every shot starts from a clone of the resulting state.
+        """
+        start = self.prefix_length
+        if start < MIN_SNAPSHOT_GATES or not isinstance(interp.memory, StackMemory):
+            return functools.partial(self.replay, interp)
+
+        self._allocate(interp.memory)
+        snapshot = interp.memory.sim_reg
+        self._apply_gates(snapshot, set(), 0, start)
+
+        interp.memory.detach()
+        return functools.partial(self.replay, interp, start, snapshot)
+
+    def replay(
+        self,
+        interp: PyQrackInterpreter,
+        start: int = 0,
+        snapshot: "QrackSimulator | None" = None,
+    ):
+        """Replay the tape as one shot on the memory of `interp`.
+
+        Args
+            interp (PyQrackInterpreter):
+                The interpreter whose memory and random state are used.
+            start (int):
+                Index of the first operation to replay, the operations before it
+                must be deterministic gates already applied to `snapshot`.
+            snapshot (QrackSimulator | None):
+                State to start from, cloned for this shot.
+
+        Returns
+            The return value of the recorded kernel.
+
+        """
+        qregs = self._allocate(interp.memory, snapshot)
+        cregs = self._new_cregs()
+        sim_reg = interp.memory.sim_reg
+        rng = interp.rng_state
+        lost: set[int] = set()
+        events = self.noise_sites.sample(rng) if self.skip_ahead else None
+        index = start
+        program = self.program
+        if program is not None and start in (0, self.prefix_length):
+            program(sim_reg, rng, lost, cregs, interp.loss_m_result, events, start)
+            index = len(self.ops)
+
+        while index < len(self.ops):
+            op = self.ops[index]
+            if type(op) is Gate:
+                index = self._apply_gates(sim_reg, lost, index)
+                continue
+            elif type(op) is Measure:
+                if (run := self.measure_runs.get(index)) is not None:
+                    measures = typing.cast(
+                        tuple[Measure, ...], self.ops[index : run.end]
+                    )
+                    _measure_run(
+                        sim_reg, lost, cregs, measures, run.final, interp.loss_m_result
+                    )
+                    index = run.end
+                    continue
+                elif op.addr in lost:
+                    cregs[op.creg][op.pos] = interp.loss_m_result
+                else:
+                    cregs[op.creg][op.pos] = Measurement(sim_reg.m(op.addr))
+            elif events is not None:
+                if index in events:
+                    _apply_events(sim_reg, lost, op, events[index])
+            elif type(op) is PauliError:
+                active = [addr for addr in op.addrs if addr not in lost]
+                if active:
+                    paulis = op.table.sample(rng, len(active))
+                    for i in np.flatnonzero(paulis):
+                        getattr(sim_reg, PAULIS[paulis[i]])(active[i])
+            elif type(op) is CZPauliError:
+                _apply_cz_paulis(sim_reg, rng, lost, op)
+            else:
+                active = [addr for addr in op.addrs if addr not in lost]
+                if active:
+                    draws = rng.random(len(active))
+                    for i in np.flatnonzero(draws <= op.prob):
+                        sim_reg.force_m(active[i], 0)
+                        lost.add(active[i])
+            index += 1
+
+        for reg in qregs:
+            for pos, addr in enumerate(reg.addrs):
+                if addr in lost:
+                    reg.drop(pos)
+
+        if self.returns_qubits():
+            interp.memory.detach()
+
+        return _fill(self.result, qregs, cregs)
+
+    def _apply_gates(
+        self, sim_reg, lost: set[int], start: int, stop: int | None = None
+    ) -> int:
+        # applies the gates from `start` on, up to `stop` or the next operation
+        # that is not a gate, and returns the index of the operation after them
+        stop = len(self.ops) if stop is None else stop
+        index = start
+        while index < stop:
+            segment = self.segments.get(index)
+            if segment is not None and segment.end <= stop:
+                if not lost or lost.isdisjoint(segment.guard):
+                    segment.circuit.run(sim_reg)
+                    index = segment.end
+                    continue
+
+            op = self.ops[index]
+            if type(op) is not Gate:
+                break
+            if not lost or lost.isdisjoint(op.guard):
+                getattr(sim_reg, op.name)(*op.args)
+            index += 1
+
+        return index
+
+    def can_sample(self) -> bool:
+        """Whether all shots can be drawn from a single simulation, i.e. the tape
+        is noise free, measures at most `MAX_SHOT_QUBITS` qubits, only after its
+        last gate, and returns no quantum registers."""
+        measured = set()
+        for op in self.ops:
+            if type(op) is Measure:
+                measured.add(op.addr)
+            elif type(op) is not Gate or op.name == "force_m" or measured:
+                return False
+
+        return len(measured) <= MAX_SHOT_QUBITS and not self.returns_qubits()
+
+    def is_unitary(self) -> bool:
+        """Whether the tape only applies gates, possibly followed by measurements,
+        i.e. it has no noise, resets or mid-circuit measurements."""
+        measured = False
+        for op in self.ops:
+            if type(op) is Measure:
+                measured = True
+            elif type(op) is not Gate or op.name == "force_m" or measured:
+                return False
+        return True
+
+    def simulate(self, interp: PyQrackInterpreter) -> "QrackSimulator":
+        """Apply the gates of a tape that `is_unitary` on the memory of `interp`,
+        skipping its measurements.
+
+        Returns
+            The simulator holding the resulting state.
+
+        """
+        self._allocate(interp.memory)
+        sim_reg = interp.memory.sim_reg
+        index = 0
+        while index < len(self.ops):
+            index = self._apply_gates(sim_reg, set(), index) + 1
+        return sim_reg
+
+    def components(self) -> list[tuple[int, ...]]:
+        """The connected components of the interaction graph of the qubits, in
+        which gates connect all the qubits they act on. Qubits of different
+        components are never entangled."""
+        num_qubits = sum(map(len, self.qregs))
+        parent = list(range(num_qubits))
+
+        def find(q: int) -> int:
+            while parent[q] != q:
+                parent[q] = parent[parent[q]]
+                q = parent[q]
+            return q
+
+        for op in self.ops:
+            if type(op) is Gate and len(qubits := op.qubits()) > 1:
+                root = find(qubits[0])
+                for q in qubits[1:]:
+                    parent[find(q)] = root
+
+        groups: dict[int, list[int]] = {}
+        for q in range(num_qubits):
+            groups.setdefault(find(q), []).append(q)
+        return [tuple(group) for group in groups.values()]
+
+    def returns_qubits(self) -> bool:
+        """Whether the kernel returns quantum registers or qubits."""
+        return _has_qubits(self.result)
+
+    def sampler(
+        self, interp: PyQrackInterpreter, codes: bool = False
+    ) -> typing.Callable[[int], typing.Any]:
+        """Simulate the gates once and return a function drawing any number of
+        shots from the final state with `QrackSimulator.measure_shots`, see
+        `can_sample`. With `codes`, it returns the `(shots, nbits)` uint8 array of
+        measurement codes instead, see `results.measurement_codes`, building the
+        return value only once for each distinct outcome.
+
+        The simulator is detached from the memory of `interp`, so the function
+        stays valid when `interp` runs other kernels in between.
+        """
+        draw, shot_result = self._prepare_sample(interp)
+        interp.memory.detach()
+        if codes:
+            return lambda shots: _encode(draw(shots), shot_result)
+        return lambda shots: [shot_result(outcome) for outcome in draw(shots)]
+
+    def can_group(self) -> bool:
+        """Whether shots can be grouped by noise pattern, see `pattern_sampler`,
+        i.e. the tape measures at most `MAX_SHOT_QUBITS` qubits, only after its last
+        gate and noise operation, and returns no quantum registers."""
+        measured = set()
+        for op in self.ops:
+            if type(op) is Measure:
+                measured.add(op.addr)
+            elif measured:
+                return False
+
+        return len(measured) <= MAX_SHOT_QUBITS and not self.returns_qubits()
+
+    def pattern_sampler(
+        self, interp: PyQrackInterpreter, codes: bool = False
+    ) -> typing.Callable[[int], typing.Any]:
+        """Return a function drawing any number of shots grouped by noise pattern,
+        see `can_group`.
+
+        The errors of every shot, including atom loss, are drawn up front from
+        `noise_sites`. Each distinct pattern is then simulated once and the
+        measurements of all shots sharing it are drawn with
+        `QrackSimulator.measure_shots`.
+        """
+        rng = interp.rng_state
+
+        def draw(shots: int):
+            patterns: dict[tuple, list[int]] = {}
+            for shot in range(shots):
+                events = self.noise_sites.sample(rng)
+                key = tuple((index, tuple(ev)) for index, ev in events.items())
+                patterns.setdefault(key, []).append(shot)
+
+            results: list = [None] * shots
+            rows = np.empty((shots, 0), dtype=np.uint8)
+            for i, (key, members) in enumerate(patterns.items()):
+                pattern_draw, shot_result = self._prepare_sample(interp, dict(key))
+                outcomes = pattern_draw(len(members))
+                if not codes:
+                    for shot, outcome in zip(members, outcomes):
+                        results[shot] = shot_result(outcome)
+                    continue
+
+                block = _encode(outcomes, shot_result)
+                if i == 0:
+                    rows = np.empty((shots, block.shape[1]), dtype=np.uint8)
+                rows[members] = block
+
+            return rows if codes else results
+
+        return draw
+
+    def _prepare_sample(
+        self,
+        interp: PyQrackInterpreter,
+        events: dict[int, typing.Iterable[tuple[int, int]]] | None = None,
+    ):
+        # simulates the tape up to its measurements, applying the error `events`
+        qregs = self._allocate(interp.memory)
+        sim_reg = interp.memory.sim_reg
+        rng = interp.rng_state
+        lost: set[int] = set()
+        measures: list[Measure] = []
+        index = 0
+        while index < len(self.ops):
+            op = self.ops[index]
+            if type(op) is Gate:
+                index = self._apply_gates(sim_reg, lost, index)
+                continue
+            elif type(op) is Measure:
+                measures.append(op)
+            elif events is not None and index in events:
+                _apply_events(sim_reg, lost, op, events[index])
+            index += 1
+
+        addrs = list(dict.fromkeys(op.addr for op in measures if op.addr not in lost))
+        masks = {addr: 1 << i for i, addr in enumerate(addrs)}
+
+        def draw(shots: int) -> list[int]:
+            if not addrs or shots == 0:
+                return [0] * shots
+
+            outcomes = sim_reg.measure_shots(addrs, shots)
+            # shots come back sorted by outcome
+            rng.shuffle(outcomes)
+            return outcomes
+
+        def shot_result(outcome: int):
+            cregs = self._new_cregs()
+            for op in measures:
+                if op.addr in lost:
+                    cregs[op.creg][op.pos] = interp.loss_m_result
+                elif outcome & masks[op.addr]:
+                    cregs[op.creg][op.pos] = Measurement.One
+                else:
+                    cregs[op.creg][op.pos] = Measurement.Zero
+            return _fill(self.result, qregs, cregs)
+
+        return draw, shot_result
+
+
+def _encode(outcomes: list[int], shot_result) -> np.ndarray:
+    unique, inverse = np.unique(np.asarray(outcomes), return_inverse=True)
+    table = np.array(
+        [measurement_codes(shot_result(outcome)) for outcome in unique],
+        dtype=np.uint8,
+    )
+    if len(table) == 0:
+        return np.empty((len(outcomes), 0), dtype=np.uint8)
+    return table[inverse.reshape(-1)]
+
+
+def _measure_run(
+    sim_reg,
+    lost: set[int],
+    cregs: list[CRegister],
+    measures: tuple[Measure, ...],
+    final: bool,
+    loss_m_result: Measurement,
+):
+    addrs = list(dict.fromkeys(op.addr for op in measures if op.addr not in lost))
+    outcome = _measure_many(sim_reg, addrs, final)
+    for op in measures:
+        if op.addr in lost:
+            cregs[op.creg][op.pos] = loss_m_result
+        elif outcome >> addrs.index(op.addr) & 1:
+            cregs[op.creg][op.pos] = Measurement.One
+        else:
+            cregs[op.creg][op.pos] = Measurement.Zero
+
+
+def _measure_many(sim_reg, addrs: list[int], final: bool) -> int:
+    # measures `addrs` at once, bit i of the result being the outcome of addrs[i]
+    if final and 1 < len(addrs) <= MAX_SHOT_QUBITS:
+        # the state is discarded, sampling it is enough
+        return sim_reg.measure_shots(addrs, 1)[0]
+    elif len(addrs) > 1 and sorted(addrs) == list(range(sim_reg.num_qubits())):
+        bits = sim_reg.m_all()
+        return sum((bits >> addr & 1) << i for i, addr in enumerate(addrs))
+    return sum(sim_reg.m(addr) << i for i, addr in enumerate(addrs))
+
+
+def _apply_cz_paulis(sim_reg, rng, lost: set[int], op: CZPauliError):
+    pairs = []
+    for ctrl, qarg in zip(op.ctrls, op.qargs):
+        ctrl_active = ctrl not in lost
+        qarg_active = qarg not in lost
+        if ctrl_active and qarg_active if op.paired else ctrl_active ^ qarg_active:
+            pairs.append((ctrl, qarg))
+
+    if not pairs:
+        return
+
+    # same draws as the interpreter, see `native.PyQrackMethods.cz_pauli_channel`
+    uniform = rng.random((len(pairs), 2))
+    ctrl_paulis = op.ctrl_table.lookup(uniform[:, 0])
+    qarg_paulis = op.qarg_table.lookup(uniform[:, 1])
+    for (ctrl, qarg), ctrl_pauli, qarg_pauli in zip(pairs, ctrl_paulis, qarg_paulis):
+        if ctrl_pauli and ctrl not in lost:
+            getattr(sim_reg, PAULIS[ctrl_pauli])(ctrl)
+        if qarg_pauli and qarg not in lost:
+            getattr(sim_reg, PAULIS[qarg_pauli])(qarg)
+
+
+def _apply_events(sim_reg, lost: set[int], op: Op, events: list[tuple[int, int]]):
+    for pos, pauli in events:
+        if type(op) is AtomLoss:
+            addr = op.addrs[pos]
+            if addr not in lost:
+                sim_reg.force_m(addr, 0)
+                lost.add(addr)
+            continue
+        elif type(op) is CZPauliError:
+            ctrl, qarg = op.ctrls[pos // 2], op.qargs[pos // 2]
+            ctrl_active = ctrl not in lost
+            qarg_active = qarg not in lost
+            if not (
+                ctrl_active and qarg_active if op.paired else ctrl_active ^ qarg_active
+            ):
+                continue
+            addr = qarg if pos % 2 else ctrl
+        else:
+            addr = op.addrs[pos]
+
+        if addr not in lost:
+            getattr(sim_reg, PAULIS[pauli])(addr)
+
+
+def _has_qubits(value) -> bool:
+    if isinstance(value, (_QRegSlot, _QubitSlot)):
+        return True
+    elif isinstance(value, ilist.IList):
+        return any(map(_has_qubits, value.data))
+    elif isinstance(value, (tuple, list)) and not isinstance(value, CRegister):
+        return any(map(_has_qubits, value))
+    return False
+
+
+def _fill(value, qregs: list[PyQrackReg], cregs: list[CRegister]):
+    if isinstance(value, _QRegSlot):
+        return qregs[value.index]
+    elif isinstance(value, _QubitSlot):
+        return qregs[value.reg][value.pos]
+    elif isinstance(value, _CRegSlot):
+        return cregs[value.index]
+    elif isinstance(value, _CBitSlot):
+        return CBitRef(cregs[value.creg], value.pos)
+    elif isinstance(value, ilist.IList):
+        return ilist.IList([_fill(v, qregs, cregs) for v in value.data])
+    elif isinstance(value, (tuple, list)) and not isinstance(value, CRegister):
+        return type(value)(_fill(v, qregs, cregs) for v in value)
+    return value
@@ -1,21 +1,79 @@
-from typing import List, TypeVar, ParamSpec
-from dataclasses import field, dataclass
+import copy
+import typing
+from typing import Any, List, TypeVar, Callable, Iterator, Sequence, ParamSpec
+from functools import partial
+from collections import Counter, OrderedDict, deque
+from dataclasses import field, astuple, replace, dataclass
+from concurrent.futures import Future, Executor, ProcessPoolExecutor
 
+import numpy as np
 from kirin import ir
+from pyqrack import QrackSimulator
 from kirin.passes import Fold
+from bloqade.pyqrack.reg import PyQrackReg, Measurement
 from bloqade.pyqrack.base import (
+    MemoryABC,
     StackMemory,
     DynamicMemory,
+    SimulatorPool,
     PyQrackOptions,
     PyQrackInterpreter,
     _default_pyqrack_args,
 )
+from bloqade.pyqrack.tape import Tape, TraceError, TapeRecorder
+from bloqade.pyqrack.state import out_ket, prob_all
+from bloqade.pyqrack.sweep import SlotRecorder, bind, slots
+from bloqade.pyqrack.frames import FrameSampler
+from bloqade.pyqrack.fusion import fuse
+from bloqade.pyqrack.layers import (
+    LAYER_OPTIONS,
+    LayerChoice,
+    CircuitProfile,
+    choose_layers,
+)
+from bloqade.pyqrack.codegen import generate
+from bloqade.pyqrack.results import MeasurementArray, count_outcomes
 from bloqade.analysis.address import AnyAddress, AddressAnalysis
+from bloqade.pyqrack.branches import BranchSampler
+from bloqade.pyqrack.clusters import pack
+from bloqade.pyqrack.gradient import parameter_shifts
+from bloqade.pyqrack.observables import expectations
 
 Params = ParamSpec("Params")
 RetType = TypeVar("RetType")
 
 
+@dataclass(frozen=True)
+class PreparedTape:
+    """A kernel method recorded by `PyQrack` for some arguments, ready to replay."""
+
+    tape: Tape | None
+    """The lowered tape with its generated code, None if the kernel cannot be
+    recorded."""
+    profile: CircuitProfile | None
+    """Profile the simulator layers are chosen from, see `auto_layers`."""
+    clusters: tuple[tuple[int, ...], ...] | None
+    """Clusters the memory is split into, see `split_clusters`."""
+    fused_gates: int
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Compiled state of a kernel method kept by `PyQrack` between calls."""
+
+    method: ir.Method
+    """The folded method, kept alive so its id is not reused."""
+    code: ir.Statement
+    """The body of the method when it was compiled."""
+    num_qubits: int
+    """Number of qubits found by address analysis, -1 for dynamic allocation."""
+    interpreter: PyQrackInterpreter
+    """Interpreter with memory sized for the method."""
+    tapes: OrderedDict[tuple, PreparedTape] = field(default_factory=OrderedDict)
+    """The method recorded for each set of arguments and replay options it was
+    called with, so later calls skip recording and code generation."""
+
+
 @dataclass
 class PyQrack:
     """PyQrack target runtime for Bloqade."""
@@ -27,20 +85,168 @@ class PyQrack:
     dynamic_qubits: bool = False
     """Whether to use dynamic qubit allocation. Cannot use with tensor network simulations."""
 
-    pyqrack_options: PyQrackOptions = field(default_factory=_default_pyqrack_args)
-    """Options to pass to the QrackSimulator object, node `qubitCount` will be overwritten."""
+    pyqrack_options: PyQrackOptions = field(default_factory=PyQrackOptions)
+    """Options to pass to the QrackSimulator object, node `qubitCount` will be overwritten.
+    Layer options given here take precedence over the ones chosen by `auto_layers`."""
+    auto_layers: bool = True
+    """Whether to choose the simulator layers of each kernel from its recorded gates,
+    see `layers.choose_layers`, e.g. the stabilizer layer alone for Clifford circuits.
+    The choice for the last kernel run is kept in `layers`."""
+    use_tape: bool = True
+    """Whether `run` and `multi_run` record the kernel once and replay the recorded
+    simulator calls for every shot. Noise-free kernels that only measure at the end are
+    simulated once and all shots are sampled from the final state. Kernels whose
+    control flow depends on measurement results are always interpreted shot by shot.
+    """
+    native_circuits: bool = True
+    """Whether recorded kernels apply runs of gates between measurements, resets
+    and noise as a single `QrackCircuit` call, see `Tape.segments`, instead of
+    calling the simulator from Python for every gate."""
+    fuse_gates: bool = False
+    """Whether recorded kernels merge runs of single-qubit gates on the same qubit
+    into one `U` gate, or drop them if they cancel out, see `fusion.fuse`. The
+    number of gates eliminated from the last kernel is kept in `fused_gates`."""
+    batch_measurements: bool = True
+    """Whether recorded kernels simulated by a plain state vector, without any of
+    the `layers.LAYER_OPTIONS`, perform runs of consecutive measurements with a
+    single simulator call, see `Tape.measure_runs`, instead of one call per
+    measurement. With the stabilizer or Schmidt decomposition layers, measuring
+    many qubits at once is slower than measuring them one by one."""
+    generate_code: bool = True
+    """Whether recorded kernels are replayed by a generated Python function making
+    one direct simulator call per operation, see `codegen.generate`, instead of
+    dispatching on every operation of the tape. Used by `run` and `multi_run`."""
+    rng_state: np.random.Generator = field(default_factory=np.random.default_rng)
+    """Random number generator used to sample noise."""
+    skip_ahead_noise: bool = False
+    """Whether replayed shots draw only the noise sites where an error happens,
+    by skipping ahead with geometrically distributed gaps, instead of drawing every
+    site. Errors have the same distribution, but the random draws differ from the
+    per-site sampler, which stays faster when error rates are high. Only applies to
+    kernels recorded as a tape."""
+    group_noise_patterns: bool = False
+    """Whether noisy kernels that only measure at the end draw the errors of all
+    shots up front, see `skip_ahead_noise`, simulate each distinct error pattern
+    once and sample the measurements of its shots from the resulting state. This
+    is much faster when most shots share a few patterns, e.g. no error at all.
+    Grouped shots run in the calling process, even when `workers` is set."""
+    pauli_frames: bool = False
+    """Whether noisy kernels that only measure at the end, and apply only Clifford
+    gates after their first Pauli error, are sampled by propagating the Pauli errors
+    of all shots as bit arrays, see `frames.FrameSampler`. Qrack simulates each
+    distinct atom loss pattern once, without Pauli errors. Takes precedence over
+    `group_noise_patterns` and runs in the calling process."""
+    branch_sampling: bool = False
+    """Whether noise-free kernels whose control flow depends on measurement results
+    are sampled as a tree of branches, see `branches.BranchSampler`, instead of
+    interpreting every shot. Each mid-circuit measurement is simulated once per
+    branch reaching it and its shots are split between its outcomes, so the cost
+    grows with the number of branches reached rather than the number of shots.
+    Kernels that apply noise or return quantum registers are still interpreted."""
+    split_clusters: bool = False
+    """Whether recorded kernels whose qubits fall into groups that never interact
+    simulate each group with its own simulator, see `clusters.ClusterSimulator`,
+    so two independent blocks of n qubits cost two states of 2^n amplitudes
+    instead of one of 4^n. Qrack's Schmidt decomposition layer already factors
+    out separable qubits, so this matters most on a plain state vector. Disables
+    `native_circuits` for the kernels it splits. Used by `run` and `multi_run`,
+    including in workers, where each batch of shots pairs the measurements of
+    different groups with its own random stream, see `shots_per_task`."""
+    workers: int = 1
+    """Number of worker processes `multi_run` splits shots across. Only kernels that
+    can be recorded as a tape and do not return quantum registers run in workers,
+    other kernels run in the calling process."""
+    executor: Executor | None = None
+    """Executor to submit batches of shots to, instead of starting a process pool
+    with `workers` processes on every call."""
+    shots_per_task: int = 1000
+    """Number of shots in each batch of replayed shots, submitted to a worker when
+    workers are used. Each batch samples noise from its own random stream spawned
+    from `rng_state`, so results depend on this value but not on the number of
+    workers, including none."""
+    simulator_pool: SimulatorPool | None = field(default_factory=SimulatorPool)
+    """Pool of simulators that are reset in place and reused between shots instead
+    of constructing a new simulator per shot. Simulators still referred to by a
+    returned register are never reused. Set to None to always construct a new one.
+    """
+    cache_size: int = 128
+    """Maximum number of compiled methods kept by `run` and `multi_run`, and of
+    recordings kept for each method, one per set of arguments, with their
+    generated code. The least recently used is evicted first. Set to 0 to
+    disable caching."""
+    layers: LayerChoice | None = field(default=None, init=False)
+    """The simulator layers chosen for the last kernel run, see `auto_layers`."""
+    fused_gates: int = field(default=0, init=False)
+    """Number of gates eliminated from the last kernel run, see `fuse_gates`."""
+    late_bound: bool = field(default=False, init=False)
+    """Whether the last `sweep` recorded its kernel once and bound the angles of
+    every point into that recording, instead of recording every point."""
+    cache_hits: int = field(default=0, init=False)
+    """Number of calls that reused a compiled method."""
+    cache_misses: int = field(default=0, init=False)
+    """Number of calls that had to fold and analyze a method."""
+    _cache: OrderedDict[tuple, CacheEntry] = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _explicit_options: frozenset[str] = field(init=False, repr=False)
 
     def __post_init__(self):
+        self._explicit_options = frozenset(self.pyqrack_options)
         self.pyqrack_options = PyQrackOptions(
             {**_default_pyqrack_args(), **self.pyqrack_options}
         )
 
+    def clear_cache(self):
+        """Remove all compiled methods and reset the cache counters."""
+        self._cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _compile(self, mt: ir.Method[Params, RetType]) -> PyQrackInterpreter:
+        return self._compile_entry(mt).interpreter
+
+    def _compile_entry(self, mt: ir.Method) -> CacheEntry:
+        key = (
+            id(mt),
+            self.min_qubits,
+            self.dynamic_qubits,
+            tuple(sorted(self.pyqrack_options.items())),
+        )
+        entry = self._cache.get(key)
+        if entry is not None and entry.code is mt.code:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            entry.interpreter.rng_state = self.rng_state
+            if isinstance(entry.interpreter.memory, StackMemory):
+                entry.interpreter.memory.split(None)
+            return entry
+
+        self.cache_misses += 1
+        fold = Fold(mt.dialects)
+        fold(mt)
+        interpreter = self._get_interp(mt)
+        entry = CacheEntry(
+            mt,
+            mt.code,
+            interpreter.memory.pyqrack_options["qubitCount"],
+            interpreter,
+        )
+        if self.cache_size > 0:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return entry
+
     def _get_interp(self, mt: ir.Method[Params, RetType]):
         if self.dynamic_qubits:
 
             options = self.pyqrack_options.copy()
             options["qubitCount"] = -1
-            return PyQrackInterpreter(mt.dialects, memory=DynamicMemory(options))
+            return PyQrackInterpreter(
+                mt.dialects, memory=DynamicMemory(options), rng_state=self.rng_state
+            )
         else:
             address_analysis = AddressAnalysis(mt.dialects)
             frame, _ = address_analysis.run_analysis(mt)
@@ -57,9 +263,240 @@ class PyQrack:
             memory = StackMemory(
                 options,
                 total=num_qubits,
+                pool=self.simulator_pool,
+            )
+
+            return PyQrackInterpreter(
+                mt.dialects, memory=memory, rng_state=self.rng_state
             )
 
-            return PyQrackInterpreter(mt.dialects, memory=memory)
+    def _trace(self, mt: ir.Method, args: tuple, kwargs: dict) -> Tape | None:
+        try:
+            return TapeRecorder(mt.dialects).record(mt, args, kwargs)
+        except TraceError:
+            return None
+
+    def _record(self, mt: ir.Method, args: tuple, kwargs: dict) -> Tape | None:
+        self.fused_gates = 0
+        if not self.use_tape or (tape := self._trace(mt, args, kwargs)) is None:
+            return None
+
+        return self._lower(tape)
+
+    def _lower(self, tape: Tape) -> Tape:
+        # applies the replay options to a recorded tape
+        if self.fuse_gates:
+            tape, fused = fuse(tape)
+            self.fused_gates += fused
+        return replace(
+            tape,
+            skip_ahead=self.skip_ahead_noise,
+            native=self.native_circuits,
+        )
+
+    def _prepare(
+        self, mt: ir.Method, args: tuple, kwargs: dict, keep_state: bool = False
+    ) -> tuple[PyQrackInterpreter, Tape | None]:
+        # compiles and records `mt`, and configures the simulator layers for it;
+        # `keep_state` is set where the caller reads the simulator afterwards, so
+        # it is a single simulator and final measurements collapse it
+        entry = self._compile_entry(mt)
+        interpreter = entry.interpreter
+        key = self._tape_key(args, kwargs, keep_state)
+        prepared = None if key is None else entry.tapes.get(key)
+        if prepared is not None:
+            entry.tapes.move_to_end(key)
+            self.fused_gates = prepared.fused_gates
+            if self.auto_layers:
+                self._configure_layers(interpreter, prepared.profile)
+            if prepared.clusters is not None:
+                interpreter.memory.split(prepared.clusters, interpreter.rng_state)
+            return interpreter, prepared.tape
+
+        prepared = self._prepare_tape(mt, args, kwargs, interpreter, keep_state)
+        if key is not None and self.cache_size > 0:
+            entry.tapes[key] = prepared
+            while len(entry.tapes) > self.cache_size:
+                entry.tapes.popitem(last=False)
+        return interpreter, prepared.tape
+
+    def _prepare_tape(
+        self,
+        mt: ir.Method,
+        args: tuple,
+        kwargs: dict,
+        interpreter: PyQrackInterpreter,
+        keep_state: bool,
+    ) -> PreparedTape:
+        tape = self._record(mt, args, kwargs)
+        profile = None
+        if self.auto_layers:
+            traced = tape if self.use_tape else self._trace(mt, args, kwargs)
+            profile = None if traced is None else CircuitProfile.from_tape(traced)
+            self._configure_layers(interpreter, profile)
+
+        if tape is None:
+            return PreparedTape(None, profile, None, self.fused_gates)
+
+        clusters = None
+        if (
+            not keep_state
+            and self.split_clusters
+            and isinstance(interpreter.memory, StackMemory)
+            and len(packed := pack(tape.components())) > 1
+        ):
+            clusters = packed
+            interpreter.memory.split(clusters, interpreter.rng_state)
+            tape = replace(tape, native=False)
+
+        if not keep_state:
+            tape = self._batch(interpreter, tape)
+        if self.generate_code:
+            tape = replace(tape, source=generate(tape))
+        return PreparedTape(tape, profile, clusters, self.fused_gates)
+
+    def _tape_key(self, args: tuple, kwargs: dict, keep_state: bool) -> tuple | None:
+        # identifies a recording of a method, None if its arguments could be
+        # mutated or compare equal while recording differently
+        values = (*args, *kwargs.values())
+        if not all(_is_constant(value) for value in values):
+            return None
+
+        return (
+            tuple(_typed(value) for value in args),
+            tuple((name, _typed(value)) for name, value in sorted(kwargs.items())),
+            keep_state,
+            self.use_tape,
+            self.fuse_gates,
+            self.skip_ahead_noise,
+            self.native_circuits,
+            self.generate_code,
+            self.batch_measurements,
+            self.auto_layers,
+            self.split_clusters,
+        )
+
+    def _configure_layers(
+        self, interpreter: PyQrackInterpreter, profile: CircuitProfile | None
+    ):
+        self.layers = choose_layers(profile)
+        options = interpreter.memory.pyqrack_options.copy()
+        for key, value in self.layers.options.items():
+            if key not in self._explicit_options:
+                options[key] = value
+        interpreter.memory.configure(options)
+
+    def _batch(self, interpreter: PyQrackInterpreter, tape: Tape) -> Tape:
+        # measurement runs are only batched on a plain state vector
+        options = interpreter.memory.pyqrack_options
+        if self.batch_measurements and not any(options[key] for key in LAYER_OPTIONS):
+            return replace(tape, batch_measure=True)
+        return tape
+
+    def _sampler(
+        self, tape: Tape, interpreter: PyQrackInterpreter, codes: bool = False
+    ) -> Callable[[int], Any] | None:
+        # a function drawing many shots at once, if the tape allows it
+        if tape.can_sample():
+            return tape.sampler(interpreter, codes)
+        elif self.pauli_frames and (frames := FrameSampler.from_tape(tape)):
+            return frames.sampler(interpreter, codes)
+        elif self.group_noise_patterns and tape.can_group():
+            return tape.pattern_sampler(interpreter, codes)
+        return None
+
+    def _branch_sampler(
+        self,
+        mt: ir.Method,
+        args: tuple,
+        kwargs: dict,
+        interpreter: PyQrackInterpreter,
+    ) -> Callable[[int], list] | None:
+        # a function drawing many shots of a kernel that could not be recorded,
+        # interpreting them if it turns out not to be sampled as a branch tree
+        if not (
+            self.branch_sampling
+            and self.use_tape
+            and isinstance(interpreter.memory, StackMemory)
+        ):
+            return None
+
+        sampler: BranchSampler | None = BranchSampler(mt, args, kwargs)
+
+        def draw(shots: int) -> list:
+            nonlocal sampler
+            if sampler is not None:
+                try:
+                    return sampler.sample(interpreter, shots)
+                except TraceError:
+                    sampler = None
+            return [interpreter.run(mt, args, kwargs).expect() for _ in range(shots)]
+
+        return draw
+
+    def _use_workers(self, tape: Tape) -> bool:
+        return (
+            self.workers > 1 or self.executor is not None
+        ) and not tape.returns_qubits()
+
+    def _shot_batches(
+        self,
+        mt: ir.Method,
+        args: tuple,
+        kwargs: dict,
+        interpreter: PyQrackInterpreter,
+        tape: Tape | None,
+        shots: int,
+        codes: bool,
+        in_flight: int | None = None,
+    ) -> Iterator[list | np.ndarray]:
+        # yields the results of each batch in order, replaying `tape` in workers
+        # if they are used, submitting at most `in_flight` batches ahead of the
+        # consumer; every batch draws noise from its own spawned stream, wherever
+        # and however it runs
+        sizes = list(_chunk_sizes(shots, self.shots_per_task))
+        rngs = interpreter.rng_state.spawn(len(sizes))
+        if tape is None or not self._use_workers(tape):
+            rng_state = interpreter.rng_state
+            try:
+                for rng, size in zip(rngs, sizes):
+                    _seed(interpreter, rng)
+                    if tape is not None:
+                        shot = tape.replayer(interpreter)
+                    else:
+                        shot = partial(_interpret, interpreter, mt, args, kwargs)
+                    yield _batch_results(shot, size, codes)
+            finally:
+                _seed(interpreter, rng_state)
+            return
+
+        dialects = tuple(interpreter.dialects.data)
+        executor = self.executor or ProcessPoolExecutor(self.workers)
+        pending: deque[Future] = deque()
+        try:
+            for rng, size in zip(rngs, sizes):
+                pending.append(
+                    executor.submit(
+                        _replay_shots,
+                        tape,
+                        dialects,
+                        interpreter.memory,
+                        interpreter.loss_m_result,
+                        rng,
+                        size,
+                        codes,
+                    )
+                )
+                if in_flight is not None and len(pending) >= in_flight:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not self.executor:
+                executor.shutdown()
 
     def run(
         self,
@@ -77,9 +514,10 @@ class PyQrack:
             The result of the kernel method, if any.
 
         """
-        fold = Fold(mt.dialects)
-        fold(mt)
-        return self._get_interp(mt).run(mt, args, kwargs).expect()
+        interpreter, tape = self._prepare(mt, args, kwargs)
+        if tape is not None:
+            return tape.replay(interpreter)
+        return interpreter.run(mt, args, kwargs).expect()
 
     def multi_run(
         self,
@@ -100,12 +538,615 @@ class PyQrack:
             List of results of the kernel method, one for each shot.
 
         """
-        fold = Fold(mt.dialects)
-        fold(mt)
+        interpreter, tape = self._prepare(mt, args, kwargs)
+        if tape is not None:
+            draw = self._sampler(tape, interpreter)
+        else:
+            draw = self._branch_sampler(mt, args, kwargs, interpreter)
+        if draw is not None:
+            return draw(_shots)
+
+        tasks = self._shot_batches(mt, args, kwargs, interpreter, tape, _shots, False)
+        return [result for task in tasks for result in task]
+
+    def multi_run_array(
+        self,
+        mt: ir.Method[Params, RetType],
+        _shots: int,
+        *args: Params.args,
+        _bitpack: bool = False,
+        **kwargs: Params.kwargs,
+    ) -> MeasurementArray:
+        """Run the given kernel method on the PyQrack `_shots` times, storing the
+        classical bits it returns in a NumPy array instead of Python objects.
+
+        Args
+            mt (Method):
+                The kernel method to run, it must return classical registers
+                or bits, see `results.measurement_codes`.
+            _shots (int):
+                The number of times to run the kernel method.
+            _bitpack (bool):
+                Whether to pack the bits of each shot, eight per byte.
+
+        Returns
+            The measurement results of all shots.
+
+        """
+        interpreter, tape = self._prepare(mt, args, kwargs)
+        if (
+            tape is not None
+            and (draw := self._sampler(tape, interpreter, codes=True)) is not None
+        ):
+            result = MeasurementArray.from_codes(draw(_shots))
+        elif (
+            tape is None
+            and (draw := self._branch_sampler(mt, args, kwargs, interpreter))
+            is not None
+        ):
+            result = MeasurementArray.from_results(draw(_shots), _shots)
+        elif _shots > 0:
+            tasks = self._shot_batches(
+                mt, args, kwargs, interpreter, tape, _shots, True
+            )
+            result = MeasurementArray.from_codes(np.concatenate(list(tasks)))
+        else:
+            result = MeasurementArray.from_results((), 0)
+
+        return result.pack() if _bitpack else result
+
+    def iter_runs(
+        self,
+        mt: ir.Method[Params, RetType],
+        _shots: int,
+        *args: Params.args,
+        _chunk_size: int = 1000,
+        **kwargs: Params.kwargs,
+    ) -> Iterator[List[RetType]]:
+        """Run the given kernel method on the PyQrack `_shots` times, yielding the
+        results in chunks as they are produced, see `multi_run`.
+
+        Args
+            mt (Method):
+                The kernel method to run.
+            _shots (int):
+                The number of times to run the kernel method.
+            _chunk_size (int):
+                The number of shots in each chunk, the last chunk may be smaller.
+
+        Yields
+            Lists of results of the kernel method, one for each shot.
+
+        """
+        interpreter, tape = self._prepare(mt, args, kwargs)
+        if tape is not None:
+            draw = self._sampler(tape, interpreter)
+        else:
+            draw = self._branch_sampler(mt, args, kwargs, interpreter)
+        if draw is not None:
+            for size in _chunk_sizes(_shots, _chunk_size):
+                yield draw(size)
+            return
+
+        tasks = self._shot_batches(
+            mt,
+            args,
+            kwargs,
+            interpreter,
+            tape,
+            _shots,
+            False,
+            in_flight=2 * max(self.workers, 1),
+        )
+        chunk = []
+        for task in tasks:
+            for result in task:
+                chunk.append(result)
+                if len(chunk) == _chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def expectation(
+        self,
+        mt: ir.Method[Params, RetType],
+        observables: Sequence[str],
+        *args: Params.args,
+        **kwargs: Params.kwargs,
+    ) -> np.ndarray:
+        """Evaluate Pauli observables in the state prepared by the given kernel
+        method, without sampling. The gates are simulated once and measurements at
+        the end of the kernel are ignored, see `observables.expectations`.
+
+        Args
+            mt (Method):
+                The kernel method to run. It must not apply noise, resets or
+                mid-circuit measurements, nor depend on measurement results.
+            observables (Sequence[str]):
+                Pauli strings, character `i` acting on the qubit at address `i`,
+                e.g. `"ZZI"` for the first two qubits of a three qubit kernel.
+
+        Returns
+            A float array with the expectation value of each observable.
+
+        Raises
+            ValueError: if the kernel is not unitary or an observable acts on
+                more qubits than the kernel allocates.
+
+        """
+        interpreter, tape = self._prepare(mt, args, kwargs, keep_state=True)
+        if tape is None:
+            tape = self._trace(mt, args, kwargs)
+        if tape is None or not tape.is_unitary():
+            raise ValueError(
+                "expectation values need a kernel without noise, resets, "
+                "mid-circuit measurements or measurement-dependent control flow"
+            )
+
+        _check_observables(tape, observables)
+        return expectations(tape.simulate(interpreter), list(observables))
+
+    def _run_once(
+        self, mt: ir.Method, args: tuple, kwargs: dict
+    ) -> tuple[QrackSimulator, Any]:
+        # runs `mt` like `run` and keeps the simulator holding the final state
+        interpreter, tape = self._prepare(mt, args, kwargs, keep_state=True)
+        if tape is not None:
+            result = tape.replay(interpreter)
+        else:
+            result = interpreter.run(mt, args, kwargs).expect()
+        return interpreter.memory.sim_reg, result
+
+    def state(
+        self,
+        mt: ir.Method[Params, RetType],
+        *args: Params.args,
+        **kwargs: Params.kwargs,
+    ) -> np.ndarray:
+        """Run the given kernel method once and return the final state vector,
+        see `state.out_ket`. Measurements in the kernel collapse the state.
+
+        Args
+            mt (Method):
+                The kernel method to run.
+
+        Returns
+            A complex128 array of the amplitudes of every qubit the kernel
+            allocates, qubit 0 being the least significant bit of the index.
+
+        """
+        sim_reg, _ = self._run_once(mt, args, kwargs)
+        return out_ket(sim_reg)
+
+    def probabilities(
+        self,
+        mt: ir.Method[Params, RetType],
+        *args: Params.args,
+        _qubits: PyQrackReg | Sequence[int] | None = None,
+        **kwargs: Params.kwargs,
+    ) -> np.ndarray:
+        """Run the given kernel method once and return the probabilities of the
+        outcomes of measuring some of its qubits, see `state.prob_all`.
+
+        Args
+            mt (Method):
+                The kernel method to run.
+            _qubits (PyQrackReg | Sequence[int] | None):
+                A register or the addresses of the qubits to marginalise onto.
+                If None, the register returned by the kernel, or all qubits if it
+                does not return one.
+
+        Returns
+            A float64 array of `2 ** len(qubits)` probabilities, the i-th qubit
+            being bit `i` of the index.
+
+        """
+        sim_reg, result = self._run_once(mt, args, kwargs)
+        if _qubits is None and isinstance(result, PyQrackReg):
+            _qubits = result
+        if isinstance(_qubits, PyQrackReg):
+            _qubits = _qubits.addrs
+        return prob_all(sim_reg, _qubits)
+
+    def _template(
+        self, mt: ir.Method, point: Sequence[float], kwargs: dict
+    ) -> Tape | None:
+        # `mt` recorded with late-bound angles, see `sweep.SlotRecorder`
+        try:
+            return SlotRecorder(mt.dialects).record(mt, slots(point), kwargs)
+        except TraceError:
+            return None
+
+    def _sweep_tapes(
+        self, mt: ir.Method, points: list[list[float]], kwargs: dict
+    ) -> list[Tape] | None:
+        # one tape per point, bound from a single recording when the parameters
+        # are only used, directly or through arithmetic, as gate angles
+        self.late_bound = False
+        if not self.use_tape or not points:
+            return None
+
+        template = self._template(mt, points[0], kwargs)
+        if template is not None:
+            self.late_bound = True
+            return [bind(template, point) for point in points]
+
+        tapes = [self._trace(mt, tuple(point), kwargs) for point in points]
+        if any(tape is None for tape in tapes):
+            return None
+        return typing.cast(list[Tape], tapes)
+
+    def sweep(
+        self,
+        mt: ir.Method[Params, RetType],
+        params: np.ndarray,
+        _shots: int = 1,
+        **kwargs: Params.kwargs,
+    ) -> np.ndarray:
+        """Run the given kernel method at every point of a parameter grid.
+
+        The kernel is compiled and its simulator layers are chosen once for the
+        whole grid. When its parameters are only used as gate angles, possibly
+        through arithmetic and `sweep.FUNCTIONS`, it is also recorded once with
+        late-bound angles, see `sweep.Slot`, and each point only substitutes its
+        own angles into the recording. Other kernels are recorded, or interpreted, point by point.
+        Points are split across `workers` or `executor` like the shots of
+        `multi_run`, `shots_per_task` shots per task.
+
+        Args
+            mt (Method):
+                The kernel method to run, it must return classical registers
+                or bits, see `results.measurement_codes`.
+            params (np.ndarray):
+                A `(points, n)` array, row `i` holding the `n` positional
+                arguments of point `i`, or a `(points,)` array for kernels taking
+                a single argument.
+            _shots (int):
+                The number of times to run the kernel method at each point.
+
+        Returns
+            A `(points, _shots, nbits)` uint8 array of measurement codes, see
+            `MeasurementArray.bits`.
+
+        """
+        grid = np.asarray(params, dtype=np.float64)
+        points = (grid[:, None] if grid.ndim == 1 else grid).tolist()
+        interpreter = self._compile(mt)
+        self.fused_gates = 0
+        tapes = self._sweep_tapes(mt, points, kwargs)
+        if self.auto_layers:
+            self._configure_layers(interpreter, _merged_profile(tapes))
+
+        if tapes is None:
+            codes = [
+                MeasurementArray.from_results(
+                    (
+                        interpreter.run(mt, tuple(point), kwargs).expect()
+                        for _ in range(_shots)
+                    ),
+                    _shots,
+                ).bits
+                for point in points
+            ]
+        else:
+            tapes = [self._batch(interpreter, self._lower(tape)) for tape in tapes]
+            if self.workers > 1 or self.executor:
+                size = max(1, self.shots_per_task // max(_shots, 1))
+                codes = self._tapes_in_workers(
+                    _sweep_task, tapes, interpreter, size, _shots
+                )
+            else:
+                codes = _sweep_codes(tapes, interpreter, _shots)
+
+        if not codes:
+            return np.empty((0, _shots, 0), dtype=np.uint8)
+        return np.stack(codes)
+
+    def _worker_count(self) -> int:
+        # number of tasks running at once, both standard executors expose it
+        if self.executor is None:
+            return max(self.workers, 1)
+        return getattr(self.executor, "_max_workers", max(self.workers, 1))
+
+    def _tapes_in_workers(
+        self,
+        task: Callable[..., list],
+        tapes: list[Tape],
+        interpreter: PyQrackInterpreter,
+        size: int,
+        *args,
+    ) -> list:
+        # calls `task` on chunks of `size` tapes and concatenates the results
+        chunks = [tapes[start : start + size] for start in range(0, len(tapes), size)]
+        rngs = interpreter.rng_state.spawn(len(chunks))
+        dialects = tuple(interpreter.dialects.data)
+        executor = self.executor or ProcessPoolExecutor(self.workers)
+        try:
+            futures = [
+                executor.submit(
+                    task,
+                    chunk,
+                    dialects,
+                    interpreter.memory,
+                    interpreter.loss_m_result,
+                    rng,
+                    *args,
+                )
+                for rng, chunk in zip(rngs, chunks)
+            ]
+            return [value for future in futures for value in future.result()]
+        finally:
+            if executor is not self.executor:
+                executor.shutdown()
+
+    def gradient(
+        self,
+        mt: ir.Method[Params, RetType],
+        observable: str | Sequence[str],
+        params: Sequence[float],
+        **kwargs: Params.kwargs,
+    ) -> np.ndarray:
+        """The gradient of Pauli expectation values, see `expectation`, with
+        respect to the positional arguments of the given kernel method.
+
+        The kernel is recorded once with late-bound angles, see `sweep.Slot`, and
+        every gate angle depending on the arguments is shifted by the
+        parameter-shift rule of its gate, see `gradient.parameter_shifts`. All
+        shifted evaluations are simulated as one batch on the simulators of the
+        compiled kernel, split across `workers` or `executor` if set.
+
+        Args
+            mt (Method):
+                The kernel method, it must be unitary like for `expectation` and
+                only use its arguments as gate angles, possibly through
+                arithmetic and `sweep.FUNCTIONS`.
+            observable (str | Sequence[str]):
+                A Pauli string, or several of them.
+            params (Sequence[float]):
+                The positional arguments to differentiate at.
+
+        Returns
+            A float array with the derivative with respect to each argument, of
+            shape `(len(observable), len(params))` for several observables.
+
+        Raises
+            ValueError: if the kernel is not unitary, its arguments are used
+                other than as gate angles, or an observable acts on more qubits
+                than the kernel allocates.
+
+        """
+        point = np.asarray(params, dtype=np.float64).ravel().tolist()
+        observables = [observable] if isinstance(observable, str) else list(observable)
+        interpreter = self._compile(mt)
+        self.fused_gates = 0
+        template = self._template(mt, point, kwargs)
+        if template is None or not template.is_unitary():
+            raise ValueError(
+                "gradients need a unitary kernel that only uses its arguments "
+                "as gate angles"
+            )
+        _check_observables(template, observables)
+
+        tapes, coefficients = parameter_shifts(template, point)
+        tapes = [self._lower(tape) for tape in tapes]
+        if self.auto_layers:
+            self._configure_layers(interpreter, _merged_profile(tapes))
+
+        if tapes and (self.workers > 1 or self.executor is not None):
+            size = -(-len(tapes) // self._worker_count())
+            values = self._tapes_in_workers(
+                _expectation_task, tapes, interpreter, size, observables
+            )
+        else:
+            values = _shifted_expectations(tapes, interpreter, observables)
+
+        values = np.reshape(values, (len(tapes), len(observables)))
+        gradient = values.T @ coefficients.T
+        return gradient[0] if isinstance(observable, str) else gradient
+
+    def sample_counts(
+        self,
+        mt: ir.Method[Params, RetType],
+        _shots: int,
+        *args: Params.args,
+        _bits: Sequence[int] | None = None,
+        _top: int | None = None,
+        **kwargs: Params.kwargs,
+    ) -> dict[int, int]:
+        """Run the given kernel method on the PyQrack `_shots` times and count the
+        outcomes, without keeping the results of individual shots.
+
+        Shots are encoded `shots_per_task` at a time, so memory grows with the
+        number of distinct outcomes rather than the number of shots.
+
+        Args
+            mt (Method):
+                The kernel method to run, it must return classical registers
+                or bits, see `results.measurement_codes`.
+            _shots (int):
+                The number of times to run the kernel method.
+            _bits (Sequence[int] | None):
+                Positions of the returned bits to keep, counting the marginal
+                distribution over them. Defaults to all bits.
+            _top (int | None):
+                Only return this many of the most frequent outcomes.
+
+        Returns
+            A dictionary from outcome to number of shots, bit `i` of an outcome
+            being the `i`-th returned bit, or the `i`-th bit in `_bits`. Ordered by
+            decreasing count when `_top` is given.
+
+        """
+        counts: dict[int, int] = {}
+        for codes in self._iter_codes(mt, _shots, args, kwargs):
+            if _bits is not None:
+                codes = codes[:, _bits]
+            count_outcomes(codes, counts)
+
+        if _top is not None:
+            return dict(Counter(counts).most_common(_top))
+        return counts
+
+    def _iter_codes(
+        self, mt: ir.Method, shots: int, args: tuple, kwargs: dict
+    ) -> Iterator[np.ndarray]:
+        interpreter, tape = self._prepare(mt, args, kwargs)
+        if (
+            tape is not None
+            and (draw := self._sampler(tape, interpreter, codes=True)) is not None
+        ):
+            for size in _chunk_sizes(shots, self.shots_per_task):
+                yield draw(size)
+        elif (
+            tape is None
+            and (draw := self._branch_sampler(mt, args, kwargs, interpreter))
+            is not None
+        ):
+            for size in _chunk_sizes(shots, self.shots_per_task):
+                yield MeasurementArray.from_results(draw(size), size).bits
+        else:
+            yield from self._shot_batches(
+                mt,
+                args,
+                kwargs,
+                interpreter,
+                tape,
+                shots,
+                True,
+                in_flight=2 * max(self.workers, 1),
+            )
+
+
+def _is_constant(value) -> bool:
+    if isinstance(value, tuple):
+        return all(_is_constant(item) for item in value)
+    return value is None or type(value) in (bool, int, float, complex, str)
+
+
+def _typed(value) -> tuple:
+    # 1, 1.0 and True are equal but may record differently
+    if isinstance(value, tuple):
+        return tuple, tuple(_typed(item) for item in value)
+    return type(value), value
+
+
+def _chunk_sizes(total: int, size: int) -> Iterator[int]:
+    for start in range(0, total, size):
+        yield min(size, total - start)
+
+
+def _sweep_codes(
+    tapes: list[Tape], interpreter: PyQrackInterpreter, shots: int
+) -> list[np.ndarray]:
+    # the measurement codes of `shots` shots of each tape
+    codes = []
+    for tape in tapes:
+        if tape.can_sample():
+            codes.append(tape.sampler(interpreter, codes=True)(shots))
+            continue
+
+        replay = tape.replayer(interpreter)
+        results = (replay() for _ in range(shots))
+        codes.append(MeasurementArray.from_results(results, shots).bits)
+    return codes
+
+
+def _sweep_task(
+    tapes: list[Tape],
+    dialects: tuple[ir.Dialect, ...],
+    memory: MemoryABC,
+    loss_m_result: Measurement,
+    rng_state: np.random.Generator,
+    shots: int,
+) -> list[np.ndarray]:
+    interpreter = _worker_interpreter(dialects, memory, loss_m_result, rng_state)
+    return _sweep_codes(tapes, interpreter, shots)
+
+
+def _shifted_expectations(
+    tapes: list[Tape], interpreter: PyQrackInterpreter, observables: list[str]
+) -> list[np.ndarray]:
+    return [expectations(tape.simulate(interpreter), observables) for tape in tapes]
+
+
+def _expectation_task(
+    tapes: list[Tape],
+    dialects: tuple[ir.Dialect, ...],
+    memory: MemoryABC,
+    loss_m_result: Measurement,
+    rng_state: np.random.Generator,
+    observables: list[str],
+) -> list[np.ndarray]:
+    interpreter = _worker_interpreter(dialects, memory, loss_m_result, rng_state)
+    return _shifted_expectations(tapes, interpreter, observables)
+
+
+def _worker_interpreter(
+    dialects: tuple[ir.Dialect, ...],
+    memory: MemoryABC,
+    loss_m_result: Measurement,
+    rng_state: np.random.Generator,
+) -> PyQrackInterpreter:
+    interpreter = PyQrackInterpreter(
+        ir.DialectGroup(dialects),
+        # tasks running in threads must not share a simulator
+        memory=copy.copy(memory),
+        rng_state=rng_state,
+        loss_m_result=loss_m_result,
+    )
+    _seed(interpreter, rng_state)
+    return interpreter
+
+
+def _seed(interpreter: PyQrackInterpreter, rng_state: np.random.Generator):
+    # draws the noise of `interpreter`, and pairs the measurement draws of the
+    # clusters of a split memory, from `rng_state`
+    interpreter.rng_state = rng_state
+    if isinstance(interpreter.memory, StackMemory):
+        interpreter.memory.cluster_rng = rng_state
+
+
+def _merged_profile(tapes: list[Tape] | None) -> CircuitProfile | None:
+    # the largest value of each field over the profiles of several tapes
+    if not tapes:
+        return None
+    profiles = [astuple(CircuitProfile.from_tape(tape)) for tape in tapes]
+    return CircuitProfile(*map(max, zip(*profiles)))
+
+
+def _check_observables(tape: Tape, observables: Sequence[str]):
+    num_qubits = sum(map(len, tape.qregs))
+    for observable in observables:
+        if len(observable) > num_qubits:
+            raise ValueError(
+                f"observable {observable!r} acts on more than {num_qubits} qubits"
+            )
+
+
+def _replay_shots(
+    tape: Tape,
+    dialects: tuple[ir.Dialect, ...],
+    memory: MemoryABC,
+    loss_m_result: Measurement,
+    rng_state: np.random.Generator,
+    shots: int,
+    codes: bool,
+) -> list | np.ndarray:
+    interpreter = _worker_interpreter(dialects, memory, loss_m_result, rng_state)
+    return _batch_results(tape.replayer(interpreter), shots, codes)
+
+
+def _interpret(
+    interpreter: PyQrackInterpreter, mt: ir.Method, args: tuple, kwargs: dict
+) -> Any:
+    return interpreter.run(mt, args, kwargs).expect()
 
-        interpreter = self._get_interp(mt)
-        batched_results = []
-        for _ in range(_shots):
-            batched_results.append(interpreter.run(mt, args, kwargs).expect())
 
-        return batched_results
+def _batch_results(
+    shot: Callable[[], Any], shots: int, codes: bool
+) -> list | np.ndarray:
+    results = (shot() for _ in range(shots))
+    if codes:
+        return MeasurementArray.from_results(results, shots).bits
+    return list(results)
@@ -1,5 +1,6 @@
 from unittest.mock import Mock
 
+import numpy as np
 from kirin import ir
 from bloqade import qasm2
 from bloqade.noise import native
@@ -29,7 +30,7 @@ def test_atom_loss():
         return q
 
     rng_state = Mock()
-    rng_state.uniform.return_value = 0.1
+    rng_state.random.return_value = np.array([0.1])
     input = reg.CRegister(1)
     memory = MockMemory()
 
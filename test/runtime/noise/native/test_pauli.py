@@ -1,9 +1,11 @@
 from unittest.mock import Mock, call
 
+import numpy as np
 from kirin import ir
 from bloqade import qasm2
 from bloqade.noise import native
 from bloqade.pyqrack.base import MockMemory, PyQrackInterpreter
+from bloqade.pyqrack.noise.sampling import pauli_table
 
 simulation = qasm2.extended.add(native)
 
@@ -35,7 +37,8 @@ def test_pauli_channel():
         return q
 
     rng_state = Mock()
-    rng_state.choice.side_effect = ["y", "i"]
+    # cumulative probabilities of i, x, y are 0.2, 0.3, 0.7
+    rng_state.random.side_effect = [np.array([0.5]), np.array([0.1])]
     sim_reg = run_mock(test_atom_loss, rng_state)
     sim_reg.assert_has_calls([call.y(0)])
 
@@ -75,8 +78,8 @@ def test_cz_pauli_channel_false():
         return q
 
     rng_state = Mock()
-    rng_state.choice.side_effect = ["y"]
-    rng_state.uniform.return_value = 0.5
+    # cumulative probabilities of i, x, y on the target are 0.4, 0.6, 0.8
+    rng_state.random.side_effect = [np.array([0.5])] * 4 + [np.array([[0.1, 0.7]])]
     sim_reg = run_mock(test_atom_loss, rng_state)
     sim_reg.assert_has_calls([call.mcz([0], 1), call.force_m(0, 0), call.y(1)])
 
@@ -116,14 +119,32 @@ def test_cz_pauli_channel_true():
         return q
 
     rng_state = Mock()
-    rng_state.choice.side_effect = ["y", "x"]
-    rng_state.uniform.return_value = 0.5
+    rng_state.random.side_effect = (
+        [np.array([0.5])] * 2 + [np.array([[0.5, 0.5]])] + [np.array([0.5])] * 2
+    )
     sim_reg = run_mock(test_atom_loss, rng_state)
 
     sim_reg.assert_has_calls([call.y(0), call.x(1), call.mcz([0], 1)])
 
 
+def test_pauli_table():
+    table = pauli_table(0.1, 0.4, 0.3)
+    assert table is pauli_table(0.1, 0.4, 0.3)
+    assert table.lookup(np.array([0.0, 0.2, 0.29, 0.3, 0.7, 0.99])).tolist() == [
+        0,
+        1,
+        1,
+        2,
+        3,
+        3,
+    ]
+
+    counts = np.bincount(table.sample(np.random.default_rng(0), 100_000), minlength=4)
+    assert np.allclose(counts / 100_000, table.p, atol=0.01)
+
+
 if __name__ == "__main__":
     test_pauli_channel()
     test_cz_pauli_channel_false()
     test_cz_pauli_channel_true()
+    test_pauli_table()
@@ -0,0 +1,69 @@
+import math
+from collections import Counter
+
+import numpy as np
+from bloqade import qasm2
+from bloqade.noise import native
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.tape import Measure
+from bloqade.pyqrack.branches import BranchSampler
+
+
+@qasm2.extended
+def feedback():
+    q = qasm2.qreg(2)
+    c = qasm2.creg(1)
+    d = qasm2.creg(1)
+    z = qasm2.creg(1)
+    qasm2.rx(q[0], 1.0)
+    qasm2.measure(q[0], c[0])
+    if c == d:
+        qasm2.x(q[1])
+    qasm2.measure(q[1], z[0])
+    return [c, z]
+
+
+def test_record():
+    sampler = BranchSampler(feedback, (), {})
+    tape, complete = sampler.record(())
+    assert not complete
+    assert type(tape.ops[-1]) is Measure
+
+    tape, complete = sampler.record((0,))
+    assert complete
+    assert [op.name for op in tape.ops if type(op) is not Measure] == ["r", "x"]
+    tape, complete = sampler.record((1,))
+    assert complete
+    assert [op.name for op in tape.ops if type(op) is not Measure] == ["r"]
+
+
+def test_branch_sampling():
+    shots = 4000
+    target = PyQrack(2, branch_sampling=True, rng_state=np.random.default_rng(1))
+    results = target.multi_run(feedback, shots)
+    assert len(results) == shots
+    counts = Counter((int(c[0]), int(z[0])) for c, z in results)
+    # the second qubit is flipped exactly when the first one reads 0
+    assert set(counts) == {(0, 1), (1, 0)}
+    assert math.isclose(counts[1, 0] / shots, math.sin(0.5) ** 2, abs_tol=0.03)
+
+    codes = target.multi_run_array(feedback, 10).unpack()
+    assert codes.shape == (10, 2) and (codes.sum(axis=1) == 1).all()
+    assert sum(target.sample_counts(feedback, 10).values()) == 10
+
+
+def test_branch_sampling_noise():
+    @qasm2.extended.add(native)
+    def noisy():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(1)
+        d = qasm2.creg(1)
+        qasm2.measure(q[0], c[0])
+        if c == d:
+            native.pauli_channel([q[1]], px=1.0, py=0.0, pz=0.0)
+        qasm2.measure(q[1], d[0])
+        return d
+
+    # noisy branches fall back to interpreting every shot
+    results = PyQrack(2, branch_sampling=True).multi_run(noisy, 5)
+    assert [int(d[0]) for d in results] == [1] * 5
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from pyqrack import QrackSimulator
+from bloqade.pyqrack.tape import Gate
+from bloqade.pyqrack.circuit import lower
+
+
+def prepared() -> QrackSimulator:
+    sim = QrackSimulator(
+        3,
+        isStabilizerHybrid=False,
+        isSchmidtDecompose=False,
+        isSchmidtDecomposeMulti=False,
+        isBinaryDecisionTree=False,
+    )
+    for q in range(3):
+        sim.u(q, 0.3 + q, 0.7 * q, 0.2)
+    sim.mcx([0], 1)
+    sim.mcx([1], 2)
+    return sim
+
+
+@pytest.mark.parametrize(
+    "name, args",
+    [
+        ("x", (0,)),
+        ("y", (1,)),
+        ("z", (2,)),
+        ("h", (0,)),
+        ("s", (1,)),
+        ("adjs", (2,)),
+        ("t", (0,)),
+        ("adjt", (1,)),
+        ("u", (2, 0.3, 0.5, 0.7)),
+        ("r", (1, 0.4, 0)),
+        ("r", (2, 0.4, 1)),
+        ("r", (3, 0.4, 2)),
+        ("mcx", ([0], 1)),
+        ("mcx", ([0, 1], 2)),
+        ("mcy", ([1], 2)),
+        ("mcz", ([2], 0)),
+        ("mch", ([0], 2)),
+        ("mcu", ([0, 1], 2, 0.3, 0.2, 0.1)),
+        ("mcr", (1, 0.5, [2], 0)),
+        ("mcr", (2, 0.5, [2], 0)),
+        ("mcr", (3, 0.5, [0, 2], 1)),
+        ("swap", (0, 2)),
+        ("cswap", ([1], 0, 2)),
+    ],
+)
+def test_lower(name: str, args: tuple):
+    expected = prepared()
+    getattr(expected, name)(*args)
+
+    sim = prepared()
+    lower([Gate((), name, args)]).run(sim)
+    # equal up to a global phase
+    overlap = np.vdot(expected.out_ket(), sim.out_ket())
+    assert abs(abs(overlap) - 1) < 1e-5
+
+
+def test_lower_force_m():
+    with pytest.raises(ValueError):
+        lower([Gate((), "force_m", (0, 0))])
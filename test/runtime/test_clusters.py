@@ -0,0 +1,130 @@
+import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from bloqade import qasm2
+from pyqrack import QrackSimulator
+from bloqade.pyqrack import PyQrack, Measurement, StackMemory
+from bloqade.pyqrack.target import _worker_interpreter
+from bloqade.pyqrack.clusters import MERGE_QUBITS, ClusterSimulator, pack
+
+BLOCK = MERGE_QUBITS + 1
+
+
+def fidelity(a, b) -> float:
+    # Qrack does not keep track of the global phase
+    return abs(np.vdot(a, b)) ** 2
+
+
+def test_pack():
+    assert pack([(0, 2), (1,), (3, 4)]) == ((0, 1, 2, 3, 4),)
+
+    big = tuple(range(BLOCK))
+    small = [(q,) for q in range(BLOCK, BLOCK + 12)]
+    clusters = pack([big, *small])
+    assert clusters[0] == big
+    assert sorted(sum(clusters, ())) == list(range(BLOCK + 12))
+    assert all(len(c) <= MERGE_QUBITS for c in clusters[1:])
+
+
+def test_cluster_simulator():
+    clusters = ((0, 3), (1, 2))
+    split = ClusterSimulator(clusters, [QrackSimulator(2), QrackSimulator(2)])
+    whole = QrackSimulator(4)
+    for sim_reg in (split, whole):
+        sim_reg.u(0, 0.3, 0.2, 0.1)
+        sim_reg.h(1)
+        sim_reg.mcx([0], 3)
+        sim_reg.mcu([1], 2, 1.1, 0.4, 0.7)
+        sim_reg.x(2)
+
+    assert split.num_qubits() == 4
+    assert np.isclose(fidelity(split.out_ket(), whole.out_ket()), 1, atol=1e-5)
+    assert np.isclose(split.prob(3), whole.prob(3), atol=1e-6)
+
+
+def test_split_clusters():
+    @qasm2.extended
+    def blocks():
+        q = qasm2.qreg(2 * BLOCK)
+        c = qasm2.creg(2 * BLOCK)
+        for offset in range(0, 2 * BLOCK, BLOCK):
+            qasm2.h(q[offset])
+            for i in range(offset, offset + BLOCK - 1):
+                qasm2.cx(q[i], q[i + 1])
+        for i in range(2 * BLOCK):
+            qasm2.measure(q[i], c[i])
+        return c
+
+    target = PyQrack(2 * BLOCK, split_clusters=True)
+    results = target.multi_run(blocks, 50)
+    memory = target._cache[next(iter(target._cache))].interpreter.memory
+    assert isinstance(memory.sim_reg, ClusterSimulator)
+    assert memory.clusters == (tuple(range(BLOCK)), tuple(range(BLOCK, 2 * BLOCK)))
+
+    firsts = set()
+    for c in results:
+        bits = [int(bit) for bit in c]
+        assert len(set(bits[:BLOCK])) == 1 and len(set(bits[BLOCK:])) == 1
+        firsts.add((bits[0], bits[BLOCK]))
+    assert len(firsts) > 1
+
+
+def test_split_clusters_independent():
+    theta = 2 * math.acos(math.sqrt(2 / 3))
+    pool = ThreadPoolExecutor(2)
+
+    @qasm2.extended
+    def blocks():
+        q = qasm2.qreg(2 * BLOCK)
+        c = qasm2.creg(2 * BLOCK)
+        for offset in range(0, 2 * BLOCK, BLOCK):
+            qasm2.rx(q[offset], theta)
+            qasm2.t(q[offset])
+            for i in range(offset, offset + BLOCK - 1):
+                qasm2.cx(q[i], q[i + 1])
+        for i in range(2 * BLOCK):
+            qasm2.measure(q[i], c[i])
+        return c
+
+    # Qrack may return the draws of `measure_shots` sorted by outcome
+    expected = {(a, b): (2 - a) * (2 - b) / 9 for a in (0, 1) for b in (0, 1)}
+    for split, executor in ((False, None), (True, None), (True, pool)):
+        target = PyQrack(
+            2 * BLOCK,
+            split_clusters=split,
+            rng_state=np.random.default_rng(7),
+            executor=executor,
+        )
+        bits = target.multi_run_array(blocks, 4000).unpack()
+        firsts = Counter(zip(bits[:, 0].tolist(), bits[:, BLOCK].tolist()))
+        for outcome, probability in expected.items():
+            assert abs(firsts[outcome] / 4000 - probability) < 0.03
+    pool.shutdown()
+
+
+def test_split_clusters_register():
+    @qasm2.extended
+    def blocks():
+        q = qasm2.qreg(2 * BLOCK)
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[BLOCK - 1])
+        qasm2.rx(q[BLOCK], 0.7)
+        qasm2.cx(q[BLOCK], q[2 * BLOCK - 1])
+        return q
+
+    reg = PyQrack(2 * BLOCK, split_clusters=True).run(blocks)
+    assert isinstance(reg.sim_reg, ClusterSimulator)
+    ket = PyQrack(2 * BLOCK).state(blocks)
+    assert np.isclose(fidelity(reg.sim_reg.out_ket(), ket), 1, atol=1e-5)
+
+
+def test_worker_cluster_rng():
+    memory = StackMemory(PyQrack(2 * BLOCK).pyqrack_options, total=2 * BLOCK, pool=None)
+    memory.split(pack([tuple(range(BLOCK)), tuple(range(BLOCK, 2 * BLOCK))]))
+    rng = np.random.default_rng(3)
+    interpreter = _worker_interpreter((), memory, Measurement.One, rng)
+    # each batch pairs the draws of the clusters with its own random stream
+    interpreter.memory.reset()
+    assert interpreter.memory.sim_reg.rng is rng
@@ -0,0 +1,115 @@
+import pickle
+from dataclasses import replace
+
+import numpy as np
+import pytest
+from bloqade import qasm2
+from bloqade.noise import native
+from bloqade.pyqrack import PyQrack, PyQrackInterpreter, target as target_module
+from bloqade.pyqrack.base import MockMemory
+from bloqade.pyqrack.tape import TapeRecorder
+from bloqade.pyqrack.codegen import generate
+
+simulation = qasm2.extended.add(native)
+
+
+class MeasureOneMemory(MockMemory):
+    def reset(self):
+        super().reset()
+        self.sim_reg.m.return_value = 1
+
+
+@simulation
+def program():
+    q = qasm2.qreg(3)
+    c = qasm2.creg(3)
+
+    qasm2.h(q[0])
+    qasm2.cx(q[0], q[1])
+    qasm2.rx(q[2], 0.3)
+    qasm2.t(q[1])
+    native.atom_loss_channel([q[0], q[1]], prob=0.3)
+    native.pauli_channel([q[0], q[1], q[2]], px=0.1, py=0.2, pz=0.1)
+    native.cz_pauli_channel(
+        [q[0]],
+        [q[1]],
+        px_ctrl=0.1,
+        py_ctrl=0.2,
+        pz_ctrl=0.1,
+        px_qarg=0.2,
+        py_qarg=0.2,
+        pz_qarg=0.2,
+        paired=False,
+    )
+    qasm2.parallel.cz(ctrls=[q[0], q[1]], qargs=[q[2], q[2]])
+    qasm2.u(q[0], 0.1, 0.2, 0.3)
+    qasm2.reset(q[1])
+    qasm2.rxx(q[0], q[1], 0.3)
+    for i in range(3):
+        qasm2.measure(q[i], c[i])
+
+    return c, q
+
+
+@pytest.mark.parametrize("skip_ahead", [False, True])
+@pytest.mark.parametrize("seed", range(5))
+def test_generated_replay(seed: int, skip_ahead: bool):
+    tape = TapeRecorder(program.dialects).record(program)
+    tape = replace(tape, skip_ahead=skip_ahead)
+    generated = replace(tape, source=generate(tape))
+    assert tape.program is None and generated.program is not None
+
+    results = []
+    for t in (tape, generated):
+        interp = PyQrackInterpreter(
+            program.dialects,
+            memory=MeasureOneMemory(),
+            rng_state=np.random.default_rng(seed),
+        )
+        creg, qreg = t.replay(interp)
+        results.append((interp.memory.sim_reg.mock_calls, creg, qreg.qubit_state))
+
+    assert results[0] == results[1]
+
+
+def test_generate_code():
+    _, tape = PyQrack(3)._prepare(program, (), {})
+    assert tape is not None and tape.source is not None
+    # the generated function is compiled again after unpickling
+    assert pickle.loads(pickle.dumps(tape)).program is not None
+
+    def lost(**options):
+        # measurement outcomes come from Qrack, atom loss from `rng_state`
+        target = PyQrack(3, rng_state=np.random.default_rng(5), **options)
+        return [qreg.qubit_state for _, qreg in target.multi_run(program, 30)]
+
+    assert lost() == lost(generate_code=False) == lost(use_tape=False)
+
+
+def test_generated_code_cache(monkeypatch: pytest.MonkeyPatch):
+    calls = []
+
+    def counting(tape):
+        calls.append(tape)
+        return generate(tape)
+
+    @qasm2.extended
+    def rotate(theta: float):
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        qasm2.rx(q[0], theta)
+        qasm2.measure(q[0], c[0])
+        return c
+
+    monkeypatch.setattr(target_module, "generate", counting)
+    target = PyQrack(1)
+    assert list(target.run(rotate, 0.0)) == [0]
+    _, tape = target._prepare(rotate, (0.0,), {})
+    assert list(target.run(rotate, 0.0)) == [0]
+    target.multi_run(rotate, 3, 0.0)
+    # the recording and its compiled function are reused between calls
+    assert len(calls) == 1
+    assert target._prepare(rotate, (0.0,), {})[1] is tape
+
+    assert list(target.run(rotate, 3.141592653589793)) == [1]
+    assert len(calls) == 2
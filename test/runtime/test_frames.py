@@ -0,0 +1,130 @@
+import math
+import itertools
+
+import numpy as np
+import pytest
+from bloqade import qasm2
+from pyqrack import QrackSimulator
+from bloqade.noise import native
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.tape import Gate, TapeRecorder
+from bloqade.pyqrack.frames import FrameSampler, _propagate, gate_steps
+
+simulation = qasm2.extended.add(native)
+
+
+def choi_state(*ops: tuple[str, tuple]) -> np.ndarray:
+    # qubits 0 and 1 maximally entangled with qubits 2 and 3, then `ops` on them
+    sim = QrackSimulator(4)
+    for q in range(2):
+        sim.h(q + 2)
+        sim.mcx([q + 2], q)
+    for name, args in ops:
+        getattr(sim, name)(*args)
+    return np.array(sim.out_ket())
+
+
+def pauli_ops(x: np.ndarray, z: np.ndarray) -> list[tuple[str, tuple]]:
+    ops = []
+    for q in range(2):
+        if x[q, 0]:
+            ops.append(("x", (q,)))
+        if z[q, 0]:
+            ops.append(("z", (q,)))
+    return ops
+
+
+@pytest.mark.parametrize(
+    "gate",
+    [
+        Gate((), "h", (0,)),
+        Gate((), "s", (1,)),
+        Gate((), "adjs", (0,)),
+        Gate((), "y", (0,)),
+        Gate((), "r", (1, math.pi / 2, 0)),
+        Gate((), "r", (2, -math.pi / 2, 1)),
+        Gate((), "r", (3, 1.5 * math.pi, 0)),
+        Gate((), "r", (3, math.pi, 0)),
+        Gate((), "u", (0, math.pi / 2, math.pi / 2, -math.pi / 2)),
+        Gate((), "u", (1, math.pi / 2, 0.0, math.pi)),
+        Gate((), "mcx", ([0], 1)),
+        Gate((), "mcy", ([1], 0)),
+        Gate((), "mcz", ([0], 1)),
+        Gate((), "swap", (0, 1)),
+    ],
+)
+def test_gate_steps(gate: Gate):
+    steps = gate_steps(gate)
+    assert steps is not None
+    gate_op = (gate.name, gate.args)
+    for bits in itertools.product((0, 1), repeat=4):
+        x = np.array(bits[:2], dtype=bool).reshape(2, 1)
+        z = np.array(bits[2:], dtype=bool).reshape(2, 1)
+        expected = choi_state(*pauli_ops(x, z), gate_op)
+        _propagate(x, z, steps)
+        # the gate maps the error to the propagated one, up to a phase
+        propagated = choi_state(gate_op, *pauli_ops(x, z))
+        assert math.isclose(abs(np.vdot(propagated, expected)), 1, abs_tol=1e-4)
+
+
+def test_non_clifford():
+    assert gate_steps(Gate((), "t", (0,))) is None
+    assert gate_steps(Gate((), "r", (1, 0.3, 0))) is None
+    assert gate_steps(Gate((), "mcx", ([0, 1], 2))) is None
+
+    @simulation
+    def program():
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        qasm2.t(q[0])
+        native.pauli_channel([q[0]], px=0.1, py=0.0, pz=0.0)
+        qasm2.t(q[0])
+        qasm2.measure(q[0], c[0])
+        return c
+
+    tape = TapeRecorder(program.dialects).record(program)
+    assert FrameSampler.from_tape(tape) is None
+
+
+def test_pauli_frames():
+    @simulation
+    def program():
+        q = qasm2.qreg(4)
+        c = qasm2.creg(4)
+        # not Clifford, but before any Pauli error
+        qasm2.rx(q[3], 0.3)
+        qasm2.h(q[0])
+        native.pauli_channel([q[0], q[1]], px=0.0, py=0.0, pz=0.2)
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        native.atom_loss_channel([q[1]], prob=0.1)
+        native.cz_pauli_channel(
+            [q[1]],
+            [q[2]],
+            px_ctrl=0.0,
+            py_ctrl=0.0,
+            pz_ctrl=0.0,
+            px_qarg=0.3,
+            py_qarg=0.0,
+            pz_qarg=0.0,
+            paired=True,
+        )
+        qasm2.swap(q[1], q[2])
+        for i in range(4):
+            qasm2.measure(q[i], c[i])
+        return c
+
+    tape = TapeRecorder(program.dialects).record(program)
+    assert FrameSampler.from_tape(tape) is not None
+
+    shots = 4000
+    target = PyQrack(4, rng_state=np.random.default_rng(3), pauli_frames=True)
+    result = np.array(target.multi_run(program, shots))
+    codes = target.multi_run_array(program, shots).unpack()
+    for bits in (result, codes):
+        # the Z error on q[0] becomes an X error, copied to q[1]
+        assert abs(bits[:, 0].mean() - 0.2) < 0.03
+        # a lost q[1] reads as one and skips the CZ error and the swap
+        assert abs(bits[:, 1].mean() - (0.1 + 0.9 * 0.3)) < 0.03
+        assert abs(bits[:, 2].mean() - 0.9 * 0.2) < 0.03
+        assert abs(bits[:, 3].mean() - math.sin(0.15) ** 2) < 0.02
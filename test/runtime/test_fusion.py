@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+from bloqade import qasm2
+from bloqade.noise import native
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.tape import Gate, Measure, TapeRecorder
+from bloqade.pyqrack.fusion import fuse, u_angles, gate_matrix
+
+simulation = qasm2.extended.add(native)
+
+
+def test_u_angles():
+    assert u_angles([1, 0, 0, 1]) is None
+    assert u_angles([1j, 0, 0, 1j]) is None
+    theta, phi, lam = u_angles(gate_matrix(Gate((), "h", (0,))))  # type: ignore
+    assert math.isclose(theta, math.pi / 2)
+    assert math.isclose(abs(phi + lam), math.pi)
+
+
+def test_fuse():
+    @simulation
+    def program():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+        qasm2.h(q[0])
+        qasm2.rz(q[0], 0.3)
+        qasm2.h(q[1])
+        qasm2.s(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.x(q[1])
+        qasm2.x(q[1])
+        qasm2.rx(q[0], 0.2)
+        native.pauli_channel([q[0]], px=0.1, py=0.0, pz=0.0)
+        qasm2.t(q[0])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    tape = TapeRecorder(program.dialects).record(program)
+    fused, eliminated = fuse(tape)
+    # h, rz and s merge into one gate, the two x cancel out
+    assert eliminated == 4
+    assert [op.name for op in fused.ops if type(op) is Gate] == [
+        "h",
+        "u",
+        "mcx",
+        "r",
+        "t",
+    ]
+    assert type(fused.ops[-1]) is Measure
+
+    target = PyQrack(2, fuse_gates=True)
+    target.run(program)
+    assert target.fused_gates == 4
+
+
+def test_fused_state():
+    @qasm2.extended
+    def program():
+        q = qasm2.qreg(3)
+        for i in range(3):
+            qasm2.h(q[i])
+            qasm2.t(q[i])
+            qasm2.ry(q[i], 0.1 * i)
+            qasm2.u(q[i], 0.2, 0.3 * i, 0.4)
+        qasm2.cx(q[0], q[1])
+        qasm2.sdg(q[1])
+        qasm2.rx(q[1], 0.5)
+        qasm2.cz(q[1], q[2])
+        return q
+
+    def ket(**options):
+        target = PyQrack(3, native_circuits=False, **options)
+        return np.array(target.run(program).sim_reg.out_ket())
+
+    overlap = np.vdot(ket(), ket(fuse_gates=True))
+    assert abs(abs(overlap) - 1) < 1e-5
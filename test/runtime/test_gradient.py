@@ -0,0 +1,93 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from bloqade import qasm2
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.sweep import slots
+from bloqade.pyqrack.gradient import dual, parameter_shifts
+
+
+def test_dual():
+    a, b = slots([0.5, 2.0])
+    value, slope = dual((a * b - b / a + a**2).expr, [0.5, 2.0])
+    assert value == 0.5 * 2.0 - 2.0 / 0.5 + 0.25
+    assert np.allclose(slope, [2.0 + 2.0 / 0.25 + 1.0, 0.5 - 1 / 0.5])
+
+
+@qasm2.extended
+def rotations(theta: float, phi: float):
+    q = qasm2.qreg(2)
+    qasm2.rx(q[0], theta)
+    qasm2.x(q[1])
+    qasm2.crx(q[1], q[0], 2 * phi)
+
+
+def test_parameter_shifts():
+    template = PyQrack(2)._trace(rotations, slots([0.1, 0.2]), {})
+    tapes, coefficients = parameter_shifts(template, [0.1, 0.2])
+    # two evaluations for rx, four for the controlled rotation
+    assert len(tapes) == 6
+    assert coefficients.shape == (2, 6)
+    assert not coefficients[1, :2].any() and not coefficients[0, 2:].any()
+
+
+def test_gradient():
+    theta, phi = 0.3, 0.4
+    # <Z> = cos(theta + 2 phi) on the first qubit
+    expected = -math.sin(theta + 2 * phi) * np.array([1.0, 2.0])
+    gradient = PyQrack(2).gradient(rotations, "ZI", [theta, phi])
+    assert np.allclose(gradient, expected, atol=1e-5)
+
+    class CountingExecutor(ThreadPoolExecutor):
+        submitted = 0
+
+        def submit(self, *args, **kwargs):
+            self.submitted += 1
+            return super().submit(*args, **kwargs)
+
+    with CountingExecutor(2) as executor:
+        gradient = PyQrack(2, executor=executor).gradient(
+            rotations, ["ZI", "IZ"], [theta, phi]
+        )
+    # the shifted evaluations are split between the threads of the executor
+    assert executor.submitted == 2
+    assert gradient.shape == (2, 2)
+    assert np.allclose(gradient, [expected, [0, 0]], atol=1e-5)
+
+
+def test_gradient_functions():
+    @qasm2.main
+    def even(theta: float):
+        q = qasm2.qreg(1)
+        qasm2.rx(q[0], qasm2.cos(theta) * 3.0)
+
+    # <Z> = cos(3 cos(theta)), and cos(theta) takes the same value at -theta
+    theta = -0.25
+    expected = 3 * math.sin(theta) * math.sin(3 * math.cos(theta))
+    gradient = PyQrack(1).gradient(even, "Z", [theta])
+    assert np.allclose(gradient, [expected], atol=1e-5)
+
+
+def test_gradient_errors():
+    @qasm2.extended
+    def branching(theta: float):
+        q = qasm2.qreg(1)
+        if theta > 1:
+            qasm2.x(q[0])
+        qasm2.rx(q[0], theta)
+
+    with pytest.raises(ValueError):
+        PyQrack(1).gradient(branching, "Z", [0.5])
+
+    @qasm2.extended
+    def untracked(theta: float):
+        q = qasm2.qreg(1)
+        qasm2.rx(q[0], abs(theta))
+
+    with pytest.raises(ValueError):
+        PyQrack(1).gradient(untracked, "Z", [-0.25])
+
+    with pytest.raises(ValueError):
+        PyQrack(2).gradient(rotations, "ZZZ", [0.5, 0.5])
@@ -0,0 +1,84 @@
+import random
+import itertools
+
+import numpy as np
+import pytest
+from bloqade import qasm2
+from pyqrack import QrackSimulator
+from bloqade.noise import native
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.observables import parse_pauli, expectations, group_commuting
+
+PAULI_MATRICES = {
+    "I": np.eye(2),
+    "X": np.array([[0, 1], [1, 0]]),
+    "Y": np.array([[0, -1j], [1j, 0]]),
+    "Z": np.diag([1, -1]),
+}
+
+
+def exact_expectation(ket: np.ndarray, observable: str) -> float:
+    op = np.eye(1)
+    # qubit 0 is the least significant bit of a basis state
+    for pauli in reversed(observable):
+        op = np.kron(op, PAULI_MATRICES[pauli])
+    return np.vdot(ket, op @ ket).real
+
+
+def test_parse_pauli():
+    assert parse_pauli("IxZI") == {1: "X", 2: "Z"}
+    with pytest.raises(ValueError):
+        parse_pauli("ZA")
+
+
+def test_group_commuting():
+    observables = [parse_pauli(p) for p in ("ZZI", "XII", "IZZ", "IXI", "ZIZ")]
+    assert group_commuting(observables) == [[0, 2, 4], [1, 3]]
+
+
+@pytest.mark.parametrize("batch_qubits", [0, 16])
+def test_expectations(monkeypatch, batch_qubits: int):
+    monkeypatch.setattr(
+        "bloqade.pyqrack.observables.BATCH_QUBITS", batch_qubits, raising=True
+    )
+    rnd = random.Random(1)
+    sim_reg = QrackSimulator(4)
+    for _ in range(30):
+        angles = [rnd.uniform(0, 3) for _ in range(3)]
+        sim_reg.u(rnd.randrange(4), *angles)
+        ctrl, target = rnd.sample(range(4), 2)
+        sim_reg.mcx([ctrl], target)
+
+    ket = np.array(sim_reg.out_ket())
+    observables = ["".join(p) for p in itertools.product("IXYZ", repeat=4)]
+    expected = [exact_expectation(ket, observable) for observable in observables]
+    assert np.allclose(expectations(sim_reg, observables), expected, atol=1e-5)
+    # the state is left untouched
+    assert abs(abs(np.vdot(np.array(sim_reg.out_ket()), ket)) - 1) < 1e-5
+
+
+def test_expectation():
+    @qasm2.extended
+    def bell():
+        q = qasm2.qreg(3)
+        c = qasm2.creg(2)
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    values = PyQrack(3).expectation(bell, ["ZZ", "XXI", "YY", "ZI", "IIZ"])
+    assert values.shape == (5,)
+    assert np.allclose(values, [1, 1, -1, 0, 1], atol=1e-5)
+
+    with pytest.raises(ValueError):
+        PyQrack(3).expectation(bell, ["ZZZZ"])
+
+    @qasm2.extended.add(native)
+    def noisy():
+        q = qasm2.qreg(1)
+        native.pauli_channel([q[0]], px=0.1, py=0.0, pz=0.0)
+
+    with pytest.raises(ValueError):
+        PyQrack(1).expectation(noisy, ["Z"])
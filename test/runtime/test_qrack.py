@@ -1,9 +1,17 @@
 import math
 from unittest.mock import Mock, call
 
+import numpy as np
 from kirin import ir
 from bloqade import qasm2
-from bloqade.pyqrack.base import MockMemory, PyQrackInterpreter
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.base import (
+    MockMemory,
+    StackMemory,
+    PyQrackInterpreter,
+    _default_pyqrack_args,
+)
+from bloqade.pyqrack.qasm2.parallel import layer_circuit
 
 
 def run_mock(program: ir.Method, rng_state: Mock | None = None):
@@ -160,3 +168,31 @@ def test_extended():
             call.r(3, 0.5, 1),
         ]
     )
+
+
+def test_parallel_layers():
+    @qasm2.extended
+    def program():
+        q = qasm2.qreg(6)
+        qubits = [q[0], q[1], q[2], q[3], q[4], q[5]]
+        for _ in range(2):
+            qasm2.parallel.u(qubits, theta=0.5, phi=0.2, lam=0.1)
+            qasm2.parallel.cz(
+                ctrls=[q[0], q[2], q[4], q[1]], qargs=[q[1], q[3], q[5], q[4]]
+            )
+            qasm2.parallel.rz(qubits, 0.3)
+        return q
+
+    layer_circuit.cache_clear()
+    interp = PyQrackInterpreter(
+        program.dialects,
+        memory=StackMemory(_default_pyqrack_args() | {"qubitCount": 6}, total=6),
+    )
+    ket = np.array(interp.run(program, ()).expect().sim_reg.out_ket())
+    # each distinct layer is built once
+    assert layer_circuit.cache_info().misses == 3
+    assert layer_circuit.cache_info().hits == 3
+
+    target = PyQrack(6, native_circuits=False, generate_code=False)
+    expected = np.array(target.run(program).sim_reg.out_ket())
+    assert abs(abs(np.vdot(expected, ket)) - 1) < 1e-5
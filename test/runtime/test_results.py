@@ -0,0 +1,119 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+from bloqade import qasm2
+from bloqade.noise import native
+from bloqade.pyqrack import LOST, PyQrack, MeasurementArray, reg
+from bloqade.pyqrack.results import count_outcomes, measurement_codes
+
+
+@qasm2.extended
+def ghz(n: int):
+    q = qasm2.qreg(n)
+    c = qasm2.creg(n)
+    d = qasm2.creg(1)
+
+    qasm2.h(q[0])
+    for i in range(1, n):
+        qasm2.cx(q[0], q[i])
+
+    for i in range(n):
+        qasm2.measure(q[i], c[i])
+
+    qasm2.x(q[0])
+    qasm2.measure(q[0], d[0])
+    return c, d
+
+
+def test_measurement_codes():
+    c = reg.CRegister(2)
+    c[1] = reg.Measurement.Lost
+    assert measurement_codes((c, reg.CBitRef(c, 1), reg.Measurement.One)) == [
+        0,
+        LOST,
+        LOST,
+        1,
+    ]
+
+    with pytest.raises(ValueError):
+        measurement_codes(1.0)
+
+
+def test_pack():
+    codes = np.array([[0, 1, LOST] * 3, [1, 1, 0] * 3, [0, 1, LOST] * 3], np.uint8)
+    result = MeasurementArray.from_codes(codes)
+    packed = result.pack()
+    assert packed.packed and packed.bits.shape == (3, 2)
+    assert np.array_equal(packed.unpack(), codes)
+
+    expected = {"01L01L01L": 2, "110110110": 1}
+    assert result.counts() == packed.counts() == expected
+    assert packed.bitstrings().tolist() == ["01L01L01L", "110110110", "01L01L01L"]
+
+
+@pytest.mark.parametrize("bitpack", [False, True])
+def test_multi_run_array(bitpack: bool):
+    result = PyQrack(4).multi_run_array(ghz, 100, 4, _bitpack=bitpack)
+    assert result.shots == 100 and result.nbits == 5
+    assert result.packed == bitpack
+    assert set(result.counts()) <= {"00001", "11110"}
+    assert set(result.unpack()[:, 4]) == {0, 1}
+
+
+def test_multi_run_array_replay():
+    @qasm2.extended.add(native)
+    def noisy():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        native.pauli_channel([q[0]], px=0.5, py=0.0, pz=0.0)
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    for options in ({}, {"use_tape": False}, {"workers": 2, "shots_per_task": 8}):
+        target = PyQrack(2, rng_state=np.random.default_rng(7), **options)
+        expected = [list(bits) for bits in target.multi_run(noisy, 20)]
+        target = PyQrack(2, rng_state=np.random.default_rng(7), **options)
+        result = target.multi_run_array(noisy, 20)
+        assert result.unpack().tolist() == expected
+
+
+def test_count_outcomes():
+    counts = {5: 1}
+    codes = np.array([[1, 0, 1], [0, 1, 0], [1, 0, 1]], np.uint8)
+    count_outcomes(codes, counts)
+    assert counts == {5: 3, 2: 1}
+
+    with pytest.raises(ValueError):
+        count_outcomes(np.array([[LOST]], np.uint8), counts)
+
+
+def test_sample_counts():
+    target = PyQrack(4, rng_state=np.random.default_rng(3), shots_per_task=64)
+    counts = target.sample_counts(ghz, 500, 4)
+    assert sum(counts.values()) == 500
+    assert set(counts) == {0b10000, 0b01111}
+
+    assert set(target.sample_counts(ghz, 100, 4, _bits=[0, 4])) == {0b10, 0b01}
+    top = target.sample_counts(ghz, 100, 4, _top=1)
+    assert len(top) == 1 and next(iter(top.values())) >= 50
+
+    @qasm2.extended.add(native)
+    def noisy():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        native.pauli_channel([q[0], q[1]], px=0.5, py=0.0, pz=0.0)
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    for options in ({}, {"use_tape": False}, {"workers": 2, "shots_per_task": 16}):
+        target = PyQrack(2, rng_state=np.random.default_rng(3), **options)
+        expected = target.multi_run_array(noisy, 50).unpack()
+        target = PyQrack(2, rng_state=np.random.default_rng(3), **options)
+        counts = target.sample_counts(noisy, 50)
+        assert counts == Counter(int(row[0]) + 2 * int(row[1]) for row in expected)
@@ -0,0 +1,69 @@
+import numpy as np
+from bloqade import qasm2
+from pyqrack import QrackSimulator
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.state import out_ket, prob_all
+
+
+def test_bulk_accessors():
+    sim_reg = QrackSimulator(3)
+    sim_reg.u(0, 0.3, 0.2, 0.1)
+    sim_reg.h(1)
+    sim_reg.mcx([1], 2)
+    sim_reg.u(2, 1.1, 0.4, 0.7)
+
+    ket = out_ket(sim_reg)
+    assert ket.dtype == np.complex128
+    assert np.allclose(ket, sim_reg.out_ket(), atol=1e-6)
+
+    probs = prob_all(sim_reg)
+    assert probs.dtype == np.float64
+    assert np.allclose(probs, np.abs(ket) ** 2, atol=1e-6)
+    assert np.allclose(prob_all(sim_reg, [2, 0]), sim_reg.prob_all([2, 0]))
+
+
+def test_state_and_probabilities():
+    @qasm2.extended
+    def ghz():
+        q = qasm2.qreg(3)
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.cx(q[1], q[2])
+        return q
+
+    ket = PyQrack(3).state(ghz)
+    assert ket.shape == (8,)
+    assert np.allclose(np.abs(ket[[0, 7]]) ** 2, 0.5, atol=1e-6)
+
+    assert np.allclose(PyQrack(3).probabilities(ghz), [0.5] + [0] * 6 + [0.5])
+    assert np.allclose(PyQrack(3).probabilities(ghz, _qubits=[0, 2]), [0.5, 0, 0, 0.5])
+
+    @qasm2.extended
+    def second():
+        q = qasm2.qreg(1)
+        r = qasm2.qreg(2)
+        qasm2.x(q[0])
+        qasm2.x(r[1])
+        return r
+
+    # marginalised onto the addresses of the returned register
+    assert np.allclose(PyQrack(3).probabilities(second), [0, 0, 1, 0], atol=1e-6)
+
+
+def test_state_after_measurement():
+    @qasm2.extended
+    def bell():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+        qasm2.h(q[0])
+        qasm2.t(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    # a non-Clifford kernel runs on a state vector, where the final measurements
+    # are batched, they still collapse the state onto |00> or |11>
+    probs = np.abs(PyQrack(2).state(bell)) ** 2
+    assert np.isclose(probs[0] + probs[3], 1, atol=1e-6)
+    assert np.isclose(max(probs), 1, atol=1e-6)
@@ -0,0 +1,121 @@
+import math
+import pickle
+
+import numpy as np
+import pytest
+from bloqade import qasm2
+from bloqade.pyqrack import PyQrack
+from bloqade.pyqrack.tape import TraceError
+from bloqade.pyqrack.sweep import Slot, bind, slots, evaluate
+
+
+def test_slot_arithmetic():
+    theta, phi = slots([0.5, 2.0])
+    angle = (1 - theta) * phi / 4 + -theta
+    assert isinstance(angle, Slot)
+    assert float(angle) == (1 - 0.5) * 2.0 / 4 - 0.5
+    assert evaluate(angle.expr, [1.5, 3.0]) == (1 - 1.5) * 3.0 / 4 - 1.5
+    assert pickle.loads(pickle.dumps(angle)).expr == angle.expr
+    with pytest.raises(TraceError):
+        theta > 1
+    with pytest.raises(TraceError):
+        theta == 0.5
+    assert hash(theta) == hash(0.5)
+
+
+@qasm2.extended
+def rotations(theta: float, phi: float):
+    q = qasm2.qreg(2)
+    c = qasm2.creg(2)
+    qasm2.rx(q[0], theta)
+    qasm2.u(q[1], phi / 2 * 2, 0.0, 0.0)
+    qasm2.measure(q[0], c[0])
+    qasm2.measure(q[1], c[1])
+    return c
+
+
+def test_sweep():
+    grid = np.array([[0, 0], [math.pi, 0], [0, math.pi], [math.pi, math.pi]])
+    target = PyQrack(2)
+    codes = target.sweep(rotations, grid, _shots=3)
+    assert target.late_bound
+    assert codes.shape == (4, 3, 2)
+    expected = [[0, 0], [1, 0], [0, 1], [1, 1]]
+    assert (codes == np.array(expected)[:, None, :]).all()
+
+    target = PyQrack(2, workers=2, shots_per_task=3)
+    assert (target.sweep(rotations, grid, _shots=3) == codes).all()
+
+
+def test_sweep_branching():
+    @qasm2.extended
+    def branching(theta: float):
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        if theta > 1:
+            qasm2.x(q[0])
+        qasm2.measure(q[0], c[0])
+        return c
+
+    target = PyQrack(1)
+    codes = target.sweep(branching, np.array([0.0, 2.0, 0.5]), _shots=2)
+    assert not target.late_bound
+    assert codes[:, :, 0].tolist() == [[0, 0], [1, 1], [0, 0]]
+
+
+def test_sweep_equality_branching():
+    @qasm2.extended
+    def branching(theta: float):
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        if theta == 0.0:
+            qasm2.x(q[0])
+        qasm2.measure(q[0], c[0])
+        return c
+
+    # the first two points take the same branch, the last one does not
+    target = PyQrack(1)
+    grid = np.array([2 * math.pi, 4 * math.pi, 0.0])
+    codes = target.sweep(branching, grid, _shots=2)
+    assert not target.late_bound
+    assert codes[:, :, 0].tolist() == [[0, 0], [0, 0], [1, 1]]
+
+
+def test_bind():
+    target = PyQrack(2)
+    template = target._trace(rotations, slots([0.1, 0.2]), {})
+    assert bind(template, [0.3, 0.4]) == target._trace(rotations, (0.3, 0.4), {})
+
+
+def test_sweep_functions():
+    half_turn = math.pi / 2
+
+    @qasm2.main
+    def flip(theta: float):
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        qasm2.rx(q[0], (1 - qasm2.cos(theta)) * half_turn)
+        qasm2.measure(q[0], c[0])
+        return c
+
+    # cos is even and periodic, the first two points record the same tape
+    target = PyQrack(1)
+    codes = target.sweep(flip, np.array([0.0, 2 * math.pi, math.pi]), _shots=2)
+    assert target.late_bound
+    assert codes[:, :, 0].tolist() == [[0, 0], [0, 0], [1, 1]]
+
+
+def test_sweep_untracked_function():
+    @qasm2.extended
+    def flip(theta: float):
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        qasm2.rx(q[0], abs(theta))
+        qasm2.measure(q[0], c[0])
+        return c
+
+    # slots do not keep track of abs, every point is recorded
+    target = PyQrack(1)
+    codes = target.sweep(flip, np.array([math.pi, -math.pi, 0.0]), _shots=2)
+    assert not target.late_bound
+    assert codes[:, :, 0].tolist() == [[1, 1], [1, 1], [0, 0]]
@@ -0,0 +1,394 @@
+import pickle
+from dataclasses import replace
+from unittest.mock import call
+
+import numpy as np
+import pytest
+from kirin import ir
+from bloqade import qasm2
+from bloqade.noise import native
+from bloqade.pyqrack import PyQrack, PyQrackInterpreter, reg
+from bloqade.pyqrack.base import MockMemory
+from bloqade.pyqrack.tape import Gate, Measure, TraceError, TapeRecorder
+from bloqade.pyqrack.layers import LAYER_OPTIONS
+from bloqade.pyqrack.noise.sampling import NoiseSites, pauli_table
+
+simulation = qasm2.extended.add(native)
+
+
+class MeasureOneMemory(MockMemory):
+    def reset(self):
+        super().reset()
+        self.sim_reg.m.return_value = 1
+
+
+def test_record():
+    @qasm2.main
+    def program():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    tape = TapeRecorder(program.dialects).record(program)
+    assert tape.ops == (
+        Gate((0,), "h", (0,)),
+        Gate((0, 1), "mcx", ([0], 1)),
+        Measure(1, 0, 1),
+    )
+    assert tape.qregs == ((0, 1),)
+    assert tape.cregs == (2,)
+
+
+def run_both(program: ir.Method, seed: int):
+    interp = PyQrackInterpreter(
+        program.dialects,
+        memory=(expected := MeasureOneMemory()),
+        rng_state=np.random.default_rng(seed),
+    )
+    expected_result = interp.run(program, ()).expect()
+
+    tape = TapeRecorder(program.dialects).record(program)
+    interp = PyQrackInterpreter(
+        program.dialects,
+        memory=(memory := MeasureOneMemory()),
+        rng_state=np.random.default_rng(seed),
+    )
+    result = tape.replay(interp)
+    return (expected.sim_reg, expected_result), (memory.sim_reg, result)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_replay_matches_interpreter(seed: int):
+    @simulation
+    def program():
+        q = qasm2.qreg(3)
+        c = qasm2.creg(3)
+
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        native.atom_loss_channel([q[0], q[1]], prob=0.3)
+        native.pauli_channel([q[0], q[1], q[2]], px=0.1, py=0.2, pz=0.1)
+        native.cz_pauli_channel(
+            [q[0]],
+            [q[1]],
+            px_ctrl=0.1,
+            py_ctrl=0.2,
+            pz_ctrl=0.1,
+            px_qarg=0.2,
+            py_qarg=0.2,
+            pz_qarg=0.2,
+            paired=False,
+        )
+        qasm2.parallel.cz(ctrls=[q[0], q[1]], qargs=[q[2], q[2]])
+        qasm2.rxx(q[0], q[1], 0.3)
+        for i in range(3):
+            qasm2.measure(q[i], c[i])
+
+        return c, q
+
+    (expected, (creg, qreg)), (sim_reg, (replay_creg, replay_qreg)) = run_both(
+        program, seed
+    )
+    assert sim_reg.mock_calls == expected.mock_calls
+    assert replay_creg == creg
+    assert replay_qreg.qubit_state == qreg.qubit_state
+
+
+def test_argument_register():
+    @qasm2.main
+    def program(c: qasm2.CReg):
+        q = qasm2.qreg(1)
+        qasm2.x(q[0])
+        qasm2.measure(q[0], c[0])
+
+    creg = reg.CRegister(1)
+    tape = TapeRecorder(program.dialects).record(program, (creg,))
+    assert creg == [reg.Measurement.Zero]
+
+    tape.replay(PyQrackInterpreter(program.dialects, memory=MeasureOneMemory()))
+    assert creg == [reg.Measurement.One]
+
+
+def test_measurement_dependent_control_flow():
+    @qasm2.main
+    def program():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+        d = qasm2.creg(2)
+
+        qasm2.measure(q[0], c[0])
+        if c == d:
+            qasm2.x(q[1])
+
+        return c
+
+    with pytest.raises(TraceError):
+        TapeRecorder(program.dialects).record(program)
+
+
+def test_multi_run():
+    @qasm2.extended
+    def ghz(n: int):
+        q = qasm2.qreg(n)
+        c = qasm2.creg(n)
+
+        qasm2.h(q[0])
+        for i in range(1, n):
+            qasm2.cx(q[0], q[i])
+
+        for i in range(n):
+            qasm2.measure(q[i], c[i])
+
+        return c
+
+    result = PyQrack(5).multi_run(ghz, 20, 5)
+    assert len(result) == 20
+    assert all(isinstance(bits, reg.CRegister) for bits in result)
+    assert {tuple(bits) for bits in result} <= {(0,) * 5, (1,) * 5}
+
+    result = PyQrack(5, use_tape=False).multi_run(ghz, 20, 5)
+    assert {tuple(bits) for bits in result} <= {(0,) * 5, (1,) * 5}
+
+
+def test_parallel_guards():
+    @qasm2.extended
+    def program():
+        q = qasm2.qreg(4)
+        qasm2.parallel.cz(ctrls=[q[0], q[2]], qargs=[q[1], q[3]])
+
+    tape = TapeRecorder(program.dialects).record(program)
+    assert tape.ops == (
+        Gate((1, 0), "mcz", ([0], 1)),
+        Gate((3, 2), "mcz", ([2], 3)),
+    )
+    interp = PyQrackInterpreter(program.dialects, memory=MockMemory())
+    tape.replay(interp)
+    interp.memory.sim_reg.assert_has_calls([call.mcz([0], 1), call.mcz([2], 3)])
+
+
+def test_sample():
+    @qasm2.extended
+    def ghz(n: int):
+        q = qasm2.qreg(n)
+        c = qasm2.creg(n + 1)
+
+        qasm2.h(q[0])
+        for i in range(1, n):
+            qasm2.cx(q[0], q[i])
+
+        for i in range(n):
+            qasm2.measure(q[i], c[i])
+
+        qasm2.measure(q[0], c[n])
+        return c
+
+    tape = TapeRecorder(ghz.dialects).record(ghz, (4,))
+    assert tape.can_sample()
+
+    interp = PyQrack(4)._get_interp(ghz)
+    result = tape.sampler(interp)(200)
+    assert len(result) == 200
+    assert {tuple(bits) for bits in result} == {(0,) * 5, (1,) * 5}
+
+
+def test_cannot_sample():
+    @simulation
+    def noisy():
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        native.pauli_channel([q[0]], px=0.1, py=0.0, pz=0.0)
+        qasm2.measure(q[0], c[0])
+        return c
+
+    @qasm2.main
+    def mid_circuit():
+        q = qasm2.qreg(1)
+        c = qasm2.creg(2)
+        qasm2.measure(q[0], c[0])
+        qasm2.x(q[0])
+        qasm2.measure(q[0], c[1])
+        return c
+
+    @qasm2.main
+    def returns_qubits():
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        qasm2.measure(q[0], c[0])
+        return q
+
+    for program in (noisy, mid_circuit, returns_qubits):
+        tape = TapeRecorder(program.dialects).record(program)
+        assert not tape.can_sample()
+
+    result = PyQrack(1).multi_run(mid_circuit, 10)
+    assert all(bits == [0, 1] for bits in result)
+
+
+def test_noise_sites():
+    p = pauli_table(0.01, 0.02, 0.03)
+    sites = NoiseSites.build(
+        [(0, 0, 0.06, p), (0, 1, 0.06, p), (1, 0, 0.2, None), (2, 0, 0.0, None)]
+    )
+    rng = np.random.default_rng(0)
+    counts = np.zeros((3, 4))
+    shots = 20_000
+    for _ in range(shots):
+        for op, events in sites.sample(rng).items():
+            for _, pauli in events:
+                counts[op, pauli] += 1
+
+    assert np.allclose(counts[0, 1:] / (2 * shots), p.p[1:], atol=0.005)
+    assert abs(counts[1].sum() / shots - 0.2) < 0.01
+    assert counts[2].sum() == 0
+
+
+def test_skip_ahead():
+    @simulation
+    def program():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+        for _ in range(10):
+            native.pauli_channel([q[0]], px=0.05, py=0.0, pz=0.0)
+            native.atom_loss_channel([q[1]], prob=0.02)
+
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    shots = 4000
+    target = PyQrack(2, rng_state=np.random.default_rng(1), skip_ahead_noise=True)
+    assert target._record(program, (), {}).skip_ahead
+    result = np.array(target.multi_run(program, shots))
+
+    # odd number of flips, loss reads as one
+    assert abs(result[:, 0].mean() - (1 - 0.9**10) / 2) < 0.03
+    assert abs(result[:, 1].mean() - (1 - 0.98**10)) < 0.03
+
+
+def test_snapshot_prefix():
+    @simulation
+    def program():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        qasm2.x(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.h(q[0])
+        qasm2.h(q[0])
+        native.pauli_channel([q[0], q[1]], px=0.3, py=0.0, pz=0.0)
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    tape = TapeRecorder(program.dialects).record(program)
+    assert tape.prefix_length == 4
+
+    def run(**options):
+        target = PyQrack(2, rng_state=np.random.default_rng(11), **options)
+        return [list(bits) for bits in target.multi_run(program, 40)]
+
+    assert run() == run(use_tape=False)
+
+
+def test_group_noise_patterns():
+    @simulation
+    def program():
+        q = qasm2.qreg(3)
+        c = qasm2.creg(3)
+        qasm2.h(q[2])
+        for _ in range(10):
+            native.pauli_channel([q[0]], px=0.05, py=0.0, pz=0.0)
+            native.atom_loss_channel([q[1]], prob=0.02)
+
+        for i in range(3):
+            qasm2.measure(q[i], c[i])
+        return c
+
+    tape = TapeRecorder(program.dialects).record(program)
+    assert tape.can_group() and not tape.can_sample()
+
+    shots = 4000
+    target = PyQrack(3, rng_state=np.random.default_rng(2), group_noise_patterns=True)
+    result = np.array(target.multi_run(program, shots))
+    codes = target.multi_run_array(program, shots).unpack()
+    for bits in (result, codes):
+        assert abs(bits[:, 0].mean() - (1 - 0.9**10) / 2) < 0.03
+        assert abs(bits[:, 1].mean() - (1 - 0.98**10)) < 0.03
+        assert abs(bits[:, 2].mean() - 0.5) < 0.03
+
+
+def test_native_segments():
+    @simulation
+    def program():
+        q = qasm2.qreg(3)
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.rx(q[2], 0.3)
+        qasm2.t(q[1])
+        native.pauli_channel([q[0]], px=1.0, py=0.0, pz=0.0)
+        qasm2.u(q[2], 0.1, 0.2, 0.3)
+        qasm2.cz(q[2], q[0])
+        qasm2.reset(q[1])
+        qasm2.h(q[1])
+        qasm2.cx(q[1], q[2])
+        qasm2.rz(q[1], 0.4)
+        qasm2.ry(q[0], 0.5)
+        return q
+
+    tape = TapeRecorder(program.dialects).record(program)
+    assert tape.segments == {}
+    tape = replace(tape, native=True)
+    assert [(start, s.end) for start, s in tape.segments.items()] == [(0, 4), (8, 12)]
+    assert tape.segments[0].guard == {0, 1, 2}
+    pickle.loads(pickle.dumps(tape))
+
+    interp, recorded = PyQrack(3, native_circuits=False)._prepare(program, (), {})
+    assert recorded is not None and not recorded.native
+    expected = recorded.replay(interp).sim_reg.out_ket()
+    qreg = tape.replay(interp)
+    overlap = np.vdot(expected, qreg.sim_reg.out_ket())
+    assert abs(abs(overlap) - 1) < 1e-5
+
+
+def test_measure_runs():
+    @qasm2.extended
+    def program():
+        q = qasm2.qreg(3)
+        c = qasm2.creg(3)
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.cx(q[1], q[2])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        qasm2.x(q[2])
+        qasm2.measure(q[2], c[2])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    tape = replace(TapeRecorder(program.dialects).record(program), batch_measure=True)
+    assert tape.measure_runs == {3: (5, False), 6: (9, True)}
+
+    class SampleMemory(MeasureOneMemory):
+        def reset(self):
+            super().reset()
+            self.sim_reg.num_qubits.return_value = 3
+            self.sim_reg.measure_shots.return_value = [0b101]
+
+    interp = PyQrackInterpreter(program.dialects, memory=SampleMemory())
+    assert tape.replay(interp) == [0, 1, 1]
+    interp.memory.sim_reg.assert_has_calls(
+        [call.m(0), call.m(1), call.x(2), call.measure_shots([2, 0, 1], 1)]
+    )
+
+    # the first run collapses the state, the second one only samples it
+    options = {key: False for key in LAYER_OPTIONS}
+    target = PyQrack(3, pyqrack_options=options)  # type: ignore[arg-type]
+    _, recorded = target._prepare(program, (), {})
+    assert recorded is not None and recorded.batch_measure
+    for bits in target.multi_run(program, 20):
+        assert bits[0] == bits[1] != bits[2]
@@ -1,8 +1,13 @@
 import math
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from bloqade import qasm2
 from pyqrack import QrackSimulator
+from bloqade.noise import native
 from bloqade.pyqrack import PyQrack, reg
+from bloqade.pyqrack.layers import SCHMIDT_QUBITS, CircuitProfile, choose_layers
 
 
 def test_target():
@@ -42,5 +47,227 @@ def test_target():
     assert all(math.isclose(ele.real, 0.0, abs_tol=abs_tol) for ele in out[1:-1])
 
 
+def test_multi_run_workers():
+
+    @qasm2.extended.add(native)
+    def noisy():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        native.pauli_channel([q[0], q[1]], px=0.3, py=0.0, pz=0.0)
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+
+        return c
+
+    def run(**options):
+        target = PyQrack(2, rng_state=np.random.default_rng(1234), **options)
+        return [list(bits) for bits in target.multi_run(noisy, 25)]
+
+    expected = run(workers=2, shots_per_task=4)
+    assert len(expected) == 25
+    assert run(workers=3, shots_per_task=4) == expected
+    assert run(workers=1, shots_per_task=4) == expected
+    with ThreadPoolExecutor(2) as executor:
+        assert run(executor=executor, shots_per_task=4) == expected
+
+
+def test_compile_cache():
+
+    @qasm2.extended
+    def flip(n: int):
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        for i in range(n):
+            qasm2.x(q[0])
+
+        qasm2.measure(q[0], c[0])
+        return c
+
+    @qasm2.main
+    def zero():
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        qasm2.measure(q[0], c[0])
+        return c
+
+    target = PyQrack(2, cache_size=1)
+    assert list(target.run(flip, 1)) == [1, 0]
+    assert list(target.run(flip, 2)) == [0, 0]
+    assert target.multi_run(flip, 3, 1) == [[1, 0]] * 3
+    assert (target.cache_hits, target.cache_misses) == (2, 1)
+    assert target._cache[next(iter(target._cache))].num_qubits == 2
+
+    target.run(zero)
+    target.run(flip, 1)
+    assert (target.cache_hits, target.cache_misses) == (2, 3)
+    assert len(target._cache) == 1
+
+    target.pyqrack_options["isTensorNetwork"] = True
+    target.run(flip, 1)
+    assert target.cache_misses == 4
+
+    target.clear_cache()
+    assert (target.cache_hits, target.cache_misses) == (0, 0)
+    assert not target._cache
+
+    target = PyQrack(2, cache_size=0)
+    target.run(flip, 1)
+    target.run(flip, 1)
+    assert (target.cache_hits, target.cache_misses) == (0, 2)
+
+
+def test_simulator_pool():
+
+    @qasm2.main
+    def flip():
+        q = qasm2.qreg(1)
+        c = qasm2.creg(1)
+        qasm2.x(q[0])
+        qasm2.measure(q[0], c[0])
+        return c
+
+    @qasm2.main
+    def prepare():
+        q = qasm2.qreg(1)
+        qasm2.x(q[0])
+        return q
+
+    target = PyQrack(1)
+    interpreter = target._compile(flip)
+    assert list(target.run(flip)) == [1]
+    sim_reg = interpreter.memory.sim_reg
+    assert list(target.run(flip)) == [1]
+    assert interpreter.memory.sim_reg is sim_reg
+
+    q = target.run(prepare)
+    other = target.run(prepare)
+    assert q.sim_reg is not other.sim_reg
+    assert math.isclose(q.sim_reg.prob(0), 1.0, rel_tol=1e-6)
+    assert math.isclose(other.sim_reg.prob(0), 1.0, rel_tol=1e-6)
+
+    assert target.multi_run(flip, 5) == [[1]] * 5
+    assert PyQrack(1, simulator_pool=None).multi_run(flip, 5) == [[1]] * 5
+
+
+def test_iter_runs():
+
+    @qasm2.extended.add(native)
+    def noisy():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        native.pauli_channel([q[0]], px=0.5, py=0.0, pz=0.0)
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    @qasm2.main
+    def bell():
+        q = qasm2.qreg(2)
+        c = qasm2.creg(2)
+
+        qasm2.h(q[0])
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[0], c[0])
+        qasm2.measure(q[1], c[1])
+        return c
+
+    options = ({}, {"use_tape": False}, {"workers": 2, "shots_per_task": 3})
+    for kwargs in options:
+        target = PyQrack(2, rng_state=np.random.default_rng(5), **kwargs)
+        expected = [list(bits) for bits in target.multi_run(noisy, 10)]
+        target = PyQrack(2, rng_state=np.random.default_rng(5), **kwargs)
+        chunks = list(target.iter_runs(noisy, 10, _chunk_size=4))
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        assert [list(bits) for chunk in chunks for bits in chunk] == expected
+
+    target = PyQrack(2)
+    chunks = target.iter_runs(bell, 30, _chunk_size=10)
+    first = next(chunks)
+    # running the kernel again must not disturb the sampled state
+    target.run(bell)
+    target.run(bell)
+    rest = [bits for chunk in chunks for bits in chunk]
+    assert len(first) == 10 and len(rest) == 20
+    assert {tuple(bits) for bits in first + rest} == {(0, 0), (1, 1)}
+
+
+def test_auto_layers():
+    @qasm2.extended
+    def ghz(n: int):
+        q = qasm2.qreg(n)
+        c = qasm2.creg(n)
+        qasm2.h(q[0])
+        for i in range(1, n):
+            qasm2.cx(q[0], q[i])
+        for i in range(n):
+            qasm2.measure(q[i], c[i])
+        return c
+
+    @qasm2.extended
+    def rotations(n: int):
+        q = qasm2.qreg(n)
+        c = qasm2.creg(n)
+        d = qasm2.creg(n)
+        for i in range(n):
+            qasm2.rx(q[i], 0.3)
+        qasm2.cx(q[0], q[1])
+        qasm2.measure(q[0], c[0])
+        if c == d:
+            qasm2.x(q[1])
+        return c
+
+    target = PyQrack(12)
+    result = target.multi_run(ghz, 10, 12)
+    assert {tuple(bits) for bits in result} <= {(0,) * 12, (1,) * 12}
+    assert target.layers is not None and target.layers.name == "stabilizer"
+    assert target.layers.profile == CircuitProfile(12, 12, 11, 0, 12, 0)
+    options = target._compile(ghz).memory.pyqrack_options
+    assert options["isStabilizerHybrid"] and not options["isSchmidtDecompose"]
+
+    # measurement-dependent control flow cannot be recorded
+    target.run(rotations, 2)
+    assert target.layers.name == "default"
+
+    @qasm2.extended
+    def product(n: int):
+        q = qasm2.qreg(n)
+        c = qasm2.creg(n)
+        for i in range(n):
+            qasm2.rx(q[i], 0.3)
+        qasm2.cx(q[0], q[1])
+        for i in range(n):
+            qasm2.measure(q[i], c[i])
+        return c
+
+    target.multi_run(product, 5, 4)
+    assert target.layers.name == "state_vector"
+    target = PyQrack(12, pyqrack_options={"isStabilizerHybrid": True})
+    target.multi_run(product, 5, 12)
+    assert target.layers.name == "schmidt"
+    options = target._compile(product).memory.pyqrack_options
+    assert options["isSchmidtDecompose"] and options["isStabilizerHybrid"]
+
+    wide = CircuitProfile(40, 50, 39, 1, SCHMIDT_QUBITS + 1, 0)
+    assert choose_layers(wide).name == "default"
+    lossy = CircuitProfile(4, 10, 3, 0, 4, 1)
+    assert choose_layers(lossy).options["isSchmidtDecompose"]
+    assert choose_layers(replace(lossy, non_clifford=1)).name == "schmidt"
+
+    target = PyQrack(12, auto_layers=False)
+    target.multi_run(ghz, 5, 12)
+    assert target.layers is None
+    assert target._compile(ghz).memory.pyqrack_options["isSchmidtDecompose"]
+
+
 if __name__ == "__main__":
     test_target()
+    test_multi_run_workers()
+    test_compile_cache()
+    test_simulator_pool()
+    test_iter_runs()
+    test_auto_layers()